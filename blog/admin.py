@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import Post, Category, Comment
+from django.http import FileResponse, Http404
+from django.template.response import TemplateResponse
+from django.urls import path
+from .models import Post, Category, Comment, ProfilingTarget
+from . import fragment_cache, profiling
 from django.db import models 
 from tinymce.widgets import TinyMCE
 
@@ -12,7 +16,8 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
-    list_display = ['title', 'author', 'status', 'created_at']
+    list_display = ['title', 'author', 'status', 'created_at', 'like_count', 'comment_count']
+    list_select_related = ['author']
     list_filter = ['status', 'created_at', 'category']
     search_fields = ['title', 'content']
     prepopulated_fields = {'slug': ('title',)}
@@ -24,5 +29,63 @@ class PostAdmin(admin.ModelAdmin):
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ['author', 'post', 'created_at', 'active']
+    # Comment.__str__ and the post column read both relations
+    list_select_related = ['author', 'post']
     list_filter = ['active', 'created_at']
-    search_fields = ['author__username', 'content']
\ No newline at end of file
+    search_fields = ['author__username', 'content']
+    actions = ['activate_comments', 'deactivate_comments']
+
+    def _set_active(self, queryset, active):
+        # queryset.update() bypasses the counter signals, so resync the
+        # affected posts in one statement afterwards
+        post_ids = set(queryset.values_list('post_id', flat=True))
+        queryset.update(active=active)
+        Post.objects.filter(pk__in=post_ids).sync_counters()
+        for post_id in post_ids:
+            fragment_cache.bump_version(post_id)
+
+    @admin.action(description="Activate selected comments")
+    def activate_comments(self, request, queryset):
+        self._set_active(queryset, True)
+
+    @admin.action(description="Deactivate selected comments")
+    def deactivate_comments(self, request, queryset):
+        self._set_active(queryset, False)
+
+@admin.register(ProfilingTarget)
+class ProfilingTargetAdmin(admin.ModelAdmin):
+    list_display = ['view_name', 'remaining', 'created_at']
+    change_list_template = 'admin/blog/profilingtarget/change_list.html'
+
+    def get_urls(self):
+        urls = [
+            path(
+                'captures/',
+                self.admin_site.admin_view(self.captures_view),
+                name='blog_profilingtarget_captures',
+            ),
+            path(
+                'captures/<str:name>/',
+                self.admin_site.admin_view(self.capture_download_view),
+                name='blog_profilingtarget_capture',
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def captures_view(self, request):
+        if not self.has_view_permission(request):
+            raise Http404
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Profiler captures',
+            'captures': profiling.list_captures(),
+            'capture_dir': profiling.capture_dir(),
+        }
+        return TemplateResponse(request, 'admin/blog/profilingtarget/captures.html', context)
+
+    def capture_download_view(self, request, name):
+        capture = profiling.capture_path(name)
+        if capture is None or not self.has_view_permission(request):
+            raise Http404
+        return FileResponse(capture.open('rb'), as_attachment=True, content_type='application/json')
@@ -0,0 +1,277 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.db import connection
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import generics
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+from . import fragment_cache
+from .categories import get_category_by_slug, get_category_index
+from .guest_likes import guest_likes
+from .models import Comment, Like, Post
+from .nplusone import is_incidental
+from .page_cache import post_id_for_slug
+from .serializers import (
+    CategorySerializer,
+    CommentSerializer,
+    LikeCountSerializer,
+    PostSerializer,
+    requested_fields,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetError(AssertionError):
+    """
+    Raised when an endpoint runs more queries than its query_budget.
+    """
+
+
+class PostCursorPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-created_at", "-id")
+
+
+class CommentCursorPagination(PostCursorPagination):
+    ordering = ("created_at", "id")
+
+
+class ConditionalAPIMixin:
+    """
+    ETag-based conditional GET and a per-endpoint query budget for the
+    read-only API views.
+
+    Like blog.page_cache.ConditionalPageMixin, views provide
+    ``get_versions()`` (see blog.fragment_cache), so If-None-Match is
+    answered with a 304 before any query runs. ``query_budget`` is the
+    number of queries the endpoint is planned to need. Going over it is
+    handled like an N+1 (settings.NPLUSONE_ACTION): logged in development
+    and raised under the test runner.
+    """
+
+    query_budget = None
+
+    def get_versions(self):
+        """
+        Return the versions the response depends on, or None to skip the
+        conditional handling (for instance when the object does not exist).
+        """
+        raise NotImplementedError
+
+    def get_viewer_state(self):
+        """
+        Return a string identifying what in the response depends on the
+        viewer.
+        """
+        return ""
+
+    def get(self, request, *args, **kwargs):
+        versions = self.get_versions()
+        if versions is None:
+            return self._get_within_budget(request, *args, **kwargs)
+
+        fingerprint = ":".join(str(version) for version in versions)
+        # the same URL renders differently as JSON and as the browsable API
+        accept = request.META.get("HTTP_ACCEPT", "")
+        etag = quote_etag(
+            hashlib.md5(
+                f"{fingerprint}:{request.get_full_path()}:{accept}:{self.get_viewer_state()}".encode()
+            ).hexdigest()
+        )
+        last_modified = max(fragment_cache.version_timestamp(v) for v in versions)
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = self._get_within_budget(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+            patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ("Accept", "Cookie"))
+        return response
+
+    def _get_within_budget(self, request, *args, **kwargs):
+        action = getattr(settings, "NPLUSONE_ACTION", "off")
+        if self.query_budget is None or action == "off":
+            return super().get(request, *args, **kwargs)
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            if not is_incidental(sql):
+                queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            response = super().get(request, *args, **kwargs)
+        if len(queries) > self.query_budget:
+            message = (
+                f"{type(self).__name__} ran {len(queries)} queries, "
+                f"over its budget of {self.query_budget}"
+            )
+            if action == "raise":
+                raise QueryBudgetError(message)
+            logger.warning(message)
+        return response
+
+
+def plan_post_queryset(request):
+    """
+    Return the published posts, joining and prefetching only what the
+    requested fields need and leaving the HTML body out unless asked for.
+    The raw editor HTML is never needed.
+    """
+    fields = requested_fields(request)
+
+    def wants(name):
+        return fields is None or name in fields
+
+    queryset = Post.objects.published()
+    related = [name for name in ("author", "category") if wants(name)]
+    if related:
+        queryset = queryset.select_related(*related)
+    if wants("tags"):
+        queryset = queryset.prefetch_related("tags")
+    deferred = ["content"]
+    if not wants("content"):
+        deferred.append("content_rendered")
+    if not wants("toc"):
+        deferred.append("toc")
+    return queryset.defer(*deferred)
+
+
+class PostListAPIView(ConditionalAPIMixin, generics.ListAPIView):
+    """
+    Published posts, newest first. Filter with ``?category=<slug>`` and
+    ``?tag=<slug>``.
+    """
+
+    serializer_class = PostSerializer
+    pagination_class = PostCursorPagination
+    # the page, plus the tags prefetch
+    query_budget = 2
+
+    def get_versions(self):
+        return [fragment_cache.get_list_version(), fragment_cache.get_site_version()]
+
+    def get_queryset(self):
+        queryset = plan_post_queryset(self.request)
+        category_slug = self.request.query_params.get("category")
+        if category_slug:
+            category = get_category_by_slug(category_slug)
+            if category is None:
+                return queryset.none()
+            queryset = queryset.filter(category_id=category.pk)
+        tag_slug = self.request.query_params.get("tag")
+        if tag_slug:
+            queryset = queryset.filter(tags__slug=tag_slug)
+        return queryset
+
+
+class PostLookupMixin:
+    """
+    Resolve the ``slug`` URL argument through the cached slug -> id map.
+    """
+
+    @property
+    def post_id(self):
+        if not hasattr(self, "_post_id"):
+            self._post_id = post_id_for_slug(self.kwargs["slug"])
+        return self._post_id
+
+    def get_versions(self):
+        if self.post_id is None:
+            return None
+        return [fragment_cache.get_version(self.post_id), fragment_cache.get_site_version()]
+
+
+class PostDetailAPIView(PostLookupMixin, ConditionalAPIMixin, generics.RetrieveAPIView):
+    serializer_class = PostSerializer
+    # the post with author and category joined, plus its tags
+    query_budget = 2
+
+    def get_object(self):
+        if self.post_id is None:
+            raise Http404
+        obj = plan_post_queryset(self.request).filter(pk=self.post_id).first()
+        if obj is None:
+            raise Http404
+        return obj
+
+
+class CommentListAPIView(PostLookupMixin, ConditionalAPIMixin, generics.ListAPIView):
+    """
+    The active comments of a published post, oldest first.
+    """
+
+    serializer_class = CommentSerializer
+    pagination_class = CommentCursorPagination
+    query_budget = 1
+
+    def get_queryset(self):
+        if self.post_id is None:
+            raise Http404
+        return Comment.objects.filter(
+            post_id=self.post_id, post__status="published", active=True
+        ).select_related("author")
+
+
+class PostLikesAPIView(PostLookupMixin, ConditionalAPIMixin, generics.RetrieveAPIView):
+    """
+    The like count of a post and whether the current visitor likes it.
+    """
+
+    serializer_class = LikeCountSerializer
+    # the counter, plus the viewer's like for authenticated users
+    query_budget = 2
+
+    def get_viewer_state(self):
+        user = self.request.user
+        if user.is_authenticated:
+            return f"user:{user.pk}"
+        return f"guest:{int(self.post_id in guest_likes(self.request))}"
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.post_id is None:
+            raise Http404
+        like_count = (
+            Post.objects.published()
+            .filter(pk=self.post_id)
+            .values_list("like_count", flat=True)
+            .first()
+        )
+        if like_count is None:
+            raise Http404
+        user = request.user
+        if user.is_authenticated:
+            liked = Like.objects.filter(user=user, post_id=self.post_id).exists()
+        else:
+            liked = self.post_id in guest_likes(request)
+        serializer = self.get_serializer(
+            {"slug": self.kwargs["slug"], "like_count": like_count, "liked": liked}
+        )
+        return Response(serializer.data)
+
+
+class CategoryListAPIView(ConditionalAPIMixin, generics.ListAPIView):
+    """
+    Every category with its number of published posts, served from the
+    cached category index.
+    """
+
+    serializer_class = CategorySerializer
+    pagination_class = None
+    query_budget = 1
+
+    def get_versions(self):
+        return [fragment_cache.get_site_version(), fragment_cache.get_list_version()]
+
+    def get_queryset(self):
+        return get_category_index()
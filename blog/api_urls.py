@@ -0,0 +1,15 @@
+from django.urls import path
+
+from . import api
+
+# mounted under api/v1/ with the "v1" namespace, which DRF's
+# NamespaceVersioning reports as request.version
+app_name = "api"
+
+urlpatterns = [
+    path("posts/", api.PostListAPIView.as_view(), name="post_list"),
+    path("posts/<slug:slug>/", api.PostDetailAPIView.as_view(), name="post_detail"),
+    path("posts/<slug:slug>/comments/", api.CommentListAPIView.as_view(), name="comment_list"),
+    path("posts/<slug:slug>/likes/", api.PostLikesAPIView.as_view(), name="post_likes"),
+    path("categories/", api.CategoryListAPIView.as_view(), name="category_list"),
+]
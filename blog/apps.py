@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog'
+
+    def ready(self):
+        # register the signal handlers that maintain denormalized counters
+        from . import checks, signals  # noqa: F401
+        # query instrumentation must be on every connection, including the
+        # ones ASGI requests open in worker threads
+        from . import metrics, nplusone
+        if getattr(settings, "METRICS_ENABLED", True):
+            metrics.install()
+        nplusone.watch_connections()
@@ -0,0 +1,232 @@
+import io
+import json
+import statistics
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from . import profiling
+from .models import Category, Post
+from .view_counter import view_counts
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / "benchmarks" / "blog_baseline.json"
+
+# the benchmark client must not be throttled
+UNLIMITED = (10**9, 1)
+
+BENCHMARK_SETTINGS = {
+    "ALLOWED_HOSTS": ["testserver"],
+    "STORAGES": {
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+        # templates must render without a collectstatic manifest
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    },
+    # measure the views, not the shared copy of anonymous pages; that is
+    # reported separately (see PAGE_CACHE_SUFFIX)
+    "BLOG_PAGE_CACHE_TIMEOUT": 0,
+    "BLOG_RATE_LIMITS": {"comment": UNLIMITED, "comment_update": UNLIMITED, "like": UNLIMITED},
+}
+
+
+# suffix of the anonymous scenarios measured again with the page cache on
+PAGE_CACHE_SUFFIX = "+page_cache"
+
+
+def percentile(values, pct):
+    """
+    Return the pct-th percentile of values, by linear interpolation.
+    """
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def scenarios():
+    """
+    Return ``{name: (client_kind, method, url, extra)}`` for every benchmarked
+    view. ``client_kind`` is "anonymous" or "user".
+    """
+    post = (
+        Post.objects.published()
+        .order_by("-comment_count", "-id")
+        .only("slug")
+        .first()
+    )
+    category = Category.objects.filter(post__status="published").order_by("pk").first()
+    detail = reverse("blog:post_detail", args=[post.slug])
+    return {
+        "home": ("anonymous", "get", reverse("home"), {}),
+        "post_list": ("anonymous", "get", reverse("blog:post_list"), {}),
+        "posts_list": ("anonymous", "get", reverse("blog:posts_list"), {}),
+        "posts_list_htmx": ("anonymous", "get", reverse("blog:posts_list"), {"HTTP_HX_REQUEST": "true"}),
+        "category_posts": ("anonymous", "get", reverse("blog:category_posts", args=[category.slug]), {}),
+        "post_detail": ("anonymous", "get", detail, {}),
+        "post_detail_user": ("user", "get", detail, {}),
+        "like_toggle": ("user", "post", reverse("blog:like_toggle", args=[post.slug]), {"HTTP_HX_REQUEST": "true"}),
+        "add_comment": (
+            "user",
+            "post",
+            reverse("blog:add_comment", args=[post.slug]),
+            {"data": {"content": "Commento di prova."}, "HTTP_HX_REQUEST": "true"},
+        ),
+        "sitemap_index": ("anonymous", "get", reverse("sitemap_index"), {}),
+        "sitemap_blog": ("anonymous", "get", reverse("sitemap_section", args=["blog"]), {}),
+    }
+
+
+@contextmanager
+def held_view_counts():
+    """
+    Keep the view count buffer from flushing while a view is measured.
+
+    A flush is due on a timer, so it would land in a random request and
+    make the query counts differ from run to run. The held hits are
+    flushed afterwards.
+    """
+    interval, threshold = view_counts.flush_interval, view_counts.flush_threshold
+    view_counts.flush_interval = view_counts.flush_threshold = float("inf")
+    try:
+        yield
+    finally:
+        view_counts.flush_interval, view_counts.flush_threshold = interval, threshold
+        view_counts.flush()
+
+
+def measure(client, method, url, extra, iterations):
+    """
+    Request a URL repeatedly, starting from an empty cache.
+
+    Returns:
+        dict: Latency percentiles in milliseconds (the first, cold request
+            included) and the query counts of the cold and warm requests.
+    """
+    extra = dict(extra)
+    data = extra.pop("data", None)
+    cache.clear()
+    # the profiler's targets are cached for good in a running site; an
+    # empty cache would charge their query to whichever request polls next
+    profiling.armed_targets()
+    timings, queries = [], []
+    with held_view_counts():
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                if data is None:
+                    response = getattr(client, method)(url, **extra)
+                else:
+                    response = getattr(client, method)(url, data, **extra)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{method.upper()} {url} answered {response.status_code}")
+            queries.append(len(captured))
+    return {
+        "p50_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "p99_ms": round(percentile(timings, 99), 2),
+        "cold_queries": queries[0],
+        "warm_queries": max(queries[1:], default=queries[0]),
+    }
+
+
+def run(sizes=(100, 1000), iterations=30, seed=1):
+    """
+    Benchmark every scenario at each dataset size.
+
+    Each size is seeded with seed_blog inside a transaction that is rolled
+    back afterwards, so the benchmark leaves the database as it found it.
+    The configured cache is used, so with a DatabaseCache the query counts
+    include its lookups. Anonymous pages are measured without the shared
+    page cache, then again with it under ``name + PAGE_CACHE_SUFFIX``.
+
+    Returns:
+        dict: ``{size: {scenario: measurement}}``, sizes as strings so the
+            result round-trips through JSON.
+    """
+    results = {}
+    with override_settings(**BENCHMARK_SETTINGS):
+        for size in sizes:
+            with transaction.atomic():
+                call_command(
+                    "seed_blog",
+                    posts=size,
+                    users=max(10, size // 10),
+                    seed=seed,
+                    stdout=io.StringIO(),
+                )
+                user = get_user_model().objects.order_by("-pk").first()
+                clients = {"anonymous": Client(), "user": Client()}
+                clients["user"].force_login(user)
+                views = scenarios()
+                measured = {
+                    name: measure(clients[kind], method, url, extra, iterations)
+                    for name, (kind, method, url, extra) in views.items()
+                }
+                with override_settings(BLOG_PAGE_CACHE_TIMEOUT=60 * 60):
+                    for name, (kind, method, url, extra) in views.items():
+                        if kind == "anonymous" and method == "get":
+                            measured[name + PAGE_CACHE_SUFFIX] = measure(
+                                clients[kind], method, url, extra, iterations
+                            )
+                results[str(size)] = measured
+                transaction.set_rollback(True)
+    return results
+
+
+def compare(results, baseline, latency_tolerance=0.5):
+    """
+    Compare results with a stored baseline.
+
+    Query counts must not grow at all. The p95 latency may grow by
+    ``latency_tolerance`` (0.5 = 50%) before it counts as a regression;
+    pass None to ignore latency, e.g. on a machine unlike the one the
+    baseline was recorded on.
+
+    Returns:
+        list[str]: One line per regression; empty if there is none.
+    """
+    regressions = []
+    for size, views in results.items():
+        for name, current in views.items():
+            previous = baseline.get(size, {}).get(name)
+            if previous is None:
+                continue
+            for key in ("cold_queries", "warm_queries"):
+                if current[key] > previous[key]:
+                    regressions.append(
+                        f"{name} @ {size} posts: {key} {previous[key]} -> {current[key]}"
+                    )
+            if latency_tolerance is not None:
+                limit = previous["p95_ms"] * (1 + latency_tolerance)
+                if current["p95_ms"] > limit:
+                    regressions.append(
+                        f"{name} @ {size} posts: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms"
+                    )
+    return regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, results):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as fh:
+        json.dump(results, fh, indent=2, sort_keys=True)
+        fh.write("\n")
@@ -0,0 +1,45 @@
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+CATEGORY_INDEX_KEY = "blog:category_index"
+
+
+def get_category_index():
+    """
+    Return every category, ordered by name, with ``num_posts`` set to its
+    number of published posts.
+
+    The list is built with a single query and kept in the cache until a
+    category or post changes (see blog.signals).
+
+    Returns:
+        list[Category]: The annotated categories.
+    """
+    from .models import Category
+
+    categories = cache.get(CATEGORY_INDEX_KEY)
+    if categories is None:
+        categories = list(
+            Category.objects.annotate(
+                num_posts=Count("post", filter=Q(post__status="published"))
+            ).order_by("name")
+        )
+        cache.set(CATEGORY_INDEX_KEY, categories, None)
+    return categories
+
+
+def get_category_by_slug(slug):
+    """
+    Look a category up in the cached index.
+
+    Returns:
+        Category: The matching category, or None.
+    """
+    for category in get_category_index():
+        if category.slug == slug:
+            return category
+    return None
+
+
+def invalidate_category_index():
+    cache.delete(CATEGORY_INDEX_KEY)
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# caches that each worker process keeps to itself
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+# caches whose incr() is a get() and a set(), so concurrent requests lose counts
+NON_ATOMIC_INCR_CACHES = (
+    "django.core.cache.backends.db.DatabaseCache",
+    "django.core.cache.backends.filebased.FileBasedCache",
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Several workers need a shared cache: fragments, pages and indexes are
+    invalidated by writing keys, which a per-process cache only does for
+    the worker that made the change.
+    """
+    workers = getattr(settings, "WEB_CONCURRENCY", 1)
+    backend = settings.CACHES["default"]["BACKEND"]
+    if workers > 1 and backend in PROCESS_LOCAL_CACHES:
+        return [
+            Error(
+                f"WEB_CONCURRENCY={workers} workers cannot share the per-process {backend}.",
+                hint=(
+                    "Set CACHE_BACKEND/CACHE_LOCATION to a shared cache server, e.g. "
+                    "django.core.cache.backends.redis.RedisCache, or run one worker."
+                ),
+                id="blog.E001",
+            )
+        ]
+    return []
+
+
+@register(Tags.caches)
+def check_atomic_incr(app_configs, **kwargs):
+    """
+    The rate limits count spent tokens with cache.incr(), which must be
+    atomic or concurrent requests get past the limit.
+    """
+    backend = settings.CACHES["default"]["BACKEND"]
+    if backend in NON_ATOMIC_INCR_CACHES:
+        return [
+            Error(
+                f"The blog's rate limits need an atomic cache.incr(), which {backend} lacks.",
+                hint=(
+                    "Use django.core.cache.backends.redis.RedisCache, a Memcached "
+                    "backend or, with a single worker, LocMemCache."
+                ),
+                id="blog.E002",
+            )
+        ]
+    return []
@@ -1,13 +1,13 @@
-from django.db.models import Count
-from .models import Category
+from django.utils.functional import SimpleLazyObject
+
+from .categories import get_category_index
 
 def categories_processor(request):
     """
     context processor to make categories available across all templates
+
+    The categories come from the cached category index and are only fetched
+    if the template actually uses them, so HTMX partials and error pages pay
+    nothing.
     """
-    try:
-        categories = Category.objects.all().order_by('name')
-        return {'categories': categories}
-    except Exception as e:
-        # Return empty queryset if there's any issue
-        return {'categories': Category.objects.none()}
\ No newline at end of file
+    return {'categories': SimpleLazyObject(get_category_index)}
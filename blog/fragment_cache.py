@@ -0,0 +1,124 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+FRAGMENT_TIMEOUT = getattr(settings, "BLOG_FRAGMENT_CACHE_TIMEOUT", 60 * 60 * 24)
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+LIST_VERSION_KEY = "blog:posts:version"
+SITE_VERSION_KEY = "blog:site:version"
+
+
+def _version_key(post_id):
+    return f"blog:post:{post_id}:version"
+
+
+def _get(key):
+    """
+    Return the version stored under key.
+
+    A missing version (never set, or evicted) is initialised to a fresh
+    timestamp rather than a small counter, so an eviction can never make an
+    older cached fragment current again.
+    """
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        # add() so a concurrent bump is not overwritten
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def get_version(post_id):
+    """
+    Return the current fragment version of a post.
+    """
+    return _get(_version_key(post_id))
+
+
+def get_versions(post_ids):
+    """
+    Return ``{post_id: version}`` for many posts in one cache round trip.
+    """
+    keys = {_version_key(post_id): post_id for post_id in post_ids}
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        # a fresh timestamp is a new version, so overwriting a concurrent
+        # bump with it only invalidates the fragment once more
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {post_id: found[key] for key, post_id in keys.items()}
+
+
+def get_list_version():
+    """
+    Return the version shared by every page that lists posts.
+    """
+    return _get(LIST_VERSION_KEY)
+
+
+def get_site_version():
+    """
+    Return the version of data shown on every page (the category menus).
+    """
+    return _get(SITE_VERSION_KEY)
+
+
+def bump_version(post_id):
+    """
+    Invalidate every cached fragment of a post, and the post listings.
+    """
+    now = time.time_ns()
+    cache.set_many({_version_key(post_id): now, LIST_VERSION_KEY: now}, None)
+
+
+async def abump_version(post_id):
+    """
+    Async variant of bump_version(), for async views.
+    """
+    now = time.time_ns()
+    await cache.aset_many({_version_key(post_id): now, LIST_VERSION_KEY: now}, None)
+
+
+def bump_site_version():
+    """
+    Invalidate everything that renders site-wide data.
+    """
+    now = time.time_ns()
+    cache.set_many({SITE_VERSION_KEY: now, LIST_VERSION_KEY: now}, None)
+
+
+def version_timestamp(version):
+    """
+    Versions are nanosecond timestamps of the last change; return it in
+    seconds, suitable for a Last-Modified header.
+    """
+    return version // 1_000_000_000
+
+
+def make_key(name, post_id, version, vary_on=()):
+    vary = hashlib.md5(":".join(str(v) for v in vary_on).encode()).hexdigest()
+    return f"blog:fragment:{name}:{post_id}:{version}:{vary}"
+
+
+def record(hit):
+    with _stats_lock:
+        _stats["hits" if hit else "misses"] += 1
+
+
+def stats():
+    """
+    Return this process' fragment cache hit/miss counters.
+    """
+    with _stats_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_ratio": hits / total if total else 0.0}
@@ -0,0 +1,87 @@
+from django.conf import settings
+from django.utils.http import base36_to_int, int_to_base36
+
+SESSION_KEY = "liked_posts"
+MAX_GUEST_LIKES = getattr(settings, "BLOG_GUEST_LIKES_MAX", 200)
+
+
+class GuestLikes:
+    """
+    The set of posts an anonymous visitor has liked, kept in the session.
+
+    Stored as one compact string of base-36 post ids in insertion order
+    (e.g. ``"1z,2k,a1"``) and held in memory as an ordered dict, so
+    membership and toggling are O(1). At most MAX_GUEST_LIKES ids are kept;
+    the oldest are dropped first.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        raw = session.get(SESSION_KEY) or ""
+        if isinstance(raw, list):
+            # sessions written before the compact format
+            ids = [post_id for post_id in raw if isinstance(post_id, int)]
+        else:
+            ids = []
+            for token in raw.split(","):
+                try:
+                    ids.append(base36_to_int(token))
+                except ValueError:
+                    continue
+        self._ids = dict.fromkeys(ids)
+
+    def __contains__(self, post_id):
+        return post_id in self._ids
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def toggle(self, post_id):
+        """
+        Like or unlike a post.
+
+        Returns:
+            bool: True if the post is now liked.
+        """
+        if post_id in self._ids:
+            del self._ids[post_id]
+            liked = False
+        else:
+            self._ids[post_id] = None
+            while len(self._ids) > MAX_GUEST_LIKES:
+                del self._ids[next(iter(self._ids))]
+            liked = True
+        self._save()
+        return liked
+
+    def clear(self):
+        self._ids.clear()
+        self.session.pop(SESSION_KEY, None)
+
+    def _save(self):
+        if self._ids:
+            self.session[SESSION_KEY] = ",".join(int_to_base36(post_id) for post_id in self._ids)
+        else:
+            self.session.pop(SESSION_KEY, None)
+
+
+def guest_likes(request):
+    """
+    Return the GuestLikes of the request, parsing the session only once.
+    """
+    if not hasattr(request, "_guest_likes"):
+        request._guest_likes = GuestLikes(request.session)
+    return request._guest_likes
+
+
+async def aguest_likes(request):
+    """
+    Async variant of guest_likes(): loads the session without blocking, so
+    the GuestLikes can then be read and toggled from an async view.
+    """
+    if not hasattr(request, "_guest_likes"):
+        await request.session.aget(SESSION_KEY)
+    return guest_likes(request)
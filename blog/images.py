@@ -0,0 +1,295 @@
+import base64
+import binascii
+import hashlib
+import html
+import io
+import json
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+from functools import lru_cache
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage, storages
+from django.http import FileResponse, Http404
+from django.utils.html import format_html_join
+from django.utils.text import slugify
+from PIL import Image, UnidentifiedImageError, features
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = tuple(getattr(settings, "BLOG_IMAGE_WIDTHS", (320, 640, 960, 1280)))
+QUALITY = getattr(settings, "BLOG_IMAGE_QUALITY", 70)
+DEFAULT_SIZES = "(min-width: 768px) 768px, 100vw"
+DERIVATIVES_DIR = "derivatives"
+STATIC_MANIFEST = "manifest.json"
+# sources above these limits are left as they are, before being decoded
+MAX_SOURCE_BYTES = getattr(settings, "BLOG_IMAGE_MAX_BYTES", 20 * 1024 * 1024)
+MAX_PIXELS = getattr(settings, "BLOG_IMAGE_MAX_PIXELS", 40_000_000)
+# Pillow's own decompression bomb guard, for anything else that opens images
+Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+# derivative names carry a hash of their source, so they never change
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# modern formats, best first; each becomes a <source> when Pillow can write it
+FORMATS = (("avif", "image/avif"), ("webp", "image/webp"))
+FALLBACK_FORMATS = {"JPEG": "jpg", "PNG": "png"}
+
+_img_re = re.compile(r"<img\b[^>]*>", re.IGNORECASE)
+_attr_re = re.compile(r"""([^\s=/>]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s>]+))?""")
+_data_uri_re = re.compile(r"^data:image/[\w.+-]+;base64,(.*)$", re.DOTALL)
+
+
+def _supports(module):
+    try:
+        return features.check_module(module)
+    except ValueError:  # module unknown to this Pillow version
+        return False
+
+
+def available_formats():
+    """
+    Return the (extension, MIME type) pairs derivatives are written in.
+    """
+    return [(ext, mime) for ext, mime in FORMATS if _supports(ext)]
+
+
+def content_storage():
+    """
+    Return the storage of the derivatives of post images (the "derivatives"
+    entry of STORAGES), which must outlive deploys.
+    """
+    return storages["derivatives"]
+
+
+def static_storage():
+    """
+    Derivatives of static images live next to the collected static files, so
+    WhiteNoise serves them with far-future caching like any other asset.
+    """
+    return FileSystemStorage(
+        location=settings.STATIC_ROOT / DERIVATIVES_DIR,
+        base_url=f"{settings.STATIC_URL}{DERIVATIVES_DIR}/",
+    )
+
+
+def build_derivatives(data, name, storage, prefix=""):
+    """
+    Write resized copies of an image in every available format.
+
+    File names carry a hash of the source bytes, so derivatives can be
+    cached forever and the same image is only ever processed once.
+
+    Args:
+        data (bytes): The source image.
+        name (str): The source file name, used to make readable names.
+        storage (Storage): Where to write the derivatives.
+        prefix (str): Directory inside the storage.
+
+    Returns:
+        dict: ``width``/``height`` of the fallback image, its URL as ``src``
+            and a ``sources`` list of ``{"type", "srcset"}`` dicts; None if
+            the image cannot be processed.
+    """
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    stem = slugify(posixpath.splitext(posixpath.basename(name))[0])[:40] or "image"
+    base = posixpath.join(prefix, f"{stem}-{digest}")
+
+    manifest_name = f"{base}.json"
+    if storage.exists(manifest_name):
+        with storage.open(manifest_name) as manifest:
+            return json.load(manifest)
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        # open() only reads the header, so this is checked before decoding
+        if image.width * image.height > MAX_PIXELS:
+            logger.warning("Image %s is over %d pixels, leaving it as is", name, MAX_PIXELS)
+            return None
+        image.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        logger.warning("Cannot read image %s, leaving it as is", name)
+        return None
+    if getattr(image, "is_animated", False):
+        return None
+    if image.mode not in ("RGB", "RGBA"):
+        keep_alpha = "transparency" in image.info or image.mode in ("LA", "PA")
+        image = image.convert("RGBA" if keep_alpha else "RGB")
+
+    width, height = image.size
+    widths = sorted({w for w in WIDTHS if w < width} | {min(width, WIDTHS[-1])})
+
+    def save(target_width, ext, pil_format):
+        target_name = f"{base}-{target_width}.{ext}"
+        if not storage.exists(target_name):
+            resized = image
+            if target_width != width:
+                target_height = max(1, round(height * target_width / width))
+                resized = image.resize((target_width, target_height), Image.Resampling.LANCZOS)
+            if pil_format == "JPEG" and resized.mode == "RGBA":
+                resized = resized.convert("RGB")
+            buffer = io.BytesIO()
+            resized.save(buffer, pil_format, quality=QUALITY, optimize=True)
+            storage.save(target_name, ContentFile(buffer.getvalue()))
+        return storage.url(target_name)
+
+    sources = [
+        {
+            "type": mime,
+            "srcset": ", ".join(f"{save(w, ext, ext.upper())} {w}w" for w in widths),
+        }
+        for ext, mime in available_formats()
+    ]
+    # browsers without AVIF/WebP get the original format, capped in width
+    fallback_ext = FALLBACK_FORMATS.get(image.format or "", "png")
+    fallback_format = "JPEG" if fallback_ext == "jpg" else "PNG"
+    entry = {
+        "width": widths[-1],
+        "height": max(1, round(height * widths[-1] / width)),
+        "src": save(widths[-1], fallback_ext, fallback_format),
+        "sources": sources,
+    }
+    storage.save(manifest_name, ContentFile(json.dumps(entry).encode()))
+    return entry
+
+
+def render_picture(entry, attrs, sizes=DEFAULT_SIZES):
+    """
+    Render a <picture> for a derivative entry.
+
+    Args:
+        entry (dict): As returned by build_derivatives().
+        attrs (dict): Extra <img> attributes (alt, class, ...). Explicit
+            width/height are kept and narrow the ``sizes`` hint.
+        sizes (str): The ``sizes`` attribute for the sources.
+    """
+    attrs = {k: v for k, v in attrs.items() if k not in ("src", "srcset", "sizes")}
+    if str(attrs.get("width", "")).isdigit():
+        shown = int(attrs["width"])
+        sizes = f"(max-width: {shown}px) 100vw, {shown}px"
+        attrs.setdefault("height", round(entry["height"] * shown / entry["width"]))
+    else:
+        attrs["width"], attrs["height"] = entry["width"], entry["height"]
+    attrs.setdefault("alt", "")
+    attrs.setdefault("decoding", "async")
+
+    sources = format_html_join(
+        "",
+        '<source type="{}" srcset="{}" sizes="{}">',
+        ((source["type"], source["srcset"], sizes) for source in entry["sources"]),
+    )
+    img_attrs = format_html_join("", ' {}="{}"', attrs.items())
+    return f'<picture>{sources}<img src="{html.escape(entry["src"])}"{img_attrs}></picture>'
+
+
+def _parse_attrs(tag):
+    attrs = {}
+    for name, value in _attr_re.findall(tag[len("<img"):].rstrip("/>")):
+        if value[:1] in ("'", '"'):
+            value = value[1:-1]
+        attrs[name.lower()] = html.unescape(value)
+    return attrs
+
+
+def _read_source(src):
+    """
+    Return (bytes, name) for an image we host, or None for remote images.
+    """
+    match = _data_uri_re.match(src)
+    if match:
+        encoded = match.group(1)
+        if len(encoded) // 4 * 3 > MAX_SOURCE_BYTES:
+            return None
+        try:
+            return base64.b64decode(encoded), "image"
+        except (binascii.Error, ValueError):
+            return None
+    path = unquote(src.split("?", 1)[0])
+    if settings.MEDIA_URL and path.startswith(settings.MEDIA_URL):
+        name = path[len(settings.MEDIA_URL):]
+        if default_storage.exists(name) and default_storage.size(name) <= MAX_SOURCE_BYTES:
+            with default_storage.open(name) as source:
+                return source.read(), name
+    elif path.startswith(settings.STATIC_URL):
+        found = finders.find(path[len(settings.STATIC_URL):])
+        if found and os.path.getsize(found) <= MAX_SOURCE_BYTES:
+            with open(found, "rb") as source:
+                return source.read(), found
+    return None
+
+
+def _rewrite_tag(tag, sizes, found):
+    attrs = _parse_attrs(tag)
+    src = attrs.get("src", "")
+    if not src or "srcset" in attrs:
+        return tag
+    if src.startswith(content_storage().url("")):
+        # the fallback <img> of a <picture> saved into the content by hand
+        # (or by older versions, which rewrote the content itself)
+        return tag
+    source = _read_source(src)
+    if source is None:
+        return tag
+    entry = build_derivatives(*source, content_storage())
+    if entry is None:
+        return tag
+    if found is not None:
+        found.append(entry)
+    return render_picture(entry, attrs, sizes)
+
+
+def rewrite_images(value, sizes=DEFAULT_SIZES, found=None):
+    """
+    Point every <img> of the rendered HTML of a post that we host (uploads,
+    static files or pasted data: URIs) at responsive derivatives.
+
+    It runs when the post is rendered, on ``content_rendered``: the content
+    the author edits keeps its plain <img> tags. Images that already have a
+    srcset and remote images are left alone.
+
+    Args:
+        found (list): If given, the derivative entries of the rewritten
+            images are appended to it, in document order.
+    """
+    if not value or "<img" not in value.lower():
+        return value
+    return _img_re.sub(lambda match: _rewrite_tag(match.group(0), sizes, found), value)
+
+
+def serve_derivative(request, path):
+    """
+    Serve a derivative of a post image from its storage, cached for good.
+
+    Derivatives are written at runtime, when a post is saved, so they cannot
+    be collected with the static files; this view serves them in production
+    as well as under DEBUG.
+    """
+    storage = content_storage()
+    try:
+        if not storage.exists(path):
+            raise Http404
+        response = FileResponse(storage.open(path), content_type=mimetypes.guess_type(path)[0])
+    except SuspiciousFileOperation:
+        raise Http404
+    response["Cache-Control"] = CACHE_CONTROL
+    return response
+
+
+@lru_cache(maxsize=1)
+def static_manifest():
+    """
+    Return the derivative entries of static images, keyed by their static
+    path, as written by the build_image_derivatives command.
+    """
+    storage = static_storage()
+    try:
+        with storage.open(STATIC_MANIFEST) as manifest:
+            return json.load(manifest)
+    except (FileNotFoundError, ValueError):
+        return {}
@@ -0,0 +1,304 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# how often a worker collects changes; a burst inside one interval is sent
+# as one message per post
+POLL_INTERVAL = getattr(settings, "LIVE_INTERVAL", 1.0)
+# a comment line keeps proxies from closing an idle stream
+HEARTBEAT = 15
+# messages held for a client that is not reading; older ones are dropped
+MAX_PENDING = 50
+# clients reconnect after this many milliseconds when the stream drops
+RETRY_MS = 5000
+
+
+def enabled():
+    """
+    Return whether live updates are served.
+
+    They need a server that can hold a request open without holding a
+    thread (SERVER_MODE=asgi), so they are off under WSGI by default.
+    """
+    return getattr(settings, "LIVE_UPDATES", False)
+
+
+def sse(event, data):
+    """
+    Encode one Server-Sent Events message.
+    """
+    lines = "".join(f"data: {line}\n" for line in str(data).splitlines() or [""])
+    return f"event: {event}\n{lines}\n".encode()
+
+
+class LocalBackend:
+    """
+    Carries changes within one process; for a single worker only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._changes = []
+
+    def publish(self, post_id, comment_id=None):
+        with self._lock:
+            self._changes.append((post_id, comment_id))
+
+    def start(self):
+        self.fetch()
+
+    def fetch(self):
+        """
+        Return the ``(post_id, comment_id)`` changes since the last fetch.
+        """
+        with self._lock:
+            changes, self._changes = self._changes, []
+        return changes
+
+
+class DatabaseBackend:
+    """
+    Carries changes between workers through the LiveEvent table.
+
+    Every worker with open streams reads the rows created in the last
+    ``overlap`` seconds, one indexed query per interval however many
+    clients it serves, and skips the ids it has already seen. Ids are not
+    a safe cursor: a row inserted by a transaction that commits after a
+    later one would be behind it, so the window also has to cover the
+    longest commit delay and the clock skew between workers.
+    Rows older than ``retention`` seconds are deleted as workers publish
+    and poll. A pub/sub server (e.g. Redis) can replace it through
+    LIVE_BACKEND.
+    """
+
+    def __init__(self, retention=60, overlap=10):
+        self.retention = retention
+        self.overlap = overlap
+        self.since = None
+        self.seen = set()
+        self._next_prune = 0.0
+
+    def publish(self, post_id, comment_id=None):
+        from .models import LiveEvent
+
+        LiveEvent.objects.create(post_id=post_id, comment_id=comment_id)
+        self.prune()
+
+    def start(self):
+        # streams only want what happens from now on
+        self.since = None
+        self.fetch()
+
+    def fetch(self):
+        from .models import LiveEvent
+
+        now = timezone.now()
+        since = now - timedelta(seconds=self.overlap)
+        rows = (
+            LiveEvent.objects.filter(created_at__gte=self.since or since)
+            .order_by("id")
+            .values_list("id", "post_id", "comment_id", "created_at")
+        )
+        changes = []
+        seen = set()
+        for event_id, post_id, comment_id, created_at in rows:
+            if self.since is not None and event_id not in self.seen:
+                changes.append((post_id, comment_id))
+            if created_at >= since:
+                seen.add(event_id)
+        # the next poll re-reads from here on, so only these ids matter
+        self.since, self.seen = since, seen
+        self.prune()
+        return changes
+
+    def prune(self):
+        """
+        Delete the rows past their retention, at most once per retention
+        period per worker.
+        """
+        from .models import LiveEvent
+
+        now = time.monotonic()
+        if now >= self._next_prune:
+            self._next_prune = now + self.retention
+            cutoff = timezone.now() - timedelta(seconds=self.retention)
+            LiveEvent.objects.filter(created_at__lt=cutoff).delete()
+
+
+@functools.cache
+def get_backend():
+    return import_string(getattr(settings, "LIVE_BACKEND", "blog.live.DatabaseBackend"))()
+
+
+def publish(post_id, comment_id=None):
+    """
+    Announce that a post's counters changed, or that comment_id was added
+    to it, once the current transaction commits.
+    """
+    if enabled():
+        transaction.on_commit(lambda: get_backend().publish(post_id, comment_id))
+
+
+async def apublish(post_id, comment_id=None):
+    """
+    Async variant of publish(), for async views.
+    """
+    if enabled():
+        await sync_to_async(publish)(post_id, comment_id)
+
+
+def render_changes(changes, post_ids):
+    """
+    Render the messages for the changes to the posts in post_ids.
+
+    Each changed post gets its current counters, whatever number of
+    changes led there, and each new comment is rendered once for all of
+    its readers.
+
+    Returns:
+        dict: ``{post_id: [(message, author_id)]}``.
+    """
+    from .models import Comment, Post
+
+    changed = {post_id for post_id, _ in changes} & post_ids
+    if not changed:
+        return {}
+    comment_ids = {comment_id for post_id, comment_id in changes if comment_id and post_id in changed}
+    messages = defaultdict(list)
+    comments = (
+        Comment.objects.filter(pk__in=comment_ids, active=True)
+        .select_related("author")
+        .order_by("pk")
+        if comment_ids
+        else []
+    )
+    for comment in comments:
+        html = render_to_string("blog/partials/comment_item.html", {"comment": comment})
+        messages[comment.post_id].append((sse("comment", html), comment.author_id))
+    for post_id, likes, comment_count in Post.objects.filter(pk__in=changed).values_list(
+        "pk", "like_count", "comment_count"
+    ):
+        messages[post_id].append((sse("likes", likes) + sse("comments", comment_count), None))
+    return messages
+
+
+class Subscriber:
+    """
+    One open stream: the messages waiting to be sent to it.
+    """
+
+    __slots__ = ("post_id", "user_id", "messages", "ready")
+
+    def __init__(self, post_id, user_id=None):
+        self.post_id = post_id
+        self.user_id = user_id
+        self.messages = deque(maxlen=MAX_PENDING)
+        self.ready = asyncio.Event()
+
+    def put(self, message, author_id=None):
+        # the author already has their comment from the response to the post;
+        # guests have no id here, and the page drops comments it already shows
+        if author_id is not None and author_id == self.user_id:
+            return
+        self.messages.append(message)
+        self.ready.set()
+
+    async def get(self, timeout):
+        """
+        Wait for messages; return them joined, or None after timeout.
+        """
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self.ready.clear()
+        messages = b"".join(self.messages)
+        self.messages.clear()
+        return messages
+
+
+class Hub:
+    """
+    The streams open in this worker, grouped by post.
+
+    While any stream is open a single task polls the backend every
+    ``interval`` seconds and fans the rendered messages out to the
+    subscribers of the changed posts. An open stream costs a coroutine
+    and a small queue, not a thread.
+    """
+
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self._subscribers = defaultdict(set)
+        self._task = None
+
+    def subscribe(self, post_id, user_id=None):
+        subscriber = Subscriber(post_id, user_id)
+        self._subscribers[post_id].add(subscriber)
+        if self._task is None or self._task.done():
+            # a fresh context: the request's metrics and query capture
+            # must not follow the poller for its whole life
+            self._task = asyncio.get_running_loop().create_task(
+                self._run(), context=contextvars.Context()
+            )
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscribers = self._subscribers.get(subscriber.post_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.post_id]
+
+    def _poll(self, backend, post_ids):
+        try:
+            return render_changes(backend.fetch(), post_ids)
+        finally:
+            # the poller's thread is not a request; give the connection back
+            close_old_connections()
+
+    async def _run(self):
+        backend = get_backend()
+        await sync_to_async(backend.start)()
+        while self._subscribers:
+            await asyncio.sleep(self.interval)
+            try:
+                messages = await sync_to_async(self._poll)(backend, set(self._subscribers))
+            except Exception:
+                logger.exception("Failed to poll live updates")
+                continue
+            for post_id, post_messages in messages.items():
+                for subscriber in self._subscribers.get(post_id, ()):
+                    for message, author_id in post_messages:
+                        subscriber.put(message, author_id)
+
+    async def stream(self, post_id, user_id=None):
+        """
+        Yield the Server-Sent Events of a post until the client leaves.
+        """
+        subscriber = self.subscribe(post_id, user_id)
+        try:
+            yield f"retry: {RETRY_MS}\n\n".encode()
+            while True:
+                messages = await subscriber.get(HEARTBEAT)
+                yield messages if messages is not None else b": keepalive\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+
+hub = Hub()
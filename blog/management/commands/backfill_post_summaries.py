@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute the stored excerpt, word count, reading time and rendered HTML "
+        "for the posts that lack them (all posts with --all)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=200,
+            help="Number of posts loaded and written per batch.",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Re-render every post, e.g. after the rendering code changed.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        batch = []
+        total = 0
+        posts = Post.objects.only("pk", "content").order_by("pk")
+        if not options["all"]:
+            posts = posts.exclude(content="").filter(Q(word_count=0) | Q(content_rendered=""))
+        for post in posts.iterator(chunk_size=batch_size):
+            post.update_summary()
+            post.render_content()
+            batch.append(post)
+            if len(batch) >= batch_size:
+                total += self._write(batch, batch_size)
+                batch = []
+        if batch:
+            total += self._write(batch, batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Updated summaries for {total} post(s)."))
+
+    def _write(self, batch, batch_size):
+        Post.objects.bulk_update(
+            batch, Post.SUMMARY_FIELDS + Post.RENDERED_FIELDS, batch_size=batch_size
+        )
+        return len(batch)
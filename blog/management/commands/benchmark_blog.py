@@ -0,0 +1,66 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the main blog views through the test client at several dataset "
+        "sizes, report latency percentiles and query counts, and fail on "
+        "regressions against the stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="100,1000",
+            help="Comma-separated numbers of seeded posts (default: 100,1000).",
+        )
+        parser.add_argument("--iterations", type=int, default=30, help="Requests per view.")
+        parser.add_argument("--baseline", type=Path, default=benchmarks.DEFAULT_BASELINE)
+        parser.add_argument(
+            "--save-baseline",
+            action="store_true",
+            help="Store these results as the new baseline instead of comparing.",
+        )
+        parser.add_argument(
+            "--latency-tolerance",
+            type=float,
+            default=0.5,
+            help="Allowed p95 growth before failing, as a fraction (default: 0.5).",
+        )
+        parser.add_argument(
+            "--queries-only",
+            action="store_true",
+            help="Compare query counts only (for machines unlike the baseline's).",
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",") if size.strip()]
+        results = benchmarks.run(sizes=sizes, iterations=options["iterations"])
+
+        for size, views in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{size} posts"))
+            self.stdout.write(f"  {'view':<28} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>9}")
+            for name, row in views.items():
+                self.stdout.write(
+                    f"  {name:<28} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} "
+                    f"{row['cold_queries']:>4}/{row['warm_queries']:<4}"
+                )
+
+        if options["save_baseline"]:
+            benchmarks.save_baseline(options["baseline"], results)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}."))
+            return
+
+        baseline = benchmarks.load_baseline(options["baseline"])
+        if baseline is None:
+            self.stdout.write(self.style.WARNING("No baseline to compare with; run with --save-baseline."))
+            return
+        tolerance = None if options["queries_only"] else options["latency_tolerance"]
+        regressions = benchmarks.compare(results, baseline, tolerance)
+        if regressions:
+            raise CommandError("Performance regressions:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
@@ -0,0 +1,54 @@
+import json
+
+from django.contrib.staticfiles import finders
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+
+from blog import images
+from blog.models import Post
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+class Command(BaseCommand):
+    help = (
+        "Build responsive WebP/AVIF derivatives of the static images into "
+        "STATIC_ROOT (run after collectstatic), and optionally re-render "
+        "existing posts to build the derivatives of their images."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--posts",
+            action="store_true",
+            help=(
+                "Also re-render the posts with images, e.g. after moving "
+                "MEDIA_ROOT or losing the derivatives."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        storage = images.static_storage()
+        manifest = {}
+        # the project's own static files (STATICFILES_DIRS), not the apps'
+        finder = finders.get_finder("django.contrib.staticfiles.finders.FileSystemFinder")
+        for path, source_storage in finder.list(ignore_patterns=[]):
+            if not path.lower().endswith(IMAGE_EXTENSIONS) or path in manifest:
+                continue
+            with source_storage.open(path) as source:
+                entry = images.build_derivatives(source.read(), path, storage)
+            if entry is not None:
+                manifest[path] = entry
+                self.stdout.write(f"  {path}")
+        if storage.exists(images.STATIC_MANIFEST):
+            storage.delete(images.STATIC_MANIFEST)
+        storage.save(images.STATIC_MANIFEST, ContentFile(json.dumps(manifest).encode()))
+        self.stdout.write(self.style.SUCCESS(f"Built derivatives for {len(manifest)} static image(s)."))
+
+        if options["posts"]:
+            rendered = 0
+            for post in Post.objects.filter(content__icontains="<img").iterator():
+                # a regular save, so caches and the search index follow
+                post.save(update_fields=["content"])
+                rendered += 1
+            self.stdout.write(self.style.SUCCESS(f"Re-rendered {rendered} post(s) with images."))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.query_plans import QueryPlanError, check_query_plans
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the hot blog queries against a seeded (and rolled back) "
+        "dataset and fail if any of them is planned as a sequential scan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=300, help="Number of posts to seed.")
+        parser.add_argument("--verbose-plans", action="store_true", help="Print every plan.")
+
+    def handle(self, *args, **options):
+        try:
+            plans = check_query_plans(posts=options["posts"])
+        except QueryPlanError as exc:
+            raise CommandError(str(exc))
+        if options["verbose_plans"]:
+            for name, plan in plans.items():
+                self.stdout.write(f"{name}:\n{plan}\n")
+        self.stdout.write(self.style.SUCCESS(f"{len(plans)} hot queries use indexes."))
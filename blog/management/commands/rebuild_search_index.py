@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from blog import search
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = "Rebuild the SQLite FTS5 index of posts (PostgreSQL maintains its own)."
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            self.stdout.write("The search index is maintained by the database; nothing to do.")
+            return
+
+        count = 0
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {search.FTS_TABLE}")
+            for post in Post.objects.only("pk", "title", "content").iterator():
+                search.index_post(post)
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} post(s)."))
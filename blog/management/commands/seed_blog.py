@@ -0,0 +1,198 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+from taggit.models import Tag, TaggedItem
+
+from blog import fragment_cache
+from blog.categories import invalidate_category_index
+from blog.models import Category, Comment, Like, Post
+from blog.tags import refresh_tag_stats
+from core.sitemaps import invalidate_sitemaps
+
+WORDS = (
+    "computer rete wifi router stampante backup dati cloud sicurezza password "
+    "aggiornamento sistema windows linux mac portatile schermo tastiera disco "
+    "memoria processore software installazione configurazione assistenza "
+    "sito web pagina server dominio posta elettronica antivirus firewall "
+    "velocità connessione problema soluzione guida consiglio veloce semplice "
+    "casa ufficio lavoro serale weekend tecnico cliente progetto sviluppo"
+).split()
+
+CATEGORY_NAMES = (
+    "Guide", "Sicurezza", "Reti", "Hardware", "Software", "Sviluppo Web",
+    "Cloud", "Backup", "Novità", "Consigli",
+)
+
+CODE_SAMPLE = """<pre class="language-python"><code>def backup(path):
+    for name in sorted(listdir(path)):
+        copy(join(path, name), DEST)
+</code></pre>"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-generate users, categories, tags, posts with realistic HTML "
+        "bodies, comments and likes for local testing and benchmarks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--posts", type=int, default=500)
+        parser.add_argument("--categories", type=int, default=8)
+        parser.add_argument("--tags", type=int, default=30)
+        parser.add_argument("--comments", type=int, default=8, help="Average comments per post.")
+        parser.add_argument("--likes", type=int, default=10, help="Average likes per post.")
+        parser.add_argument("--seed", type=int, default=None, help="Random seed, for repeatable data.")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+        # lets the command run repeatedly without slug/username clashes
+        run = get_random_string(6, "abcdefghijklmnopqrstuvwxyz0123456789")
+
+        with transaction.atomic():
+            users = self._users(options["users"], run, batch_size)
+            categories = self._categories(options["categories"], run)
+            tags = self._tags(options["tags"], run)
+            posts = self._posts(rng, options["posts"], run, users, categories, batch_size)
+            self._tag_posts(rng, posts, tags, batch_size)
+            comments = self._comments(rng, posts, users, options["comments"], batch_size)
+            likes = self._likes(rng, posts, users, options["likes"], batch_size)
+
+            # bulk inserts skip the signals that maintain the denormalized data
+            Post.objects.filter(pk__in=[post.pk for post in posts]).sync_counters()
+            refresh_tag_stats([tag.pk for tag in tags])
+        call_command("rebuild_search_index", stdout=self.stdout)
+        invalidate_category_index()
+        invalidate_sitemaps()
+        fragment_cache.bump_site_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(users)} users, {len(categories)} categories, {len(tags)} tags, "
+            f"{len(posts)} posts, {comments} comments and {likes} likes."
+        ))
+
+    def _users(self, count, run, batch_size):
+        User = get_user_model()
+        # hashing once keeps seeding fast; every seeded user shares it
+        password = make_password("seed-password")
+        return User.objects.bulk_create(
+            [
+                User(
+                    username=f"seed-{run}-{i}",
+                    email=f"seed-{run}-{i}@example.com",
+                    first_name=f"Utente {i}",
+                    password=password,
+                )
+                for i in range(count)
+            ],
+            batch_size=batch_size,
+        )
+
+    def _categories(self, count, run):
+        return Category.objects.bulk_create(
+            Category(
+                name=f"{CATEGORY_NAMES[i % len(CATEGORY_NAMES)]} {run}",
+                slug=f"seed-{run}-{i}",
+            )
+            for i in range(count)
+        )
+
+    def _tags(self, count, run):
+        return Tag.objects.bulk_create(
+            Tag(name=f"{WORDS[i % len(WORDS)]} {run}-{i}", slug=f"seed-{run}-{i}") for i in range(count)
+        )
+
+    def _sentence(self, rng, words):
+        sentence = " ".join(rng.choice(WORDS) for _ in range(words))
+        return sentence[0].upper() + sentence[1:] + "."
+
+    def _body(self, rng):
+        """
+        An HTML body with the kind of markup TinyMCE produces.
+        """
+        parts = []
+        for section in range(rng.randint(2, 5)):
+            parts.append(f"<h2>{self._sentence(rng, 4)[:-1]}</h2>")
+            for _ in range(rng.randint(2, 4)):
+                text = " ".join(self._sentence(rng, rng.randint(8, 20)) for _ in range(rng.randint(2, 5)))
+                parts.append(f'<p style="text-align: justify;">{text}</p>')
+            if rng.random() < 0.4:
+                items = "".join(f"<li>{self._sentence(rng, 5)}</li>" for _ in range(rng.randint(3, 6)))
+                parts.append(f"<ul>{items}</ul>")
+            if rng.random() < 0.2:
+                parts.append(CODE_SAMPLE)
+            if rng.random() < 0.3:
+                parts.append('<p><a href="https://www.tecnopronto.it/" target="_blank">Tecno Pronto</a></p>')
+            parts.append("<p>&nbsp;</p>")
+        return "\n".join(parts)
+
+    def _posts(self, rng, count, run, users, categories, batch_size):
+        now = timezone.now()
+        posts = []
+        for i in range(count):
+            title = self._sentence(rng, rng.randint(4, 9))[:-1]
+            post = Post(
+                title=title,
+                slug=f"seed-{run}-{i}",
+                author=rng.choice(users),
+                content=self._body(rng),
+                category=rng.choice(categories) if rng.random() < 0.9 else None,
+                status="draft" if rng.random() < 0.1 else "published",
+                views=rng.randint(0, 5000),
+            )
+            # bulk_create() bypasses Post.save()
+            post.update_summary()
+            post.render_content()
+            posts.append(post)
+        posts = Post.objects.bulk_create(posts, batch_size=batch_size)
+
+        # created_at is auto_now_add; spread the posts over the last two years
+        for post in posts:
+            post.created_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 730))
+            post.publish = post.created_at
+        Post.objects.bulk_update(posts, ["created_at", "publish"], batch_size=batch_size)
+        return posts
+
+    def _tag_posts(self, rng, posts, tags, batch_size):
+        content_type = ContentType.objects.get_for_model(Post)
+        TaggedItem.objects.bulk_create(
+            [
+                TaggedItem(tag=tag, content_type=content_type, object_id=post.pk)
+                for post in posts
+                for tag in rng.sample(tags, min(len(tags), rng.randint(0, 4)))
+            ],
+            batch_size=batch_size,
+        )
+
+    def _comments(self, rng, posts, users, average, batch_size):
+        comments = []
+        for post in posts:
+            for _ in range(rng.randint(0, average * 2)):
+                comments.append(
+                    Comment(
+                        post=post,
+                        author=rng.choice(users),
+                        content=self._sentence(rng, rng.randint(5, 30)),
+                        active=rng.random() > 0.05,
+                    )
+                )
+        Comment.objects.bulk_create(comments, batch_size=batch_size)
+        return len(comments)
+
+    def _likes(self, rng, posts, users, average, batch_size):
+        likes = []
+        for post in posts:
+            for user in rng.sample(users, min(len(users), rng.randint(0, average * 2))):
+                likes.append(Like(user=user, post=post))
+        Like.objects.bulk_create(likes, batch_size=batch_size, ignore_conflicts=True)
+        return len(likes)
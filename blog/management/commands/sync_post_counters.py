@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from blog import fragment_cache
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = "Reconcile the denormalized like_count/comment_count columns on Post."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the posts whose counters have drifted.",
+        )
+
+    def handle(self, *args, **options):
+        drifted = list(Post.objects.with_counter_drift().values_list("pk", flat=True))
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("All post counters are in sync."))
+            return
+
+        if options["dry_run"]:
+            self.stdout.write(f"{len(drifted)} post(s) have drifted counters: {drifted}")
+            return
+
+        updated = Post.objects.filter(pk__in=drifted).sync_counters()
+        for post_id in drifted:
+            fragment_cache.bump_version(post_id)
+        self.stdout.write(self.style.SUCCESS(f"Reconciled counters on {updated} post(s)."))
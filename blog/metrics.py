@@ -0,0 +1,425 @@
+import hmac
+import logging
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+from django.template.backends.django import Template as DjangoTemplate
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# name -> (help, buckets, RequestMetrics attribute)
+HISTOGRAMS = {
+    "view_duration_seconds": ("Time spent handling the request.", SECONDS_BUCKETS, "total"),
+    "view_db_duration_seconds": ("Time spent in database queries.", SECONDS_BUCKETS, "db_time"),
+    "view_db_queries": ("Database queries per request.", COUNT_BUCKETS, "db_queries"),
+    "view_template_duration_seconds": ("Time spent rendering templates.", SECONDS_BUCKETS, "template_time"),
+}
+COUNTERS = {
+    "view_cache_hits_total": ("Cache lookups that found a value.", "cache_hits"),
+    "view_cache_misses_total": ("Cache lookups that found nothing.", "cache_misses"),
+}
+# per worker, from the post view buffer's stats(): name -> (type, help, key)
+VIEW_BUFFER = {
+    "view_buffer_pending_hits": ("gauge", "Post views buffered, not yet written.", "pending_hits"),
+    "view_buffer_oldest_pending_seconds": ("gauge", "Age of the oldest buffered post view.", "oldest_pending_age"),
+    "view_buffer_last_flush_lag_seconds": (
+        "gauge", "How long the oldest view of the last flush waited.", "last_flush_lag",
+    ),
+    "view_buffer_flushed_hits_total": ("counter", "Post views written to the database.", "flushed_hits"),
+}
+
+# each worker publishes its totals in a slot of its own, claimed with
+# cache.add() so that two workers starting at once never share one
+SLOT_KEY = "metrics:slot:{}"
+# a worker's totals outlive it this long, so a restart reads as a counter
+# reset to Prometheus instead of the series vanishing mid-scrape
+RETENTION = 60 * 60 * 24
+
+_current = ContextVar("request_metrics", default=None)
+_MISSING = object()
+
+
+class RequestMetrics:
+    """
+    The measurements of one request, filled in by the database, template
+    and cache instrumentation while the request is being handled.
+    """
+
+    __slots__ = (
+        "started", "total", "db_queries", "db_time", "template_time",
+        "template_depth", "cache_hits", "cache_misses",
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def server_timing(self):
+        """
+        Return the measurements as a ``Server-Timing`` header value.
+        """
+        return ", ".join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.db_queries} queries"',
+            f"tpl;dur={self.template_time * 1000:.1f}",
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+            f"total;dur={self.total * 1000:.1f}",
+        ])
+
+
+def start_request():
+    """
+    Start collecting the measurements of the current request (or task).
+
+    Returns:
+        tuple: The metrics and the token to pass to finish_request().
+    """
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def finish_request(metrics, token):
+    metrics.total = time.perf_counter() - metrics.started
+    _current.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    A database execute wrapper (see connection.execute_wrapper()) timing
+    every query of the request.
+
+    It is installed on every connection for good rather than per request:
+    under ASGI the ORM runs in worker threads with connections of their
+    own, and the request is found through the context variable, which
+    sync_to_async() carries into those threads.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def _timed_render(render):
+    def wrapper(self, *args, **kwargs):
+        metrics = _current.get()
+        if metrics is None:
+            return render(self, *args, **kwargs)
+        # render_to_string() called from inside a template (tags, fragment
+        # caches) must not count twice
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_time += time.perf_counter() - started
+
+    wrapper._metrics_original = render
+    return wrapper
+
+
+def _counted_get(get):
+    def wrapper(self, key, default=None, version=None):
+        metrics = _current.get()
+        if metrics is None:
+            return get(self, key, default, version)
+        value = get(self, key, _MISSING, version)
+        if value is _MISSING:
+            metrics.cache_misses += 1
+            return default
+        metrics.cache_hits += 1
+        return value
+
+    wrapper._metrics_original = get
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    def wrapper(self, keys, version=None):
+        found = get_many(self, keys, version)
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.cache_hits += len(found)
+            metrics.cache_misses += len(keys) - len(found)
+        return found
+
+    wrapper._metrics_original = get_many
+    return wrapper
+
+
+def add_execute_wrapper(connection, wrapper):
+    """
+    Install an execute wrapper on a connection for its whole life.
+    """
+    if wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(wrapper)
+
+
+def _connection_created(sender, connection, **kwargs):
+    add_execute_wrapper(connection, record_query)
+
+
+def watch_connections():
+    """
+    Install record_query on the open connections and every new one.
+
+    Called when the app is ready, before any request can open a connection
+    in a thread of its own.
+    """
+    connection_created.connect(_connection_created, dispatch_uid="blog.metrics")
+    for connection in connections.all(initialized_only=True):
+        add_execute_wrapper(connection, record_query)
+
+
+def install():
+    """
+    Instrument queries, template rendering and the configured cache
+    backends.
+
+    Called from BlogConfig.ready() when settings.METRICS_ENABLED is on.
+    Django has no hooks for templates or caches outside of tests, so the
+    backend classes' methods are wrapped, once. The wrappers cost one
+    context variable lookup when no request is being measured.
+    """
+    watch_connections()
+    if not hasattr(DjangoTemplate.render, "_metrics_original"):
+        DjangoTemplate.render = _timed_render(DjangoTemplate.render)
+    for alias in settings.CACHES:
+        backend = type(caches[alias])
+        if not hasattr(backend.get, "_metrics_original"):
+            backend.get = _counted_get(backend.get)
+        if not hasattr(backend.get_many, "_metrics_original"):
+            backend.get_many = _counted_get_many(backend.get_many)
+
+
+class MetricsRegistry:
+    """
+    Per-view histograms and counters, aggregated in process memory.
+
+    Recording a request is a few bisects and additions under a lock. Every
+    ``flush_interval`` seconds the worker writes its totals to the cache
+    in one of ``slots`` slots, so the /metrics endpoint can report every
+    worker whichever one serves the scrape (with a shared cache; a
+    per-process cache only holds the serving worker's own series).
+    """
+
+    def __init__(self, flush_interval=15, slots=64):
+        self.flush_interval = flush_interval
+        self.slots = slots
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = threading.Lock()
+        self._views = {}
+        self._last_flush = time.monotonic()
+        self._slot = None
+
+    def _new_view(self):
+        return {
+            "histograms": {
+                name: [[0] * (len(buckets) + 1), 0, 0]
+                for name, (_, buckets, _) in HISTOGRAMS.items()
+            },
+            "counters": dict.fromkeys(COUNTERS, 0),
+        }
+
+    def record(self, view, metrics):
+        """
+        Add a finished request's measurements to the view's series, and
+        publish the totals if they are due.
+
+        Args:
+            view (str): The view name, e.g. "blog:post_detail".
+            metrics (RequestMetrics): The request's measurements.
+        """
+        if self._add(view, metrics):
+            self.flush()
+
+    async def arecord(self, view, metrics):
+        """
+        Async variant of record(); publishing (cache I/O) runs in a thread.
+        """
+        if self._add(view, metrics):
+            await sync_to_async(self.flush)()
+
+    def _add(self, view, metrics):
+        now = time.monotonic()
+        with self._lock:
+            series = self._views.get(view)
+            if series is None:
+                series = self._views[view] = self._new_view()
+            for name, (_, buckets, attr) in HISTOGRAMS.items():
+                value = getattr(metrics, attr)
+                histogram = series["histograms"][name]
+                histogram[0][bisect_left(buckets, value)] += 1
+                histogram[1] += value
+                histogram[2] += 1
+            for name, (_, attr) in COUNTERS.items():
+                series["counters"][name] += getattr(metrics, attr)
+            due = now - self._last_flush >= self.flush_interval
+            if due:
+                self._last_flush = now
+        return due
+
+    def snapshot(self):
+        from .view_counter import view_counts
+
+        with self._lock:
+            views = {
+                view: {
+                    "histograms": {
+                        name: [list(counts), total, count]
+                        for name, (counts, total, count) in series["histograms"].items()
+                    },
+                    "counters": dict(series["counters"]),
+                }
+                for view, series in self._views.items()
+            }
+        return {"views": views, "view_buffer": view_counts.stats()}
+
+    def flush(self):
+        """
+        Publish this worker's totals to the shared cache.
+
+        The first flush claims a free slot with cache.add(), which only one
+        worker can win; later ones overwrite the slot after checking it is
+        still this worker's (it may have expired after a day without
+        requests and been claimed by another worker since).
+        """
+        try:
+            payload = {"worker": self.worker, **self.snapshot()}
+            if self._slot is not None:
+                key = SLOT_KEY.format(self._slot)
+                if (cache.get(key) or {}).get("worker") == self.worker:
+                    cache.set(key, payload, RETENTION)
+                    return
+            self._slot = self._claim_slot(payload)
+            if self._slot is None:
+                logger.warning(
+                    "No free metrics slot for worker %s; raise METRICS_WORKER_SLOTS",
+                    self.worker,
+                )
+        except Exception:
+            logger.exception("Failed to publish request metrics")
+
+    def _claim_slot(self, payload):
+        for slot in range(self.slots):
+            if cache.add(SLOT_KEY.format(slot), payload, RETENTION):
+                return slot
+        return None
+
+    def collect(self):
+        """
+        Return the totals of every worker that published them, as
+        ``{worker: snapshot}``.
+
+        The workers are kept apart rather than added up: with a cache that
+        is not shared, each worker only sees its own totals, and a sum
+        would jump between unrelated values from one scrape to the next.
+        """
+        self.flush()
+        snapshots = cache.get_many([SLOT_KEY.format(slot) for slot in range(self.slots)])
+        return {snapshot["worker"]: snapshot for snapshot in snapshots.values()}
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(workers):
+    """
+    Render collected series in the Prometheus text exposition format,
+    labelled with their view and worker; sum by view for site totals.
+    """
+    lines = []
+    for name, (help_text, buckets, _) in HISTOGRAMS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for worker, view, series in _series(workers):
+            histogram = series["histograms"].get(name)
+            if histogram is None or len(histogram[0]) != len(buckets) + 1:
+                continue  # written by a release with other buckets
+            counts, total, count = histogram
+            labels = f'view="{_label(view)}",worker="{_label(worker)}"'
+            cumulative = 0
+            for bound, bucket_count in zip((*buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {_number(total)}")
+            lines.append(f"{name}_count{{{labels}}} {count}")
+    for name, (help_text, _) in COUNTERS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for worker, view, series in _series(workers):
+            if name in series["counters"]:
+                labels = f'view="{_label(view)}",worker="{_label(worker)}"'
+                lines.append(f"{name}{{{labels}}} {series['counters'][name]}")
+    for name, (kind, help_text, key) in VIEW_BUFFER.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for worker in sorted(workers):
+            value = workers[worker].get("view_buffer", {}).get(key)
+            if value is not None:
+                lines.append(f'{name}{{worker="{_label(worker)}"}} {_number(value)}')
+    return "\n".join(lines) + "\n"
+
+
+def _series(workers):
+    for worker in sorted(workers):
+        views = workers[worker]["views"]
+        for view in sorted(views):
+            yield worker, view, views[view]
+
+
+registry = MetricsRegistry(
+    flush_interval=getattr(settings, "METRICS_FLUSH_INTERVAL", 15),
+    slots=getattr(settings, "METRICS_WORKER_SLOTS", 64),
+)
+
+
+def metrics_view(request):
+    """
+    Expose the per-view metrics of all workers to Prometheus, one series
+    per view and worker.
+
+    Readable by staff users, or by a scraper sending
+    ``Authorization: Bearer <METRICS_TOKEN>`` when that setting is set.
+    """
+    if not getattr(settings, "METRICS_ENABLED", True):
+        raise Http404
+    token = getattr(settings, "METRICS_TOKEN", "")
+    header = request.headers.get("Authorization", "")
+    authorized = bool(token) and hmac.compare_digest(header, f"Bearer {token}")
+    if not authorized and not request.user.is_staff:
+        raise PermissionDenied
+    response = HttpResponse(
+        render_prometheus(registry.collect()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+    response["Cache-Control"] = "no-store"
+    return response
@@ -1,47 +1,301 @@
-class PostViewCounterMiddleware:
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+
+from . import metrics, nplusone, profiling
+from .view_counter import view_counts
+
+
+class AsyncCapableMiddleware:
     """
-    Middleware to track and increment view counts for blog posts.
-    
-    This middleware automatically increments the view counter
-    when a user accesses a blog post detail page.
+    Base class for middleware that runs natively under WSGI and ASGI.
+
+    Django calls middleware with the get_response of the next layer; when
+    that is a coroutine function the request is being served by the ASGI
+    handler and ``__acall__`` is used, so no thread is spent adapting the
+    middleware. Subclasses implement both ``handle`` and ``__acall__``.
     """
-    
+
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         """
         Initialize the middleware.
-        
+
         Args:
             get_response: The next middleware/handler in the chain
         """
         self.get_response = get_response
-        
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.handle(request)
+
+
+class PostViewCounterMiddleware(AsyncCapableMiddleware):
+    """
+    Middleware to track and increment view counts for blog posts.
+
+    This middleware records a hit for every successful blog post detail page
+    response. Hits go to a write-behind buffer (see blog.view_counter) which
+    flushes them as batched ``views = views + n`` updates, so a busy post does
+    not turn every read into a row write.
+    """
+
+    def handle(self, request):
         """
-        Process each request and increment post views if applicable.
-        
+        Process each request and record a post view if applicable.
+
         Args:
             request: The HTTP request object
-            
+
         Returns:
             response: The HTTP response object
         """
         # Process the request through the rest of the middleware chain
         # and get the response
         response = self.get_response(request)
-        
-        # Check if this request is for a blog post detail page
-        # - Verify that resolver_match exists (not None for valid URLs)
-        # - Check if the view name matches 'blog:post_detail'
-        if (request.resolver_match and 
-            request.resolver_match.view_name == 'blog:post_detail'):
-            
-            # Extract the post object from URL kwargs
-            # This assumes the URL pattern includes a 'post' parameter
-            post = request.resolver_match.kwargs.get('post')
-            
-            # If a post object was found in the URL, increment its view count
-            if post:
-                post.views += 1  # Increment the view counter
-                post.save(update_fields=['views'])  # Save only the views field for efficiency
-                
-        return response
\ No newline at end of file
+
+        post_id = self._viewed_post(request, response)
+        if post_id:
+            view_counts.add(post_id)
+
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        post_id = self._viewed_post(request, response)
+        if post_id:
+            # only a due flush leaves the event loop
+            await view_counts.aadd(post_id)
+        return response
+
+    def _viewed_post(self, request, response):
+        # PostDetailView stores the id of the post it displayed on the
+        # request; only count successful page views
+        post_id = getattr(request, 'viewed_post_id', None)
+        return post_id if response.status_code == 200 else None
+
+
+class RequestMetricsMiddleware(AsyncCapableMiddleware):
+    """
+    Middleware to measure every request and aggregate it per view.
+
+    Counts and times the database queries, times template rendering, counts
+    cache hits and misses and times the whole request. The figures go into
+    a ``Server-Timing`` header (browser dev tools show them per request)
+    and into the per-view histograms of blog.metrics, served to Prometheus
+    at /metrics. Place it early in MIDDLEWARE so session and user queries
+    are included. Disabled, with the instrumentation, when
+    settings.METRICS_ENABLED is off.
+    """
+
+    def __init__(self, get_response):
+        """
+        Initialize the middleware.
+
+        Args:
+            get_response: The next middleware/handler in the chain
+        """
+        if not getattr(settings, "METRICS_ENABLED", True):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.server_timing = getattr(settings, "METRICS_SERVER_TIMING", True)
+
+    def handle(self, request):
+        """
+        Measure the request and record it under its view name.
+
+        Args:
+            request: The HTTP request object
+
+        Returns:
+            response: The HTTP response object
+        """
+        request_metrics, token = metrics.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.finish_request(request_metrics, token)
+        metrics.registry.record(self._view_name(request), request_metrics)
+        return self._finish(response, request_metrics)
+
+    async def __acall__(self, request):
+        request_metrics, token = metrics.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.finish_request(request_metrics, token)
+        await metrics.registry.arecord(self._view_name(request), request_metrics)
+        return self._finish(response, request_metrics)
+
+    def _view_name(self, request):
+        match = getattr(request, "resolver_match", None)
+        # unresolved URLs share one series instead of one per path
+        return match.view_name if match else "<unresolved>"
+
+    def _finish(self, response, request_metrics):
+        if self.server_timing:
+            response["Server-Timing"] = request_metrics.server_timing()
+        return response
+
+
+class NPlusOneMiddleware(AsyncCapableMiddleware):
+    """
+    Middleware to report repeated queries (N+1 patterns) per request.
+
+    Groups the queries of a view and its templates by shape and, when one
+    is repeated more than settings.NPLUSONE_THRESHOLD times, logs or raises
+    (settings.NPLUSONE_ACTION) with the template line or code frame that ran
+    it. Only views of settings.NPLUSONE_APPS are checked. Disabled entirely
+    when the action is "off"; put it last in MIDDLEWARE so only the view's
+    own queries count.
+    """
+
+    def __init__(self, get_response):
+        """
+        Initialize the middleware.
+
+        Args:
+            get_response: The next middleware/handler in the chain
+        """
+        self.action = getattr(settings, "NPLUSONE_ACTION", "off")
+        if self.action not in nplusone.ACTIONS:
+            raise ValueError(f"NPLUSONE_ACTION must be one of {nplusone.ACTIONS}")
+        if self.action == "off":
+            raise MiddlewareNotUsed
+        self.apps = set(getattr(settings, "NPLUSONE_APPS", ()))
+        super().__init__(get_response)
+
+    def handle(self, request):
+        """
+        Capture the request's queries and check them.
+
+        Args:
+            request: The HTTP request object
+
+        Returns:
+            response: The HTTP response object
+        """
+        shapes = nplusone.QueryShapes()
+        with shapes.capture():
+            response = self.get_response(request)
+        self._check(request, shapes)
+        return response
+
+    async def __acall__(self, request):
+        shapes = nplusone.QueryShapes()
+        with shapes.capture():
+            response = await self.get_response(request)
+        self._check(request, shapes)
+        return response
+
+    def _check(self, request, shapes):
+        match = getattr(request, "resolver_match", None)
+        if match and (not self.apps or nplusone.view_app(match) in self.apps):
+            shapes.check(f"{match.view_name} ({request.method} {request.path})", self.action)
+
+
+class RequestProfilerMiddleware(AsyncCapableMiddleware):
+    """
+    Middleware to run chosen requests under the sampling profiler.
+
+    A request is profiled when a staff user adds ``?_profile`` or an
+    ``X-Profile`` header, or when its view has an armed ProfilingTarget in
+    the admin ("profile the next N requests to this view"). The profile is
+    saved as a speedscope file (see blog.profiling) whose name is returned
+    in the ``X-Profile-Capture`` header. Other requests pay a dictionary
+    lookup; the armed targets are re-read at most every few seconds, and
+    the URL is only resolved here while some view is armed. Must come
+    after AuthenticationMiddleware.
+
+    Under ASGI the capture has two profiles: the event loop thread, where
+    async views and middleware run, and the thread that runs the request's
+    sync code (sync views, and the ORM calls of async views), which Django
+    keeps to one thread per request.
+    """
+
+    def __init__(self, get_response):
+        """
+        Initialize the middleware.
+
+        Args:
+            get_response: The next middleware/handler in the chain
+        """
+        super().__init__(get_response)
+        self.targets = profiling.TargetPoller()
+
+    def handle(self, request):
+        """
+        Profile the request if a staff user asked for it or its view is
+        armed.
+
+        Args:
+            request: The HTTP request object
+
+        Returns:
+            response: The HTTP response object
+        """
+        sampler = None
+        if self._flagged(request) and request.user.is_staff:
+            sampler = profiling.Sampler().start()
+        else:
+            target_id = self._target(request, self.targets.get())
+            if target_id is not None and profiling.claim(target_id):
+                sampler = profiling.Sampler().start()
+
+        response = self.get_response(request)
+
+        if sampler is not None:
+            sampler.stop()
+            path = profiling.save_capture(sampler, request, self._view_name(request))
+            response["X-Profile-Capture"] = path.name
+        return response
+
+    async def __acall__(self, request):
+        sampler = None
+        if self._flagged(request) and (await request.auser()).is_staff:
+            sampler = profiling.Sampler(name="event loop").start()
+        else:
+            target_id = self._target(request, await self.targets.aget())
+            if target_id is not None and await sync_to_async(profiling.claim)(target_id):
+                sampler = profiling.Sampler(name="event loop").start()
+
+        if sampler is not None:
+            # thread-sensitive, so this runs in the thread that will run the
+            # request's sync view
+            await sync_to_async(sampler.follow)("sync")
+        response = await self.get_response(request)
+
+        if sampler is not None:
+            sampler.stop()
+            path = await sync_to_async(profiling.save_capture)(
+                sampler, request, self._view_name(request)
+            )
+            response["X-Profile-Capture"] = path.name
+        return response
+
+    def _flagged(self, request):
+        return "_profile" in request.GET or "HTTP_X_PROFILE" in request.META
+
+    def _target(self, request, targets):
+        """
+        Return the id of the armed target for the request's view, if any.
+        """
+        if not targets:
+            return None
+        try:
+            match = resolve(request.path_info, getattr(request, "urlconf", None))
+        except Resolver404:
+            return None
+        return targets.get(match.view_name)
+
+    def _view_name(self, request):
+        match = getattr(request, "resolver_match", None)
+        return match.view_name if match else "unresolved"
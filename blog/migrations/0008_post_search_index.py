@@ -0,0 +1,70 @@
+import html
+import re
+
+from django.db import migrations
+from django.utils.html import strip_tags
+
+_whitespace_re = re.compile(r"\s+")
+
+
+def plain_text(value):
+    # frozen copy of blog.text.plain_text as of this migration
+    text = strip_tags(value.replace("<", " <"))
+    return _whitespace_re.sub(" ", html.unescape(text)).strip()
+
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE blog_post ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('italian', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('italian', regexp_replace(coalesce(content, ''), '<[^>]+>', ' ', 'g')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX blog_post_search_vector_idx ON blog_post USING GIN (search_vector)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS blog_post_search_vector_idx",
+    "ALTER TABLE blog_post DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for statement in POSTGRES_FORWARD:
+            schema_editor.execute(statement)
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE blog_post_fts USING fts5("
+            "title, body, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        Post = apps.get_model('blog', 'Post')
+        rows = [
+            (post.pk, post.title, plain_text(post.content or ''))
+            for post in Post.objects.only('pk', 'title', 'content').iterator()
+        ]
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO blog_post_fts (rowid, title, body) VALUES (%s, %s, %s)", rows
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for statement in POSTGRES_BACKWARD:
+            schema_editor.execute(statement)
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS blog_post_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_post_excerpt_word_count_reading_time'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
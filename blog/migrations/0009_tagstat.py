@@ -0,0 +1,44 @@
+# Generated by Django 5.1.3 on 2026-10-18 07:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_tag_stats(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Post = apps.get_model('blog', 'Post')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    TagStat = apps.get_model('blog', 'TagStat')
+    content_type = ContentType.objects.filter(app_label='blog', model='post').first()
+    if content_type is None:
+        return
+    published = Post.objects.filter(status='published').values('pk')
+    counts = (
+        TaggedItem.objects.filter(content_type=content_type, object_id__in=published)
+        .values('tag_id')
+        .annotate(total=Count('pk'))
+    )
+    TagStat.objects.bulk_create(
+        [TagStat(tag_id=row['tag_id'], published_posts=row['total']) for row in counts]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_post_search_index'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagStat',
+            fields=[
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='blog_stat', serialize=False, to='taggit.tag')),
+                ('published_posts', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_tag_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.3 on 2026-10-18 07:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_tagstat'),
+    ]
+
+    # existing posts are rendered by the backfill_post_summaries command
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='content_rendered',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='toc',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
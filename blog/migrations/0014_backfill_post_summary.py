@@ -0,0 +1,14 @@
+# Generated by Django 5.1.3 on 2026-10-18 08:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_liveevent'),
+    ]
+
+    # the backfill that ran here needs the live blog.text code, so it moved
+    # to the backfill_post_summaries command (run by scripts/start.sh)
+    operations = []
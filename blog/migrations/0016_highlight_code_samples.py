@@ -0,0 +1,14 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0014_backfill_post_summary'),
+    ]
+
+    # re-rendering the posts with code samples needs the live rendering
+    # code, so it moved to ``backfill_post_summaries --all``
+    operations = []
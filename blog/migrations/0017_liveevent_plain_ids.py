@@ -0,0 +1,38 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+def clear_events(apps, schema_editor):
+    # pending events are a minute old at most; streams reconnect and catch up
+    apps.get_model('blog', 'LiveEvent').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0016_highlight_code_samples'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_events, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='liveevent',
+            name='comment',
+        ),
+        migrations.RemoveField(
+            model_name='liveevent',
+            name='post',
+        ),
+        migrations.AddField(
+            model_name='liveevent',
+            name='post_id',
+            field=models.PositiveBigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='liveevent',
+            name='comment_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0017_liveevent_plain_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='cover',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0018_post_cover'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='blog_comment_thread_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='blog_post_status_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='blog_post_cat_status_idx',
+        ),
+    ]
@@ -1,11 +1,19 @@
-from django.db import models
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse 
+from django.utils import timezone
 from django.utils.text import slugify
 from taggit.managers import TaggableManager
+from taggit.models import Tag
 from tinymce.models import HTMLField
 
+from .images import rewrite_images
+from .rendering import compile_content
+from .text import summarize
+
 # access the user model
 User = get_user_model()
 
@@ -21,6 +29,70 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+class PostQuerySet(models.QuerySet):
+    def published(self):
+        return self.filter(status="published")
+
+    def for_cards(self):
+        """
+        Published posts with everything a post card renders loaded up front:
+        author and category joined, tags prefetched in one query, and the
+        HTML body (raw and rendered) left out.
+        """
+        return (
+            self.published()
+            .select_related("author", "category")
+            .prefetch_related("tags")
+            .defer("content", "content_rendered", "toc")
+        )
+
+    def with_counter_drift(self):
+        """
+        Annotate the real like/comment counts and keep only the posts whose
+        stored counters disagree with them.
+        """
+        return self.annotate(
+            actual_like_count=Coalesce(Subquery(_like_count_subquery()), 0),
+            actual_comment_count=Coalesce(Subquery(_comment_count_subquery()), 0),
+        ).exclude(
+            like_count=F("actual_like_count"),
+            comment_count=F("actual_comment_count"),
+        )
+
+    def sync_counters(self):
+        """
+        Recompute like_count and comment_count for every post in the queryset
+        with a single UPDATE statement.
+
+        Returns:
+            int: The number of rows updated.
+        """
+        return self.update(
+            like_count=Coalesce(Subquery(_like_count_subquery()), 0),
+            comment_count=Coalesce(Subquery(_comment_count_subquery()), 0),
+        )
+
+
+def _like_count_subquery():
+    return (
+        Like.objects.filter(post=OuterRef("pk"))
+        .order_by()
+        .values("post")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+
+
+def _comment_count_subquery():
+    return (
+        Comment.objects.filter(post=OuterRef("pk"), active=True)
+        .order_by()
+        .values("post")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+
+
 class Post(models.Model):
     # STATUS_CHOICES is a tuple of tuples to set the choices for the status field
     STATUS_CHOICES = [
@@ -38,9 +110,47 @@ class Post(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     publish = models.DateTimeField(null=True, blank=True)
     views = models.PositiveIntegerField(default=0)
+    # denormalized counters, kept in sync by blog.signals
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # listing metadata derived from content on save (see blog.text)
+    excerpt = models.TextField(blank=True, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveSmallIntegerField(default=0, editable=False)
+    # sanitized HTML and table of contents compiled from content on save
+    # (see blog.rendering); the detail page shows these as they are
+    content_rendered = models.TextField(blank=True, editable=False)
+    toc = models.JSONField(default=list, blank=True, editable=False)
+    # derivatives of the post's first image we host (see blog.images), shown
+    # on its card and as its og:image
+    cover = models.JSONField(null=True, blank=True, editable=False)
+
+    objects = PostQuerySet.as_manager()
+
+    SUMMARY_FIELDS = ("excerpt", "word_count", "reading_time")
+    RENDERED_FIELDS = ("content_rendered", "toc", "cover")
 
     class Meta:
         ordering = ["-created_at"]
+        # access paths of the hot queries, one index each; checked by
+        # blog.query_plans. Backends without partial indexes (MySQL) ignore
+        # the condition and build the plain composite index instead.
+        indexes = [
+            # post lists and keyset pages, newest first
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(status="published"),
+                name="blog_post_published_idx",
+            ),
+            # category pages
+            models.Index(
+                fields=["category", "-created_at", "-id"],
+                condition=models.Q(status="published"),
+                name="blog_post_published_cat_idx",
+            ),
+            # slug lookups, which take the newest post with that slug
+            models.Index(fields=["slug", "-created_at"], name="blog_post_slug_created_idx"),
+        ]
     
     def __str__(self):
         return self.title
@@ -56,18 +166,69 @@ class Post(models.Model):
         
         # track guest likes in a separate model 
         # for now just returning the database
-        db_likes = self.likes.count()
+        return self.like_count
 
 
     # Method to save the post
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
+        update_fields = kwargs.get("update_fields")
+        # an instance loaded without its content (Post.objects.for_cards())
+        # keeps the stored summary instead of fetching the body to redo it
+        if update_fields is None:
+            content_changed = "content" not in self.get_deferred_fields()
+        else:
+            content_changed = "content" in update_fields
+        if content_changed:
+            self.update_summary()
+            self.render_content()
+            if update_fields is not None:
+                kwargs["update_fields"] = {
+                    *update_fields,
+                    *self.SUMMARY_FIELDS,
+                    *self.RENDERED_FIELDS,
+                }
         super().save(*args, **kwargs)
+
+    def update_summary(self):
+        """
+        Recompute the plain-text excerpt, word count and reading time from
+        the HTML content, so list pages never have to parse the body.
+        """
+        for field, value in summarize(self.content).items():
+            setattr(self, field, value)
+
+    def render_content(self):
+        """
+        Compile the HTML shown on the detail page, so requests never have to
+        sanitize or transform the body. Images we host are pointed at their
+        responsive derivatives here, and the first of them becomes the
+        cover; the content itself is left as written.
+        """
+        rendered, self.toc = compile_content(self.content)
+        images = []
+        self.content_rendered = rewrite_images(rendered, found=images)
+        self.cover = images[0] if images else None
     
     def user_has_liked(self, user):
         return self.likes.filter(user=user).exists()
 
+    @classmethod
+    def adjust_counter(cls, pk, field, delta):
+        """
+        Atomically add delta to a counter column without loading the row.
+
+        Args:
+            pk (int): The primary key of the post.
+            field (str): Either "like_count" or "comment_count".
+            delta (int): The amount to add (may be negative).
+        """
+        if delta:
+            # Greatest() keeps a drifted counter from tripping the
+            # positive-integer check constraint on decrement
+            cls.objects.filter(pk=pk).update(**{field: Greatest(F(field) + delta, 0)})
+
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
@@ -80,18 +241,149 @@ class Comment(models.Model):
 
     class Meta:
         ordering =["created_at"]
+        indexes = [
+            # comment threads, oldest first
+            models.Index(
+                fields=["post", "created_at", "id"],
+                condition=models.Q(active=True),
+                name="blog_comment_active_idx",
+            ),
+        ]
     
     def __str__(self):
         author_name = self.author.username if self.author else self.name
         return f'Comment by {author_name} on {self.post.title}'
 
+class LikeManager(models.Manager):
+    def toggle(self, user_id, post_id):
+        """
+        Like or unlike a post for a user and return the new like count.
+
+        The like row and the post's counter change inside one transaction
+        without loading the post or recounting. On PostgreSQL the delete,
+        the insert and the counter update are a single statement. Elsewhere
+        the delete is tried first, then the insert if nothing was deleted
+        (in a savepoint, so a concurrent like only loses the race), then the
+        counter is updated with F()/Greatest() and read back. A double click
+        can therefore never create two rows or skew the counter.
+
+        Bypasses the Like signals, so callers must invalidate caches.
+
+        Returns:
+            tuple[bool, int]: Whether the post is now liked, and its
+                like_count.
+
+        Raises:
+            Post.DoesNotExist: If there is no post with that id; nothing is
+                changed.
+        """
+        like_table = self.model._meta.db_table
+        post_table = Post._meta.db_table
+        now = timezone.now()
+        with transaction.atomic(using=self.db):
+            connection = connections[self.db]
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"""
+                        WITH removed AS (
+                            DELETE FROM {like_table} WHERE user_id = %s AND post_id = %s RETURNING 1
+                        ), added AS (
+                            INSERT INTO {like_table} (user_id, post_id, created_at)
+                            SELECT %s, %s, %s WHERE NOT EXISTS (SELECT 1 FROM removed)
+                            ON CONFLICT DO NOTHING RETURNING 1
+                        )
+                        UPDATE {post_table}
+                        SET like_count = GREATEST(like_count
+                            + (SELECT count(*) FROM added) - (SELECT count(*) FROM removed), 0)
+                        WHERE id = %s
+                        RETURNING like_count, (SELECT count(*) FROM added) > 0
+                        """,
+                        [user_id, post_id, user_id, post_id, now, post_id],
+                    )
+                    row = cursor.fetchone()
+                if row is None:
+                    # leaves the transaction, undoing the insert
+                    raise Post.DoesNotExist(f"No post with id {post_id}.")
+                like_count, liked = row
+                return liked, like_count
+
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {like_table} WHERE user_id = %s AND post_id = %s",
+                    [user_id, post_id],
+                )
+                delta = -cursor.rowcount
+            if not delta:
+                try:
+                    with transaction.atomic(using=self.db):
+                        self.bulk_create([self.model(user_id=user_id, post_id=post_id, created_at=now)])
+                    delta = 1
+                except IntegrityError:
+                    pass  # liked by a concurrent request, which counts it
+            posts = Post.objects.using(self.db).filter(pk=post_id)
+            if not posts.update(like_count=Greatest(F("like_count") + delta, 0)):
+                raise Post.DoesNotExist(f"No post with id {post_id}.")
+            return delta > 0, posts.values_list("like_count", flat=True).get()
+
+
 class Like(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='likes')
     created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = LikeManager()
     
     class Meta:
         unique_together = ('user', 'post')  # Prevent duplicate likes
     
     def __str__(self):
-        return f"{self.user.username} likes {self.post.title}"
\ No newline at end of file
+        return f"{self.user.username} likes {self.post.title}"
+
+
+class TagStat(models.Model):
+    """
+    Number of published posts carrying a tag, maintained by blog.tags so
+    the tag cloud never has to count tagged items on the fly.
+    """
+    tag = models.OneToOneField(Tag, on_delete=models.CASCADE, primary_key=True, related_name="blog_stat")
+    published_posts = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.tag.name}: {self.published_posts}"
+
+
+class ProfilingTarget(models.Model):
+    """
+    A view whose next ``remaining`` requests are run under the sampling
+    profiler (see blog.profiling), whoever makes them.
+    """
+    view_name = models.CharField(
+        max_length=200,
+        help_text="URL name of the view, with its namespace, e.g. blog:post_detail.",
+    )
+    remaining = models.PositiveIntegerField(default=5, help_text="Requests still to profile.")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.view_name} ({self.remaining} left)"
+
+
+class LiveEvent(models.Model):
+    """
+    A change to a post for the live update streams of other workers (see
+    blog.live.DatabaseBackend); rows only live for a minute or so.
+
+    The ids are plain integers: an event is published once its transaction
+    commits, when the post or comment may already be gone, and readers skip
+    what no longer exists.
+    """
+    post_id = models.PositiveBigIntegerField()
+    comment_id = models.PositiveBigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"post {self.post_id}, comment {self.comment_id}"
@@ -0,0 +1,239 @@
+import logging
+import re
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.base import Node
+
+from .metrics import add_execute_wrapper
+
+logger = logging.getLogger(__name__)
+
+ACTIONS = ("off", "warn", "raise")
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%s|\?")
+_IN_LIST_RE = re.compile(r"\bIN \(\?(?:, \?)*\)")
+_SPACE_RE = re.compile(r"\s+")
+# transaction bookkeeping repeats by design
+_IGNORED_PREFIXES = (
+    "SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT", "BEGIN", "COMMIT",
+)
+
+_capturing = ContextVar("nplusone_shapes", default=None)
+
+_PROJECT_DIR = str(Path(settings.BASE_DIR).resolve())
+# the query instrumentation itself is never the cause
+_INSTRUMENTATION = {
+    str(Path(__file__).resolve()),
+    str(Path(__file__).resolve().with_name("metrics.py")),
+}
+
+
+class NPlusOneError(AssertionError):
+    """
+    Raised when a query shape is repeated more often than the threshold.
+    """
+
+
+def normalize(sql):
+    """
+    Reduce a query to its shape: literals, parameters and IN lists of any
+    length become placeholders, so the same query for another row matches.
+    """
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _PLACEHOLDER_RE.sub("?", sql)
+    sql = _SPACE_RE.sub(" ", sql).strip()
+    return _IN_LIST_RE.sub("IN (...)", sql)
+
+
+def _cache_tables():
+    return {
+        options["LOCATION"]
+        for options in settings.CACHES.values()
+        if options["BACKEND"].endswith(".DatabaseCache")
+    }
+
+
+def cache_key_pattern(sql, params):
+    """
+    Return the shape of the keys a DatabaseCache lookup reads, or None for
+    other queries.
+
+    Every cache read has the same SQL, so the keys tell a lookup per row
+    (``blog:post:?:version`` for each card) from a page reading a handful
+    of different entries.
+    """
+    if not params or not sql.lstrip().upper().startswith(("SELECT", "DELETE")):
+        return None
+    if not any(f'"{table}"' in sql or f"`{table}`" in sql for table in _cache_tables()):
+        return None
+    keys = {normalize(param) for param in params if isinstance(param, str)}
+    return ", ".join(sorted(keys))
+
+
+def is_incidental(sql):
+    """
+    Return True for queries that are not the code's own: transaction
+    bookkeeping. Lookups of a DatabaseCache count like any other query, so
+    a cache read per row is reported too.
+    """
+    return sql.lstrip().upper().startswith(_IGNORED_PREFIXES)
+
+
+def _is_project_code(filename):
+    return (
+        filename.startswith(_PROJECT_DIR)
+        and filename not in _INSTRUMENTATION
+        and "site-packages" not in filename
+    )
+
+
+def trigger_location():
+    """
+    Describe what made the current query run: the innermost template node
+    being rendered (template name and line) and the innermost frame of
+    project code, whichever exist.
+    """
+    template = code = None
+    frame = sys._getframe(1)
+    while frame is not None and not (template and code):
+        name = frame.f_code.co_name
+        if template is None and name == "render_annotated":
+            node = frame.f_locals.get("self")
+            if isinstance(node, Node) and node.origin is not None:
+                origin = node.origin.template_name or node.origin.name
+                template = f"{origin}:{node.token.lineno}"
+        filename = frame.f_code.co_filename
+        if code is None and _is_project_code(filename):
+            relative = Path(filename).relative_to(_PROJECT_DIR)
+            code = f"{relative}:{frame.f_lineno} in {name}"
+        frame = frame.f_back
+    return ", ".join(filter(None, [template, code])) or "unknown location"
+
+
+class QueryShapes:
+    """
+    Count the queries run while capturing, grouped by shape.
+
+    The location of a shape is taken when it first goes over the
+    threshold, so the stack is only walked for repeated queries.
+    """
+
+    def __init__(self, threshold=None):
+        if threshold is None:
+            threshold = getattr(settings, "NPLUSONE_THRESHOLD", 3)
+        self.threshold = threshold
+        self.counts = Counter()
+        self.locations = {}
+
+    def add(self, sql, params=None):
+        if is_incidental(sql):
+            return
+        shape = normalize(sql)
+        keys = cache_key_pattern(sql, params)
+        if keys:
+            shape = f"{shape} -- keys {keys}"
+        self.counts[shape] += 1
+        if self.counts[shape] == self.threshold + 1:
+            self.locations[shape] = trigger_location()
+
+    @contextmanager
+    def capture(self):
+        """
+        Count the queries of the current context (thread, task, and the
+        threads sync_to_async() runs it in) while the block runs.
+        """
+        watch_connections()
+        token = _capturing.set(self)
+        try:
+            yield self
+        finally:
+            _capturing.reset(token)
+
+    def repeated(self):
+        """
+        Return ``[(shape, count, location)]`` for the shapes over the
+        threshold, most repeated first.
+        """
+        return [
+            (shape, count, self.locations[shape])
+            for shape, count in self.counts.most_common()
+            if count > self.threshold
+        ]
+
+    def report(self, where):
+        lines = [f"N+1 queries in {where} (threshold {self.threshold}):"]
+        for shape, count, location in self.repeated():
+            lines.append(f"  {count}x {shape}")
+            lines.append(f"      at {location}")
+        return "\n".join(lines)
+
+    def check(self, where, action="raise"):
+        """
+        Warn about or raise for the repeated shapes, if there are any.
+
+        Raises:
+            NPlusOneError: If a shape is repeated and action is "raise".
+        """
+        if action == "off" or not self.repeated():
+            return
+        message = self.report(where)
+        if action == "raise":
+            raise NPlusOneError(message)
+        logger.warning(message)
+
+
+def count_query(execute, sql, params, many, context):
+    """
+    The execute wrapper feeding the QueryShapes being captured, if any.
+    """
+    shapes = _capturing.get()
+    if shapes is not None:
+        shapes.add(sql, params)
+    return execute(sql, params, many, context)
+
+
+def _connection_created(sender, connection, **kwargs):
+    add_execute_wrapper(connection, count_query)
+
+
+def watch_connections():
+    """
+    Install count_query on the open connections and every new one.
+    """
+    # dispatch_uid makes repeated calls no-ops for the signal
+    connection_created.connect(_connection_created, dispatch_uid="blog.nplusone")
+    for connection in connections.all(initialized_only=True):
+        add_execute_wrapper(connection, count_query)
+
+
+@contextmanager
+def detect(where="block", threshold=None, action="raise"):
+    """
+    Check the queries of a block of code, e.g. in a test::
+
+        with nplusone.detect("post list"):
+            render_to_string("blog/post_list.html", context)
+    """
+    shapes = QueryShapes(threshold)
+    with shapes.capture():
+        yield shapes
+    shapes.check(where, action)
+
+
+def view_app(match):
+    """
+    Return the top-level package of a resolved view, e.g. "blog".
+    """
+    func = getattr(match.func, "view_class", match.func)
+    return func.__module__.split(".")[0]
+
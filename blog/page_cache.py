@@ -0,0 +1,198 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag, urlencode
+
+from . import fragment_cache
+from .guest_likes import guest_likes
+
+# renames and deletions forget their slugs; the timeout bounds a missed one
+SLUG_TIMEOUT = 60 * 60 * 24
+
+# the query parameters the cached views read; a page requested with any
+# other (tracking tags, cache busters) is rendered without the shared copy,
+# so junk query strings cannot fill the cache
+PAGE_PARAMS = ("page", "cursor", "q")
+
+# rendered into cached pages instead of the real token and swapped for the
+# current visitor's token on the way out
+CSRF_PLACEHOLDER = "__blog_csrf_token_placeholder__"
+
+
+def _slug_key(slug):
+    return f"blog:slug:{slug}"
+
+
+def post_id_for_slug(slug):
+    """
+    Resolve a post slug to its primary key, caching the mapping.
+
+    Returns:
+        int: The post's primary key, or None if no post has that slug.
+    """
+    from .models import Post
+
+    key = _slug_key(slug)
+    post_id = cache.get(key)
+    if post_id is None:
+        post_id = Post.objects.filter(slug=slug).values_list("pk", flat=True).first()
+        if post_id is not None:
+            cache.set(key, post_id, SLUG_TIMEOUT)
+    return post_id
+
+
+async def apost_id_for_slug(slug):
+    """
+    Async variant of post_id_for_slug(), for async views.
+    """
+    from .models import Post
+
+    key = _slug_key(slug)
+    post_id = await cache.aget(key)
+    if post_id is None:
+        post_id = await Post.objects.filter(slug=slug).values_list("pk", flat=True).afirst()
+        if post_id is not None:
+            await cache.aset(key, post_id, SLUG_TIMEOUT)
+    return post_id
+
+
+def forget_slugs(*slugs):
+    cache.delete_many([_slug_key(slug) for slug in slugs if slug])
+
+
+def page_cache_path(request):
+    """
+    Return the path and page parameters a shared copy is stored under, or
+    None when the query string has other parameters.
+    """
+    if any(name not in PAGE_PARAMS for name in request.GET):
+        return None
+    params = sorted((name, value) for name in PAGE_PARAMS for value in request.GET.getlist(name))
+    return f"{request.path}?{urlencode(params)}" if params else request.path
+
+
+def has_session_state(request):
+    """
+    Return True when the page for this request may differ from the one
+    served to any other anonymous visitor.
+    """
+    if request.user.is_authenticated:
+        return True
+    session = request.session
+    return (
+        bool(guest_likes(request))
+        or "_messages" in session
+        or "messages" in request.COOKIES
+    )
+
+
+class ConditionalPageMixin:
+    """
+    Conditional GET and anonymous full-response caching for read-only views.
+
+    Views provide ``get_page_versions()``, a list of version numbers (see
+    blog.fragment_cache) that change whenever the page content does. From
+    them the mixin derives an ETag and Last-Modified, answering
+    If-None-Match / If-Modified-Since with a 304 before any object lookup or
+    template rendering. Anonymous visitors without session-dependent state
+    share a rendered copy of the page; only the CSRF token is filled in per
+    request.
+    """
+
+    # seconds the shared copy is kept; None uses BLOG_PAGE_CACHE_TIMEOUT,
+    # and 0 turns the shared copy off
+    page_cache_timeout = None
+
+    def get_page_cache_timeout(self):
+        if self.page_cache_timeout is not None:
+            return self.page_cache_timeout
+        return getattr(settings, "BLOG_PAGE_CACHE_TIMEOUT", 60 * 60)
+
+    def get_page_versions(self):
+        """
+        Return the versions the page depends on, or None to skip caching
+        (for instance when the object does not exist).
+        """
+        raise NotImplementedError
+
+    def get_viewer_state(self):
+        """
+        Return a string identifying what in the page depends on the viewer.
+        """
+        user = self.request.user
+        return f"user:{user.pk}" if user.is_authenticated else "anon"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if getattr(self, "render_csrf_placeholder", False):
+            context["csrf_token"] = CSRF_PLACEHOLDER
+        return context
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return super().dispatch(request, *args, **kwargs)
+
+        # the view's setup() has run, so kwargs are available to the hooks
+        versions = self.get_page_versions()
+        if versions is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        path = page_cache_path(request)
+        shared = (
+            bool(self.get_page_cache_timeout())
+            and path is not None
+            and not has_session_state(request)
+        )
+        fingerprint = ":".join(str(version) for version in versions)
+        etag = quote_etag(
+            hashlib.md5(f"{fingerprint}:{self.get_viewer_state()}".encode()).hexdigest()
+        )
+        last_modified = max(fragment_cache.version_timestamp(v) for v in versions)
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            if shared:
+                response = self._shared_response(request, path, fingerprint, *args, **kwargs)
+            else:
+                response = super().dispatch(request, *args, **kwargs)
+
+        if response.status_code in (200, 304):
+            response.headers["ETag"] = etag
+            response.headers["Last-Modified"] = http_date(last_modified)
+            # let browsers keep the page but revalidate it on every visit
+            patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ("Cookie", "HX-Request"))
+        return response
+
+    def _shared_response(self, request, path, fingerprint, *args, **kwargs):
+        # canonical and og:url are absolute, so each host gets its own copy
+        path = hashlib.md5(f"{request.get_host()}{path}".encode()).hexdigest()
+        key = f"blog:page:{path}:{int(bool(request.htmx))}:{fingerprint}"
+
+        cached = cache.get(key)
+        if cached is None:
+            self.render_csrf_placeholder = True
+            response = super().dispatch(request, *args, **kwargs)
+            if hasattr(response, "render"):
+                response.render()
+            if response.status_code != 200:
+                return response
+            content = response.content
+            cache.set(key, (content, response["Content-Type"]), self.get_page_cache_timeout())
+        else:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+
+        # get_token() also makes CsrfViewMiddleware set the cookie
+        response.content = content.replace(
+            CSRF_PLACEHOLDER.encode(), get_token(request).encode()
+        )
+        return response
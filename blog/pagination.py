@@ -0,0 +1,107 @@
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class KeysetPage:
+    """
+    One slice of a keyset-paginated queryset.
+    """
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination ordered by ``(created_at, id)``, newest first unless
+    ``descending=False``.
+
+    Each page is a single index range scan: the cursor holds the sort key of
+    the last row shown, and the next page starts strictly after it. There is
+    no COUNT(*) and no OFFSET, so the cost of a page does not grow with how
+    far the reader has scrolled, and posts published mid-scroll do not shift
+    the window. Cursors are signed so clients cannot forge arbitrary
+    positions.
+    """
+
+    salt = "blog.pagination.cursor"
+
+    def __init__(self, queryset, per_page, descending=True):
+        if descending:
+            self.queryset = queryset.order_by("-created_at", "-id")
+        else:
+            self.queryset = queryset.order_by("created_at", "id")
+        self.per_page = per_page
+        self.descending = descending
+
+    @classmethod
+    def encode_cursor(cls, obj):
+        """
+        Return the opaque cursor pointing just after the given object.
+        """
+        return signing.dumps([obj.created_at.isoformat(), obj.pk], salt=cls.salt, compress=True)
+
+    @classmethod
+    def decode_cursor(cls, cursor):
+        """
+        Return the ``(created_at, id)`` position stored in a cursor, or None
+        if the cursor is missing, tampered with or malformed.
+        """
+        if not cursor:
+            return None
+        try:
+            created_at, pk = signing.loads(cursor, salt=cls.salt)
+        except (signing.BadSignature, TypeError, ValueError):
+            return None
+        created_at = parse_datetime(created_at) if isinstance(created_at, str) else None
+        if created_at is None or not isinstance(pk, int):
+            return None
+        return created_at, pk
+
+    def get_page(self, cursor=None):
+        """
+        Return the page that follows the given cursor.
+
+        An invalid cursor falls back to the first page, mirroring
+        ``Paginator.get_page``.
+
+        Args:
+            cursor (str): The opaque cursor taken from a previous page.
+
+        Returns:
+            KeysetPage: The objects on the page and the cursor for the next one.
+        """
+        rows = list(self._page_queryset(cursor)[:self.per_page + 1])
+        return self._page(rows)
+
+    async def aget_page(self, cursor=None):
+        """
+        Async variant of get_page(), for async views.
+        """
+        rows = [row async for row in self._page_queryset(cursor)[:self.per_page + 1]]
+        return self._page(rows)
+
+    def _page_queryset(self, cursor):
+        queryset = self.queryset
+        position = self.decode_cursor(cursor)
+        if position is not None:
+            created_at, pk = position
+            if self.descending:
+                after = Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            else:
+                after = Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            queryset = queryset.filter(after)
+        return queryset
+
+    def _page(self, rows):
+        # one extra row was fetched to find out whether another page exists
+        object_list = rows[:self.per_page]
+        next_cursor = None
+        if len(rows) > self.per_page:
+            next_cursor = self.encode_cursor(object_list[-1])
+        return KeysetPage(object_list, next_cursor)
@@ -0,0 +1,234 @@
+import json
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+# sampling every 5ms costs the profiled request a few percent
+SAMPLE_INTERVAL = getattr(settings, "PROFILER_INTERVAL", 0.005)
+# how often a worker re-reads the armed targets from the cache
+POLL_INTERVAL = 5
+TARGETS_KEY = "profiling:targets"
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+CAPTURE_SUFFIX = ".speedscope.json"
+
+_CAPTURE_NAME_RE = re.compile(r"^[\w.-]+\.speedscope\.json$")
+
+
+def capture_dir():
+    return Path(getattr(settings, "PROFILER_DIR", Path(settings.BASE_DIR) / "profiles"))
+
+
+class Sampler:
+    """
+    A sampling profiler for the threads serving one request.
+
+    A daemon thread reads the stacks of the followed threads (the one that
+    created the sampler, and any that call follow()) every ``interval``
+    seconds from sys._current_frames(); the profiled code itself runs
+    uninstrumented. Each sample is weighted by the time since the previous
+    one, so a slow sampler does not skew the proportions.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL, name="request"):
+        self.interval = interval
+        self.frames = []
+        self._frame_index = {}
+        # thread id -> {"name", "samples", "weights"}
+        self.threads = {}
+        self.follow(name)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def follow(self, name):
+        """
+        Sample the calling thread too, as its own profile in the capture.
+        """
+        self.threads.setdefault(
+            threading.get_ident(), {"name": name, "samples": [], "weights": []}
+        )
+
+    def start(self):
+        self.started = self._last = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+            now = time.perf_counter()
+            for thread_id, thread in tuple(self.threads.items()):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    thread["samples"].append(self._stack(frame))
+                    thread["weights"].append(now - self._last)
+            self._last = now
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_qualname, code.co_filename, code.co_firstlineno)
+            index = self._frame_index.get(key)
+            if index is None:
+                index = self._frame_index[key] = len(self.frames)
+                self.frames.append({"name": key[0], "file": key[1], "line": key[2]})
+            stack.append(index)
+            frame = frame.f_back
+        stack.reverse()  # speedscope wants the root first
+        return stack
+
+    def speedscope(self, name):
+        """
+        Return the samples as a speedscope document, with one "sampled"
+        profile per followed thread.
+        """
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": name,
+            "exporter": "blog.profiling",
+            "shared": {"frames": self.frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": f"{name} ({thread['name']})",
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(thread["weights"]),
+                    "samples": thread["samples"],
+                    "weights": thread["weights"],
+                }
+                for thread in self.threads.values()
+            ],
+        }
+
+
+def save_capture(sampler, request, view_name):
+    """
+    Write a finished sampler's profile to the capture directory.
+
+    Returns:
+        Path: The capture file, named after the time, view and duration.
+    """
+    directory = capture_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = timezone.now().strftime("%Y%m%d-%H%M%S-%f")
+    view = re.sub(r"[^\w.-]", ".", view_name)
+    path = directory / f"{stamp}-{view}-{sampler.duration * 1000:.0f}ms{CAPTURE_SUFFIX}"
+    document = sampler.speedscope(f"{request.method} {request.get_full_path()}")
+    path.write_text(json.dumps(document, separators=(",", ":")))
+    return path
+
+
+def list_captures():
+    """
+    Return the saved captures, newest first, as dicts with ``name``,
+    ``size`` and ``modified``.
+    """
+    directory = capture_dir()
+    if not directory.is_dir():
+        return []
+    captures = []
+    for path in directory.glob(f"*{CAPTURE_SUFFIX}"):
+        stat = path.stat()
+        captures.append({
+            "name": path.name,
+            "size": stat.st_size,
+            "modified": datetime.fromtimestamp(stat.st_mtime, tz=timezone.get_current_timezone()),
+        })
+    return sorted(captures, key=lambda capture: capture["name"], reverse=True)
+
+
+def capture_path(name):
+    """
+    Return the path of a capture by file name, or None if the name is not
+    a capture in the capture directory.
+    """
+    if not _CAPTURE_NAME_RE.match(name):
+        return None
+    path = capture_dir() / name
+    return path if path.is_file() else None
+
+
+def invalidate_targets():
+    cache.delete(TARGETS_KEY)
+
+
+def armed_targets():
+    """
+    Return ``{view_name: target_id}`` for the targets with requests left.
+    """
+    from .models import ProfilingTarget
+
+    targets = cache.get(TARGETS_KEY)
+    if targets is None:
+        targets = dict(
+            ProfilingTarget.objects.filter(remaining__gt=0).values_list("view_name", "pk")
+        )
+        cache.set(TARGETS_KEY, targets, None)
+    return targets
+
+
+def claim(target_id):
+    """
+    Take one request from an armed target.
+
+    Returns:
+        bool: True if this request is to be profiled; False if another
+            worker took the last one.
+    """
+    from .models import ProfilingTarget
+
+    claimed = ProfilingTarget.objects.filter(pk=target_id, remaining__gt=0).update(
+        remaining=F("remaining") - 1
+    )
+    if claimed and not ProfilingTarget.objects.filter(pk=target_id, remaining__gt=0).exists():
+        invalidate_targets()
+    return bool(claimed)
+
+
+class TargetPoller:
+    """
+    The armed targets as last read by this worker, re-read from the cache at
+    most every POLL_INTERVAL seconds so unprofiled requests cost no lookups.
+    """
+
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self.targets = {}
+        self._next_poll = 0.0
+
+    def _due(self):
+        now = time.monotonic()
+        if now < self._next_poll:
+            return False
+        self._next_poll = now + self.interval
+        return True
+
+    def get(self):
+        """
+        Return ``{view_name: target_id}`` of the armed targets.
+        """
+        if self._due():
+            self.targets = armed_targets()
+        return self.targets
+
+    async def aget(self):
+        if self._due():
+            self.targets = await sync_to_async(armed_targets)()
+        return self.targets
@@ -0,0 +1,134 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from .models import Category, Comment, Post
+from .pagination import KeysetPaginator
+
+# PostgreSQL: "Seq Scan on blog_post"; SQLite: "SCAN blog_post" (a table
+# scan, unlike "SCAN blog_post USING INDEX ..." or "SEARCH ...")
+_SEQ_SCAN_RE = {
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+    "sqlite": re.compile(r"\bSCAN (\w+)(?! USING)\s*$", re.MULTILINE),
+}
+
+
+class QueryPlanError(AssertionError):
+    """
+    Raised when a hot query is planned as a sequential scan.
+    """
+
+
+def seed(posts=300, categories=6, comments_per_post=5, authors=20):
+    """
+    Insert a dataset large enough for the planner to prefer indexes.
+
+    Every joined table gets more than a handful of rows too: on a fresh
+    database a lone author makes a scan of the user table the cheapest join.
+
+    Returns:
+        Post: A published post with comments, for the detail queries.
+    """
+    User = get_user_model()
+    author_objs = User.objects.bulk_create(
+        User(username=f"query-plan-author-{i}", email=f"query-plan-{i}@example.com")
+        for i in range(authors)
+    )
+    category_objs = Category.objects.bulk_create(
+        Category(name=f"Query plan {i}", slug=f"query-plan-{i}") for i in range(categories)
+    )
+    post_objs = Post.objects.bulk_create(
+        Post(
+            title=f"Query plan {i}",
+            slug=f"query-plan-{i}",
+            author=author_objs[i % authors],
+            content="<p>x</p>",
+            category=category_objs[i % categories],
+            status="draft" if i % 10 == 0 else "published",
+        )
+        for i in range(posts)
+    )
+    Comment.objects.bulk_create(
+        Comment(post=post, author=author_objs[j % authors], content="x", active=j % 7 != 0)
+        for post in post_objs
+        for j in range(comments_per_post)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    return post_objs[-1]
+
+
+def hot_queries(post):
+    """
+    Return the queries of the blog's hot paths, by name, as the views build
+    them.
+    """
+    posts = KeysetPaginator(Post.objects.for_cards(), 5).queryset
+    comments = KeysetPaginator(
+        Comment.objects.filter(post_id=post.pk, active=True).select_related("author"),
+        20,
+        descending=False,
+    ).queryset
+    return {
+        "list": posts[:6],
+        "list_next_page": posts.filter(created_at__lt=post.created_at)[:6],
+        "category": posts.filter(category_id=post.category_id)[:6],
+        "slug": Post.objects.filter(slug=post.slug).values_list("pk", flat=True)[:1],
+        "detail": Post.objects.select_related("author", "category").filter(pk=post.pk),
+        "comments": comments[:21],
+    }
+
+
+def explain_hot_queries(post):
+    """
+    Return ``{name: plan}`` for the hot queries.
+
+    On PostgreSQL sequential scans are disabled for the session first: the
+    planner then still picks one only if no index can serve the query, so
+    the check does not depend on table sizes or statistics.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SET LOCAL enable_seqscan = off")
+    return {name: queryset.explain() for name, queryset in hot_queries(post).items()}
+
+
+def sequential_scans(plans):
+    """
+    Return ``{name: [table, ...]}`` for the plans that scan a whole table.
+    """
+    pattern = _SEQ_SCAN_RE.get(connection.vendor)
+    if pattern is None:
+        return {}
+    found = {}
+    for name, plan in plans.items():
+        tables = pattern.findall(plan)
+        if tables:
+            found[name] = tables
+    return found
+
+
+def check_query_plans(**seed_options):
+    """
+    Seed a dataset, EXPLAIN the hot queries and roll everything back.
+
+    Meant to be called from a test case (or the check_query_plans command)
+    to catch a dropped or unusable index before it reaches production.
+
+    Returns:
+        dict: The plans, by query name.
+
+    Raises:
+        QueryPlanError: If any hot query is planned as a sequential scan.
+    """
+    with transaction.atomic():
+        post = seed(**seed_options)
+        plans = explain_hot_queries(post)
+        transaction.set_rollback(True)
+
+    scans = sequential_scans(plans)
+    if scans:
+        details = "\n\n".join(f"{name}:\n{plans[name]}" for name in scans)
+        raise QueryPlanError(f"Sequential scan in {', '.join(scans)}:\n\n{details}")
+    return plans
@@ -0,0 +1,169 @@
+import hashlib
+import math
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.http import HttpResponse
+
+# scope -> (capacity, seconds to refill it); override in settings.BLOG_RATE_LIMITS
+DEFAULT_RATE_LIMITS = {
+    "comment": (5, 60),
+    "comment_update": (10, 60),
+    "like": (30, 60),
+}
+# one address may be shared by many visitors (offices, mobile carriers), so
+# its bucket is this many times larger than a single session's
+IP_MULTIPLIER = getattr(settings, "BLOG_RATE_LIMIT_IP_MULTIPLIER", 5)
+
+
+def get_limit(scope):
+    """
+    Return ``(capacity, period)`` for a scope: a bucket of ``capacity``
+    tokens refilled at ``capacity / period`` tokens per second.
+    """
+    limits = {**DEFAULT_RATE_LIMITS, **getattr(settings, "BLOG_RATE_LIMITS", {})}
+    return limits[scope]
+
+
+def _client_ip(request):
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR")
+    if forwarded and getattr(settings, "BLOG_RATE_LIMIT_TRUST_FORWARDED", False):
+        # the address our proxy appended; the ones before it are the client's word
+        return forwarded.split(",")[-1].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def _identities(request):
+    """
+    Return the buckets a request draws from, as ``(name, multiplier)``.
+
+    Read from the address, the raw session cookie and the user id stored in
+    the session, never from request.user, so a rejected request costs at
+    most the session lookup the view would make anyway and no user query.
+    A logged-in user also draws from a bucket of their own, which logging
+    in again with a fresh session does not refill.
+    """
+    identities = [(f"ip:{_client_ip(request)}", IP_MULTIPLIER)]
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if session_key:
+        identities.append((f"session:{session_key}", 1))
+        user_id = request.session.get(SESSION_KEY)
+        if user_id is not None:
+            identities.append((f"user:{user_id}", 1))
+    return identities
+
+
+def consume(scope, identity, capacity, period):
+    """
+    Take one token from a bucket.
+
+    The bucket is two cache entries: when it was last full, and the tokens
+    spent since then. The tokens available are
+    ``capacity + refill * elapsed - spent``; once that reaches the capacity
+    again the bucket starts over.
+
+    Concurrent requests cannot both take the last token only if the cache's
+    incr() is atomic, as it is for the LocMem, Redis and Memcached backends
+    but not for the database or file caches (check blog.E002 rejects
+    those). Starting a bucket, or starting it over, goes through add(), so
+    requests that race there agree on one start and draw from one counter.
+
+    Returns:
+        float: 0 if the token was granted, otherwise the seconds until the
+            next token.
+    """
+    refill = capacity / period
+    digest = hashlib.md5(identity.encode()).hexdigest()
+    start_key = f"ratelimit:{scope}:{digest}"
+    # entries of an idle bucket can go: it would be full again by then
+    timeout = max(60, math.ceil(period * 10))
+    now = time.time()
+
+    start = cache.get(start_key)
+    if start is None:
+        cache.add(start_key, now, timeout)
+        start = cache.get(start_key, now)
+    elif refill * (now - start) >= cache.get(f"{start_key}:{start}", 0):
+        # refilled to capacity: the first request to notice picks the new
+        # start, the others adopt it
+        next_key = f"{start_key}:{start}:next"
+        cache.add(next_key, now, timeout)
+        start = cache.get(next_key, now)
+        cache.set(start_key, start, timeout)
+    spent_key = f"{start_key}:{start}"
+
+    cache.add(spent_key, 0, timeout)
+    try:
+        spent = cache.incr(spent_key)
+    except ValueError:  # evicted between add() and incr()
+        cache.set(spent_key, 1, timeout)
+        spent = 1
+
+    available = capacity + refill * (now - start)
+    if spent <= available:
+        return 0
+    # rejected requests do not spend tokens
+    cache.decr(spent_key)
+    return (spent - available) / refill
+
+
+def rate_limit(scope):
+    """
+    Throttle a view with token buckets per session and per IP address.
+
+    Rejected requests get a 429 with a small partial that HTMX swaps into
+    the page's rate limit notice, before the view (or the ORM) runs. Works
+    on sync and async views; for the latter the buckets (cache I/O) are
+    checked in a worker thread.
+
+    Args:
+        scope (str): The endpoint's key in DEFAULT_RATE_LIMITS /
+            settings.BLOG_RATE_LIMITS.
+    """
+
+    def check(request):
+        capacity, period = get_limit(scope)
+        return max(
+            consume(scope, identity, capacity * multiplier, period)
+            for identity, multiplier in _identities(request)
+        )
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                retry_after = await sync_to_async(check)(request)
+                if retry_after:
+                    return await sync_to_async(rate_limited)(request, retry_after)
+                return await view(request, *args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            retry_after = check(request)
+            if retry_after:
+                return rate_limited(request, retry_after)
+            return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def rate_limited(request, retry_after):
+    retry_after = math.ceil(retry_after)
+    response = HttpResponse(
+        render_to_string("blog/partials/rate_limited.html", {"retry_after": retry_after}),
+        status=429,
+    )
+    response["Retry-After"] = str(retry_after)
+    # leave the request's target alone; the partial swaps itself out of band
+    response["HX-Reswap"] = "none"
+    return response
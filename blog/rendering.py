@@ -0,0 +1,336 @@
+import html
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.utils.text import slugify
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+from pygments.util import ClassNotFound
+
+ALLOWED_TAGS = {
+    "a": {"href", "title", "target", "rel"},
+    "abbr": {"title"},
+    "b": set(),
+    "blockquote": set(),
+    "br": set(),
+    "caption": set(),
+    "code": {"class"},
+    "del": set(),
+    "em": set(),
+    "figcaption": set(),
+    "figure": set(),
+    "h1": {"id"},
+    "h2": {"id"},
+    "h3": {"id"},
+    "h4": {"id"},
+    "h5": {"id"},
+    "h6": {"id"},
+    "hr": set(),
+    "i": set(),
+    "iframe": {"src", "width", "height", "title", "allow", "allowfullscreen"},
+    "img": {"src", "srcset", "sizes", "alt", "title", "width", "height", "loading", "decoding"},
+    "li": set(),
+    "ol": {"start"},
+    "p": set(),
+    "picture": set(),
+    "pre": {"class"},
+    "s": set(),
+    "source": {"type", "srcset", "sizes", "media"},
+    "strong": set(),
+    "sub": set(),
+    "sup": set(),
+    "table": set(),
+    "tbody": set(),
+    "td": {"colspan", "rowspan"},
+    "tfoot": set(),
+    "th": {"colspan", "rowspan", "scope"},
+    "thead": set(),
+    "tr": set(),
+    "u": set(),
+    "ul": set(),
+}
+
+# dropped together with everything inside them
+DROPPED_TAGS = {
+    "script", "style", "noscript", "template", "object", "embed", "form",
+    "input", "button", "select", "textarea", "head", "title", "meta", "link",
+    "svg", "math",
+}
+
+VOID_TAGS = {"br", "hr", "img", "source", "wbr", "input", "meta", "link", "embed"}
+
+# removed when they end up with no text and no media inside
+PRUNABLE_TAGS = {
+    "p", "b", "strong", "i", "em", "u", "s", "del", "sub", "sup", "code",
+    "h1", "h2", "h3", "h4", "h5", "h6", "li", "ul", "ol", "blockquote", "a",
+}
+MEDIA_TAGS = {"img", "iframe", "picture", "source", "hr", "table"}
+
+URL_ATTRS = {"href", "src"}
+SAFE_SCHEMES = {"", "http", "https", "mailto", "tel"}
+IFRAME_HOSTS = set(
+    getattr(
+        settings,
+        "BLOG_IFRAME_HOSTS",
+        {
+            "www.youtube.com",
+            "www.youtube-nocookie.com",
+            "player.vimeo.com",
+            "www.google.com",
+        },
+    )
+)
+TOC_LEVELS = ("h2", "h3", "h4")
+
+
+class Element:
+    def __init__(self, tag, attrs=None):
+        self.tag = tag
+        self.attrs = attrs or {}
+        self.children = []
+
+    def text(self):
+        return "".join(
+            child.text() if isinstance(child, Element) else child
+            for child in self.children
+            if not isinstance(child, Markup)
+        )
+
+
+class Markup(str):
+    """
+    Trusted HTML produced by the compiler itself (highlighted code).
+    """
+
+
+class _TreeBuilder(HTMLParser):
+    """
+    Parse TinyMCE output into a tree of allowed elements.
+
+    Tags outside the allowlist are unwrapped (their text is kept), dangerous
+    ones are dropped with their content, and attributes are filtered
+    per tag. Comments and processing instructions are discarded.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Element(None)
+        self.stack = [self.root]
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        if self._start(tag, attrs) and tag not in VOID_TAGS:
+            self.stack.pop()
+
+    def _start(self, tag, attrs):
+        """
+        Open an element; return True if it was pushed on the stack.
+        """
+        if self.dropping:
+            if tag in DROPPED_TAGS and tag not in VOID_TAGS:
+                self.dropping += 1
+            return False
+        if tag in DROPPED_TAGS:
+            if tag not in VOID_TAGS:
+                self.dropping = 1
+            return False
+        allowed = ALLOWED_TAGS.get(tag)
+        if allowed is None:
+            return False
+        attrs = _clean_attrs(tag, attrs, allowed)
+        if attrs is None:
+            return False
+        element = Element(tag, attrs)
+        self.stack[-1].children.append(element)
+        if tag in VOID_TAGS:
+            return False
+        self.stack.append(element)
+        return True
+
+    def handle_endtag(self, tag):
+        if self.dropping:
+            if tag in DROPPED_TAGS:
+                self.dropping -= 1
+            return
+        # close the nearest open element with that name, and anything left
+        # open inside it
+        for index in range(len(self.stack) - 1, 0, -1):
+            if self.stack[index].tag == tag:
+                del self.stack[index:]
+                return
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.stack[-1].children.append(data)
+
+
+def _safe_url(value, tag):
+    value = value.strip()
+    scheme = urlsplit(value).scheme.lower()
+    if tag == "img" and value.startswith("data:image/"):
+        return value
+    if scheme not in SAFE_SCHEMES:
+        return None
+    return value
+
+
+def _clean_attrs(tag, attrs, allowed):
+    cleaned = {}
+    for name, value in attrs:
+        if name not in allowed:
+            continue
+        value = value if value is not None else ""
+        if name in URL_ATTRS:
+            value = _safe_url(value, tag)
+            if value is None:
+                continue
+        elif name == "class":
+            # only the language marker of TinyMCE code samples
+            value = " ".join(c for c in value.split() if c.startswith("language-"))
+            if not value:
+                continue
+        cleaned[name] = value
+
+    if tag == "iframe":
+        src = cleaned.get("src", "")
+        if urlsplit(src).scheme != "https" or urlsplit(src).hostname not in IFRAME_HOSTS:
+            # an embed we do not trust is dropped altogether
+            return None
+        cleaned.setdefault("loading", "lazy")
+    elif tag == "img":
+        if "src" not in cleaned and "srcset" not in cleaned:
+            return None
+        cleaned.setdefault("loading", "lazy")
+        cleaned.setdefault("decoding", "async")
+    elif tag == "a" and cleaned.get("target") == "_blank":
+        cleaned["rel"] = "noopener noreferrer"
+    return cleaned
+
+
+def _is_empty(element):
+    if element.tag in MEDIA_TAGS:
+        return False
+    for child in element.children:
+        if isinstance(child, Element):
+            if not _is_empty(child):
+                return False
+        elif child.strip():
+            return False
+    return True
+
+
+def _prune(element):
+    """
+    Remove empty paragraphs and formatting tags, like the ``<p>&nbsp;</p>``
+    TinyMCE leaves behind.
+    """
+    kept = []
+    for child in element.children:
+        if isinstance(child, Element):
+            _prune(child)
+            if child.tag in PRUNABLE_TAGS and _is_empty(child):
+                continue
+        kept.append(child)
+    element.children = kept
+
+
+def _highlight(element):
+    """
+    Replace the content of ``<pre class="language-x">`` code samples with
+    Pygments markup.
+    """
+    for child in element.children:
+        if not isinstance(child, Element):
+            continue
+        if child.tag == "pre":
+            code = child.children[0] if len(child.children) == 1 else child
+            classes = child.attrs.get("class", "") or (
+                code.attrs.get("class", "") if isinstance(code, Element) else ""
+            )
+            language = next(
+                (c[len("language-"):] for c in classes.split() if c.startswith("language-")),
+                None,
+            )
+            if language:
+                try:
+                    lexer = get_lexer_by_name(language)
+                except ClassNotFound:
+                    continue
+                source = (code if isinstance(code, Element) else child).text()
+                highlighted = highlight(source, lexer, HtmlFormatter(nowrap=True))
+                code_element = Element("code", {"class": f"language-{language}"})
+                code_element.children = [Markup(highlighted)]
+                child.attrs["class"] = f"highlight language-{language}"
+                child.children = [code_element]
+            continue
+        _highlight(child)
+
+
+def _anchor_headings(element, toc, used_ids):
+    for child in element.children:
+        if not isinstance(child, Element):
+            continue
+        if child.tag in TOC_LEVELS:
+            title = " ".join(child.text().split())
+            anchor = slugify(child.attrs.get("id") or title) or "sezione"
+            candidate, n = anchor, 2
+            while candidate in used_ids:
+                candidate, n = f"{anchor}-{n}", n + 1
+            used_ids.add(candidate)
+            child.attrs["id"] = candidate
+            link = Element("a", {"href": f"#{candidate}", "class": "heading-anchor", "aria-hidden": "true"})
+            link.children = ["#"]
+            child.children.append(link)
+            toc.append({"level": int(child.tag[1]), "id": candidate, "title": title})
+        else:
+            _anchor_headings(child, toc, used_ids)
+
+
+def _serialize(element, out):
+    for child in element.children:
+        if isinstance(child, Markup):
+            out.append(child)
+        elif isinstance(child, str):
+            out.append(html.escape(child, quote=False))
+        else:
+            attrs = "".join(
+                f' {name}="{html.escape(str(value))}"' if value != "" else f" {name}"
+                for name, value in child.attrs.items()
+            )
+            out.append(f"<{child.tag}{attrs}>")
+            if child.tag not in VOID_TAGS:
+                _serialize(child, out)
+                out.append(f"</{child.tag}>")
+    return out
+
+
+def compile_content(value):
+    """
+    Compile the HTML of a post body into what the detail page shows.
+
+    The markup is sanitized against an allowlist (inline styles, scripts,
+    event handlers and untrusted embeds go), emptied formatting tags are
+    removed, images and iframes get lazy-loading hints, h2-h4 headings get
+    anchors, and code samples are highlighted with Pygments.
+
+    Args:
+        value (str): The HTML content of the post.
+
+    Returns:
+        tuple[str, list[dict]]: The compiled HTML, and the table of contents
+            as ``{"level", "id", "title"}`` entries.
+    """
+    builder = _TreeBuilder()
+    builder.feed(value or "")
+    builder.close()
+    root = builder.root
+    _prune(root)
+    _highlight(root)
+    toc = []
+    _anchor_headings(root, toc, set())
+    return "".join(_serialize(root, [])).strip(), toc
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class NPlusOneTestRunner(DiscoverRunner):
+    """
+    Test runner that fails any request, made with the test client to a view
+    of settings.NPLUSONE_APPS, which repeats a query shape more than
+    settings.NPLUSONE_THRESHOLD times.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._saved_action = getattr(settings, "NPLUSONE_ACTION", "off")
+        settings.NPLUSONE_ACTION = "raise"
+
+    def teardown_databases(self, old_config, **kwargs):
+        # buffered view counts belong to the test databases; written at
+        # exit they would go to the real database instead
+        from blog.view_counter import view_counts
+
+        view_counts.close()
+        super().teardown_databases(old_config, **kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        settings.NPLUSONE_ACTION = self._saved_action
+        super().teardown_test_environment(**kwargs)
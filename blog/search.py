@@ -0,0 +1,114 @@
+"""
+Full-text search over published posts.
+
+On PostgreSQL ``blog_post.search_vector`` is a stored generated ``tsvector``
+column (title weighted above body) with a GIN index, so the database keeps
+it up to date by itself. On SQLite the posts are mirrored into the FTS5
+table ``blog_post_fts``, which the Post signal handlers keep in sync. Both
+are created by migration 0008; any other backend falls back to a plain
+``icontains`` lookup.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .text import plain_text
+
+SEARCH_CONFIG = "italian"
+FTS_TABLE = "blog_post_fts"
+# the post fields the index is built from
+INDEXED_FIELDS = frozenset({"title", "content"})
+
+_token_re = re.compile(r"\w+", re.UNICODE)
+
+
+def _fts_available():
+    return connection.vendor == "sqlite"
+
+
+def index_post(post):
+    """
+    Mirror a post into the SQLite FTS table (a no-op elsewhere).
+    """
+    if not _fts_available():
+        return
+    with connection.cursor() as cursor:
+        if "content" in post.get_deferred_fields():
+            # loaded without its body, so only the title can have changed
+            cursor.execute(f"UPDATE {FTS_TABLE} SET title = %s WHERE rowid = %s", [post.title, post.pk])
+            return
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)",
+            [post.pk, post.title, plain_text(post.content or "")],
+        )
+
+
+def remove_post(post_id):
+    if not _fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post_id])
+
+
+def _fts_query(query):
+    """
+    Turn free text into a safe FTS5 expression: every word becomes a quoted
+    prefix term and all of them must match.
+    """
+    tokens = _token_re.findall(query)
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def search_posts(queryset, query, limit, offset=0):
+    """
+    Return up to `limit` posts of `queryset` matching `query`, best match
+    first.
+
+    Args:
+        queryset (QuerySet): The posts to search (typically the published ones).
+        query (str): The user's search text.
+        limit (int): The page size.
+        offset (int): The number of results to skip.
+
+    Returns:
+        list[Post]: The matching posts in rank order.
+    """
+    query = query.strip()
+    if not query:
+        return []
+
+    if connection.vendor == "postgresql":
+        tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        return list(
+            queryset.annotate(
+                matched=RawSQL(f"blog_post.search_vector @@ {tsquery}", (query,), output_field=BooleanField()),
+                rank=RawSQL(f"ts_rank(blog_post.search_vector, {tsquery})", (query,), output_field=FloatField()),
+            )
+            .filter(matched=True)
+            .order_by("-rank", "-created_at")[offset:offset + limit]
+        )
+
+    if _fts_available():
+        expression = _fts_query(query)
+        if not expression:
+            return []
+        # rank inside the FTS index (bm25 is lower for better matches, title
+        # weighted above body), then load the page of posts by id
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT f.rowid FROM {FTS_TABLE} f JOIN blog_post p ON p.id = f.rowid "
+                f"WHERE {FTS_TABLE} MATCH %s AND p.status = 'published' "
+                f"ORDER BY bm25({FTS_TABLE}, 10.0, 1.0), p.created_at DESC LIMIT %s OFFSET %s",
+                [expression, limit, offset],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = queryset.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+    return list(
+        queryset.filter(Q(title__icontains=query) | Q(excerpt__icontains=query))
+        .order_by("-created_at")[offset:offset + limit]
+    )
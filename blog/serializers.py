@@ -0,0 +1,98 @@
+from rest_framework import serializers
+
+from .models import Category, Comment, Post
+
+
+def requested_fields(request):
+    """
+    Return the field names asked for with ``?fields=a,b``, or None when the
+    client wants every field.
+    """
+    if request is None:
+        return None
+    fields = request.query_params.get("fields")
+    if not fields:
+        return None
+    return {name.strip() for name in fields.split(",") if name.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Drop every field not listed in the request's ``?fields=`` parameter.
+    Unknown names are ignored.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = requested_fields(self.context.get("request"))
+        if fields:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+
+class CategorySerializer(serializers.ModelSerializer):
+    # annotated by blog.categories.get_category_index()
+    num_posts = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Category
+        fields = ["id", "name", "slug", "num_posts"]
+
+
+class PostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    url = serializers.URLField(source="get_absolute_url", read_only=True)
+    author = serializers.CharField(source="author.username", read_only=True)
+    category = serializers.SerializerMethodField()
+    tags = serializers.SerializerMethodField()
+    # the sanitized HTML compiled on save, never the raw editor output
+    content = serializers.CharField(source="content_rendered", read_only=True)
+
+    class Meta:
+        model = Post
+        fields = [
+            "id",
+            "title",
+            "slug",
+            "url",
+            "author",
+            "category",
+            "tags",
+            "created_at",
+            "updated_at",
+            "publish",
+            "excerpt",
+            "word_count",
+            "reading_time",
+            "like_count",
+            "comment_count",
+            "toc",
+            "content",
+        ]
+
+    def get_category(self, post):
+        category = post.category
+        if category is None:
+            return None
+        return {"name": category.name, "slug": category.slug}
+
+    def get_tags(self, post):
+        # reads the prefetched tags; no query per post
+        return [{"name": tag.name, "slug": tag.slug} for tag in post.tags.all()]
+
+
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    author = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Comment
+        fields = ["id", "author", "content", "created_at"]
+
+    def get_author(self, comment):
+        # the e-mail address of guest commenters is never exposed
+        return comment.author.username if comment.author_id else comment.name
+
+
+class LikeCountSerializer(serializers.Serializer):
+    slug = serializers.SlugField()
+    like_count = serializers.IntegerField()
+    liked = serializers.BooleanField()
@@ -0,0 +1,243 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from core.sitemaps import invalidate_sitemaps
+
+from . import fragment_cache, live, profiling, search
+from .categories import invalidate_category_index
+from .guest_likes import GuestLikes
+from .tags import refresh_tag_stats, tag_ids_for_post
+from .models import Category, Comment, Like, Post, ProfilingTarget
+from .page_cache import forget_slugs
+
+
+@receiver(post_save, sender=Post)
+def post_saved_search(sender, instance, update_fields=None, **kwargs):
+    """
+    Keep the SQLite full-text index in step with the post. Saves of other
+    fields only (counters, views, rendered HTML) leave it alone.
+    """
+    if update_fields is not None and not search.INDEXED_FIELDS.intersection(update_fields):
+        return
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted_search(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    """
+    Invalidate the cached fragments and pages of a post when it is saved or
+    deleted.
+    """
+    fragment_cache.bump_version(instance.pk)
+    # a renamed post must stop resolving under its old slug
+    forget_slugs(instance.slug, getattr(instance, "_loaded_slug", None))
+    instance._loaded_slug = instance.slug
+    # status or category may have changed the published counts
+    invalidate_category_index()
+    # the sitemap only lists published posts; drafts can change freely
+    status = instance.__dict__.get("status")
+    if "published" in (status, getattr(instance, "_loaded_status", None)):
+        invalidate_sitemaps()
+
+
+@receiver(post_init, sender=Post)
+def post_remember_status(sender, instance, **kwargs):
+    """
+    Remember the status and slug as loaded; read through __dict__ so
+    deferred fields are not fetched just for this.
+    """
+    instance._loaded_status = instance.__dict__.get("status")
+    instance._loaded_slug = instance.__dict__.get("slug")
+
+
+@receiver(post_save, sender=Post)
+def post_status_changed(sender, instance, created, **kwargs):
+    """
+    Publishing or unpublishing a post changes the counts of its tags.
+    """
+    if not created and instance._loaded_status not in (None, instance.status):
+        refresh_tag_stats(tag_ids_for_post(instance))
+    instance._loaded_status = instance.__dict__.get("status")
+
+
+@receiver(pre_delete, sender=Post)
+def post_remember_tags(sender, instance, **kwargs):
+    instance._deleted_tag_ids = tag_ids_for_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted_tags(sender, instance, **kwargs):
+    refresh_tag_stats(getattr(instance, "_deleted_tag_ids", []))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def post_tags_changed(sender, instance, action, pk_set, **kwargs):
+    """
+    Refresh the counts of exactly the tags added to or removed from a post.
+    """
+    if not isinstance(instance, Post):
+        return
+    if action == "pre_clear":
+        instance._cleared_tag_ids = tag_ids_for_post(instance)
+    elif action in ("post_add", "post_remove"):
+        refresh_tag_stats(pk_set or [])
+        fragment_cache.bump_version(instance.pk)
+    elif action == "post_clear":
+        refresh_tag_stats(getattr(instance, "_cleared_tag_ids", []))
+        fragment_cache.bump_version(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    """
+    Categories are shown in the menus of every page.
+    """
+    invalidate_category_index()
+    fragment_cache.bump_site_version()
+
+
+@receiver(post_save, sender=Like)
+def like_created(sender, instance, created, **kwargs):
+    """
+    Increment the post's like counter when a new like is stored.
+    """
+    if created:
+        Post.adjust_counter(instance.post_id, "like_count", 1)
+        fragment_cache.bump_version(instance.post_id)
+        live.publish(instance.post_id)
+
+
+def _deleting_post(origin):
+    """
+    Return whether a cascade started by deleting posts: their likes and
+    comments then have no counters, caches or readers left to update.
+    """
+    return isinstance(origin, Post) or getattr(origin, "model", None) is Post
+
+
+@receiver(post_delete, sender=Like)
+def like_deleted(sender, instance, origin=None, **kwargs):
+    """
+    Decrement the post's like counter when a like is removed.
+    """
+    if _deleting_post(origin):
+        return
+    Post.adjust_counter(instance.post_id, "like_count", -1)
+    fragment_cache.bump_version(instance.post_id)
+    live.publish(instance.post_id)
+
+
+@receiver(post_init, sender=Comment)
+def comment_remember_active(sender, instance, **kwargs):
+    """
+    Remember the active flag as loaded so activation changes can be detected
+    on save without an extra query.
+    """
+    instance._loaded_active = instance.active
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    """
+    Keep the post's comment counter in line with active comments.
+
+    A new active comment adds one; toggling an existing comment's active flag
+    adds or removes one. Any comment save (including an edit) invalidates the
+    post's cached fragments.
+    """
+    if created:
+        delta = 1 if instance.active else 0
+    else:
+        delta = int(instance.active) - int(instance._loaded_active)
+    Post.adjust_counter(instance.post_id, "comment_count", delta)
+    instance._loaded_active = instance.active
+    fragment_cache.bump_version(instance.post_id)
+    # readers of the post see a new active comment appear
+    live.publish(instance.post_id, instance.pk if created and instance.active else None)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, origin=None, **kwargs):
+    """
+    Decrement the post's comment counter when an active comment is removed.
+    """
+    if _deleting_post(origin):
+        return
+    if instance._loaded_active:
+        Post.adjust_counter(instance.post_id, "comment_count", -1)
+    fragment_cache.bump_version(instance.post_id)
+    live.publish(instance.post_id)
+
+
+def _display_name(user):
+    # read through __dict__ so deferred fields are not fetched for this
+    return tuple(user.__dict__.get(field) for field in ("username", "first_name", "last_name"))
+
+
+@receiver(post_init, sender=settings.AUTH_USER_MODEL)
+def user_remember_name(sender, instance, **kwargs):
+    instance._loaded_display_name = _display_name(instance)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, created, **kwargs):
+    """
+    Cards, post pages and comment threads show their authors' names;
+    invalidate the posts a renamed user wrote or commented on.
+    """
+    name = _display_name(instance)
+    if created or name == instance._loaded_display_name:
+        return
+    instance._loaded_display_name = name
+    post_ids = (
+        Post.objects.filter(Q(author=instance) | Q(comments__author=instance))
+        .values_list("pk", flat=True)
+        .distinct()
+    )
+    for post_id in post_ids:
+        fragment_cache.bump_version(post_id)
+
+
+@receiver(post_save, sender=ProfilingTarget)
+@receiver(post_delete, sender=ProfilingTarget)
+def profiling_target_changed(sender, instance, **kwargs):
+    # workers pick the change up on their next poll
+    profiling.invalidate_targets()
+
+
+@receiver(user_logged_in)
+def merge_guest_likes(sender, request, user, **kwargs):
+    """
+    Turn the likes a visitor gave as a guest into real likes once they log
+    in, then drop them from the session.
+    """
+    if request is None or not hasattr(request, "session"):
+        return
+    likes = GuestLikes(request.session)
+    if not likes:
+        return
+    post_ids = set(Post.objects.filter(pk__in=list(likes)).values_list("pk", flat=True))
+    post_ids -= set(
+        Like.objects.filter(user=user, post_id__in=post_ids).values_list("post_id", flat=True)
+    )
+    if post_ids:
+        # bulk_create skips the per-like signals; recount the touched posts once
+        Like.objects.bulk_create(
+            [Like(user=user, post_id=post_id) for post_id in post_ids],
+            ignore_conflicts=True,
+        )
+        Post.objects.filter(pk__in=post_ids).sync_counters()
+        for post_id in post_ids:
+            fragment_cache.bump_version(post_id)
+            live.publish(post_id)
+    likes.clear()
@@ -0,0 +1,78 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models import Count
+from taggit.models import TaggedItem
+
+TAG_CLOUD_KEY = "blog:tag_cloud"
+TAG_CLOUD_WEIGHTS = 5
+
+
+def refresh_tag_stats(tag_ids):
+    """
+    Recount the published posts of the given tags only, and store the
+    results in TagStat.
+
+    Args:
+        tag_ids (Iterable[int]): The tags whose posts changed.
+    """
+    from .models import Post, TagStat
+
+    tag_ids = set(tag_ids)
+    if not tag_ids:
+        return
+    counts = dict.fromkeys(tag_ids, 0)
+    rows = (
+        TaggedItem.objects.filter(
+            tag_id__in=tag_ids,
+            content_type=ContentType.objects.get_for_model(Post),
+            object_id__in=Post.objects.published().values("pk"),
+        )
+        .values("tag_id")
+        .annotate(total=Count("pk"))
+    )
+    for row in rows:
+        counts[row["tag_id"]] = row["total"]
+    TagStat.objects.bulk_create(
+        [TagStat(tag_id=tag_id, published_posts=total) for tag_id, total in counts.items()],
+        update_conflicts=True,
+        unique_fields=["tag"],
+        update_fields=["published_posts"],
+    )
+    cache.delete(TAG_CLOUD_KEY)
+
+
+def tag_ids_for_post(post):
+    return list(
+        TaggedItem.objects.filter(
+            content_type=ContentType.objects.get_for_model(post), object_id=post.pk
+        ).values_list("tag_id", flat=True)
+    )
+
+
+def get_tag_cloud():
+    """
+    Return the tags used by published posts, ordered by name, each as a dict
+    with ``name``, ``slug``, ``count`` and a ``weight`` from 1 to 5 for
+    sizing.
+    """
+    from .models import TagStat
+
+    cloud = cache.get(TAG_CLOUD_KEY)
+    if cloud is None:
+        stats = list(
+            TagStat.objects.filter(published_posts__gt=0)
+            .select_related("tag")
+            .order_by("tag__name")
+        )
+        top = max((stat.published_posts for stat in stats), default=1)
+        cloud = [
+            {
+                "name": stat.tag.name,
+                "slug": stat.tag.slug,
+                "count": stat.published_posts,
+                "weight": 1 + (TAG_CLOUD_WEIGHTS - 1) * stat.published_posts // top,
+            }
+            for stat in stats
+        ]
+        cache.set(TAG_CLOUD_KEY, cloud, None)
+    return cloud
@@ -0,0 +1,126 @@
+from django import template
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+from blog import fragment_cache
+
+register = template.Library()
+
+# render_context entries: {post_id: version}, and {key: fragment or None}
+# for the fragments already looked up by {% prefetch_postcache %}
+VERSIONS_KEY = "blog:postcache:versions"
+FRAGMENTS_KEY = "blog:postcache:fragments"
+
+
+def _site_version(context):
+    # fragments show site-wide data too (category names), so the site
+    # version is part of the key; it is looked up once per render
+    site_version = context.render_context.get(fragment_cache.SITE_VERSION_KEY)
+    if site_version is None:
+        site_version = fragment_cache.get_site_version()
+        context.render_context[fragment_cache.SITE_VERSION_KEY] = site_version
+    return site_version
+
+
+def _key(context, name, post, vary_on, version):
+    return fragment_cache.make_key(name, post.pk, f"{version}.{_site_version(context)}", vary_on)
+
+
+class PostCacheNode(template.Node):
+    def __init__(self, nodelist, name, post, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.post = post
+        self.vary_on = vary_on
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        post = self.post.resolve(context)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        version = context.render_context.get(VERSIONS_KEY, {}).get(post.pk)
+        if version is None:
+            version = fragment_cache.get_version(post.pk)
+        key = _key(context, name, post, vary_on, version)
+
+        prefetched = context.render_context.get(FRAGMENTS_KEY, {})
+        content = prefetched[key] if key in prefetched else cache.get(key)
+        fragment_cache.record(content is not None)
+        if content is None:
+            content = self.nodelist.render(context)
+            cache.set(key, content, fragment_cache.FRAGMENT_TIMEOUT)
+        return mark_safe(content)
+
+
+class PrefetchPostCacheNode(template.Node):
+    def __init__(self, name, posts, vary_on):
+        self.name = name
+        self.posts = posts
+        self.vary_on = vary_on
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        posts = list(self.posts.resolve(context) or ())
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        versions = fragment_cache.get_versions([post.pk for post in posts])
+        keys = [_key(context, name, post, vary_on, versions[post.pk]) for post in posts]
+        found = cache.get_many(keys)
+        context.render_context.setdefault(VERSIONS_KEY, {}).update(versions)
+        context.render_context.setdefault(FRAGMENTS_KEY, {}).update(
+            {key: found.get(key) for key in keys}
+        )
+        return ""
+
+
+@register.tag("postcache")
+def do_postcache(parser, token):
+    """
+    Cache a template fragment until the post it belongs to changes.
+
+    Usage::
+
+        {% postcache "card" post %} ... {% endpostcache %}
+        {% postcache "comments" post user.pk %} ... {% endpostcache %}
+
+    The key includes the post's fragment version, which is bumped whenever
+    the post, its likes, its comments or the names of their authors change,
+    the site version (bumped when categories change), plus any extra
+    vary-on arguments for markup that depends on the viewer.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' tag requires at least a fragment name and a post."
+        )
+    nodelist = parser.parse(("endpostcache",))
+    parser.delete_first_token()
+    return PostCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        parser.compile_filter(bits[2]),
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
+
+
+@register.tag("prefetch_postcache")
+def do_prefetch_postcache(parser, token):
+    """
+    Look up the cached fragments of a list of posts in two round trips (all
+    versions, then all fragments), for the {% postcache %} tags of a loop.
+
+    Usage::
+
+        {% prefetch_postcache "card" posts %}
+        {% for post in posts %}{% postcache "card" post %} ... {% endfor %}
+
+    The name and vary-on arguments must match those of the loop's tag.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' tag requires at least a fragment name and a list of posts."
+        )
+    return PrefetchPostCacheNode(
+        parser.compile_filter(bits[1]),
+        parser.compile_filter(bits[2]),
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
@@ -0,0 +1,56 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+from blog.images import DEFAULT_SIZES, render_picture, static_manifest
+from blog.tags import get_tag_cloud
+
+register = template.Library()
+
+
+def _entry(image):
+    # a derivative entry (Post.cover) or the path of a static image
+    return image if isinstance(image, dict) else static_manifest().get(image)
+
+
+@register.inclusion_tag("blog/partials/tag_cloud.html")
+def tag_cloud(current=None):
+    """
+    Render the precomputed tag cloud, highlighting the current tag slug.
+    """
+    return {"tags": get_tag_cloud(), "current": current}
+
+
+@register.simple_tag
+def responsive_image(image, alt="", sizes=DEFAULT_SIZES, **attrs):
+    """
+    Render an image as a <picture> of its derivatives, with srcset, sizes
+    and intrinsic width/height.
+
+    ``image`` is a derivative entry such as Post.cover, or the path of a
+    static image; a static image without derivatives (no
+    build_image_derivatives run) falls back to a plain <img>.
+    """
+    entry = _entry(image)
+    if entry is None:
+        return format_html(
+            '<img src="{}" alt="{}"{}>',
+            static(image),
+            alt,
+            format_html_join("", ' {}="{}"', attrs.items()),
+        )
+    return mark_safe(render_picture(entry, {"alt": alt, **attrs}, sizes))
+
+
+@register.simple_tag(takes_context=True)
+def image_url(context, image):
+    """
+    Return the absolute URL of the width-capped copy of an image (as for
+    responsive_image), for places that take a single URL such as og:image,
+    which crawlers only accept absolute.
+    """
+    entry = _entry(image)
+    url = entry["src"] if entry else static(image)
+    request = context.get("request")
+    return request.build_absolute_uri(url) if request is not None else url
@@ -1,3 +1,1104 @@
-from django.test import TestCase
+import base64
+import hashlib
+import io
+import json
+import re
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import unquote
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.core.management import call_command
+from django.template import Context, Template
+from django.db import connection
+from django.test import AsyncClient, Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from taggit.models import Tag
+
+from core.sitemaps import BlogSitemap
+
+from . import api, benchmarks, checks, fragment_cache, live, metrics, nplusone, ratelimit, views
+from .categories import get_category_by_slug, get_category_index
+from .models import Category, Comment, Like, LiveEvent, Post, TagStat
+from .pagination import KeysetPaginator
+from .query_plans import check_query_plans, sequential_scans
+from .tags import get_tag_cloud
+from .view_counter import ViewCountBuffer
+
+
+# templates (and the 500 page) must render without a collectstatic manifest
+@override_settings(
+    STORAGES={
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+        "derivatives": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": tempfile.mkdtemp(), "base_url": "/media/derivatives/"},
+        },
+    }
+)
+class BlogTestCase(TestCase):
+    """
+    A small seeded blog: a dozen posts with categories, tags, comments and
+    likes, enough for a repeated query to stand out.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            "seed_blog",
+            users=5,
+            posts=12,
+            categories=3,
+            tags=6,
+            comments=4,
+            likes=3,
+            seed=1,
+            stdout=io.StringIO(),
+        )
+        cls.post = Post.objects.published().order_by("-comment_count", "-id").first()
+
+    def setUp(self):
+        # the cache lives in memory, outside the rolled back transaction
+        cache.clear()
+
+
+class PageTests(BlogTestCase):
+    """
+    The blog pages render with posts, comments and tags; the runner fails
+    any page that repeats a query per row.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.first()
+        # the page cache would hide the views' queries from anonymous repeats
+        self.member = Client()
+        self.member.force_login(self.user)
+
+    def get(self, url, data=None, **extra):
+        for client in (self.client, self.member):
+            response = client.get(url, data, **extra)
+            self.assertEqual(response.status_code, 200, url)
+        return response
+
+    def test_post_list(self):
+        response = self.get(reverse("blog:post_list"))
+        self.assertContains(response, self.post.title)
+
+    def test_posts_list_next_page(self):
+        self.get(reverse("blog:posts_list"), HTTP_HX_REQUEST="true")
+
+    def test_post_detail(self):
+        response = self.get(self.post.get_absolute_url())
+        self.assertContains(response, self.post.title)
+        comment = self.post.comments.filter(active=True).first()
+        self.assertContains(response, f'id="comment-{comment.pk}"')
+
+    def test_comment_page(self):
+        self.get(reverse("blog:comment_page", args=[self.post.slug]), HTTP_HX_REQUEST="true")
+
+    def test_category(self):
+        category = Post.objects.published().exclude(category=None).first().category
+        response = self.get(reverse("blog:category_posts", args=[category.slug]))
+        self.assertContains(response, category.name)
+
+    def test_tag(self):
+        tag = self.post.tags.first()
+        response = self.get(reverse("blog:tag_posts", args=[tag.slug]))
+        self.assertContains(response, tag.name)
+
+    def test_search(self):
+        word = self.post.title.split()[0]
+        response = self.get(reverse("blog:post_search"), {"q": word})
+        self.assertContains(response, self.post.title)
+
+
+class PostCounterTests(BlogTestCase):
+    """
+    The like and comment counters stored on Post follow the rows they count.
+    """
+
+    def assertCounters(self, likes, comments):
+        self.post.refresh_from_db(fields=["like_count", "comment_count"])
+        self.assertEqual(
+            (self.post.like_count, self.post.comment_count),
+            (self.post.likes.count(), self.post.comments.filter(active=True).count()),
+        )
+        self.assertEqual((self.post.like_count, self.post.comment_count), (likes, comments))
+
+    def test_seeded_counters_are_in_sync(self):
+        self.assertFalse(Post.objects.with_counter_drift().exists())
+
+    def test_likes(self):
+        likes, comments = self.post.like_count, self.post.comment_count
+        user = get_user_model().objects.exclude(like__post=self.post).first()
+        like = Like.objects.create(user=user, post=self.post)
+        self.assertCounters(likes + 1, comments)
+        like.delete()
+        self.assertCounters(likes, comments)
+
+    def test_comments(self):
+        likes, comments = self.post.like_count, self.post.comment_count
+        comment = Comment.objects.create(post=self.post, name="Ospite", content="Ciao")
+        self.assertCounters(likes, comments + 1)
+        comment.active = False
+        comment.save()
+        self.assertCounters(likes, comments)
+        comment.content = "Modificato"
+        comment.save()  # still inactive: no change
+        self.assertCounters(likes, comments)
+        comment.delete()
+        self.assertCounters(likes, comments)
+        Comment.objects.create(post=self.post, name="Ospite", content="Spam", active=False)
+        self.assertCounters(likes, comments)
+
+    def test_sync_post_counters(self):
+        likes, comments = self.post.like_count, self.post.comment_count
+        Post.objects.filter(pk=self.post.pk).update(like_count=99, comment_count=0)
+        out = io.StringIO()
+        call_command("sync_post_counters", dry_run=True, stdout=out)
+        self.assertIn(f"1 post(s) have drifted counters: [{self.post.pk}]", out.getvalue())
+        call_command("sync_post_counters", stdout=out)
+        self.assertCounters(likes, comments)
+        call_command("sync_post_counters", stdout=out)
+        self.assertIn("All post counters are in sync.", out.getvalue())
+
+
+class KeysetPaginatorTests(BlogTestCase):
+    """
+    Cursor pages cover every row once, and bad cursors start over.
+    """
+
+    def setUp(self):
+        super().setUp()
+        # rows sharing a created_at are told apart by id
+        Post.objects.filter(pk__in=Post.objects.order_by("id").values("pk")[:4]).update(
+            created_at=self.post.created_at
+        )
+        self.paginator = KeysetPaginator(Post.objects.all(), 5)
+
+    def walk(self, paginator):
+        seen, cursor = [], None
+        while True:
+            page = paginator.get_page(cursor)
+            seen += [post.pk for post in page.object_list]
+            if not page.has_next():
+                return seen
+            cursor = page.next_cursor
+
+    def test_pages_cover_every_row_once(self):
+        newest = list(Post.objects.order_by("-created_at", "-id").values_list("pk", flat=True))
+        self.assertEqual(self.walk(self.paginator), newest)
+        oldest = KeysetPaginator(Post.objects.all(), 5, descending=False)
+        self.assertEqual(self.walk(oldest), newest[::-1])
+
+    def test_cursor_round_trip(self):
+        post = Post.objects.order_by("id").first()
+        cursor = KeysetPaginator.encode_cursor(post)
+        self.assertEqual(KeysetPaginator.decode_cursor(cursor), (post.created_at, post.pk))
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        first = [post.pk for post in self.paginator.get_page().object_list]
+        cursor = self.paginator.get_page().next_cursor
+        forged = signing.dumps([self.post.created_at.isoformat(), self.post.pk], salt="other")
+        malformed = signing.dumps(["yesterday", "1"], salt=KeysetPaginator.salt)
+        value, signature = cursor.rsplit(":", 1)
+        tampered = f"{value}:{'A' * len(signature)}"
+        for bad in (tampered, forged, malformed, "x"):
+            self.assertIsNone(KeysetPaginator.decode_cursor(bad))
+            page = self.paginator.get_page(bad)
+            self.assertEqual([post.pk for post in page.object_list], first)
+
+    async def test_async_page(self):
+        cursor = (await sync_to_async(self.paginator.get_page)()).next_cursor
+        page = await self.paginator.aget_page(cursor)
+        expected = await sync_to_async(self.paginator.get_page)(cursor)
+        self.assertEqual(
+            [post.pk for post in page.object_list], [post.pk for post in expected.object_list]
+        )
+        self.assertEqual(page.next_cursor, expected.next_cursor)
+
+
+class PostSummaryTests(BlogTestCase):
+    """
+    The stored summary and rendered HTML follow the content.
+    """
+
+    def test_card_instance_saves_without_loading_content(self):
+        post = Post.objects.for_cards().get(pk=self.post.pk)
+        post.category = None
+        with mock.patch.object(Post, "render_content") as render_content:
+            post.save()
+        render_content.assert_not_called()
+        self.assertIn("content", post.get_deferred_fields())
+        self.post.refresh_from_db()
+        self.assertIsNone(self.post.category)
+        self.assertTrue(self.post.content_rendered)
+
+    def test_backfill_fills_missing_posts_only(self):
+        expected = Post.objects.values_list("excerpt", "content_rendered").get(pk=self.post.pk)
+        Post.objects.filter(pk=self.post.pk).update(excerpt="", word_count=0, content_rendered="")
+        out = io.StringIO()
+        call_command("backfill_post_summaries", stdout=out)
+        self.assertIn("Updated summaries for 1 post(s).", out.getvalue())
+        self.assertEqual(
+            Post.objects.values_list("excerpt", "content_rendered").get(pk=self.post.pk), expected
+        )
+
+
+class SearchIndexTests(BlogTestCase):
+    """
+    The full-text index follows the saves that change what it holds.
+    """
+
+    def test_unindexed_fields_skip_the_index(self):
+        with mock.patch("blog.search.index_post") as index_post:
+            self.post.save(update_fields=["views"])
+            index_post.assert_not_called()
+            self.post.save(update_fields=["title"])
+            index_post.assert_called_once_with(self.post)
+
+    def test_search_finds_an_edited_title(self):
+        self.post.title = "Configurare la stampante di rete"
+        self.post.save(update_fields=["title"])
+        response = self.client.get(reverse("blog:post_search"), {"q": "stampante"})
+        self.assertContains(response, "Configurare la stampante di rete")
+
+
+class PageCacheTests(BlogTestCase):
+    """
+    Anonymous pages are shared per path and page parameters only.
+    """
+
+    def stored_pages(self, *queries):
+        url = reverse("blog:post_list")
+        with mock.patch("blog.page_cache.cache", wraps=cache) as spy:
+            for query in queries:
+                self.assertEqual(Client().get(f"{url}{query}").status_code, 200)
+        return [call.args[0] for call in spy.set.call_args_list if call.args[0].startswith("blog:page:")]
+
+    def test_page_parameters_share_a_copy(self):
+        self.assertEqual(len(self.stored_pages("", "?page=1", "?page=1", "")), 2)
+
+    def test_other_query_strings_are_not_cached(self):
+        self.assertEqual(self.stored_pages("?utm_source=news", "?page=1&fbclid=x"), [])
+
+
+class TagStatTests(BlogTestCase):
+    """
+    The published post counts of the tag cloud follow tag and status
+    changes, for the tags involved only.
+    """
+
+    def stats(self):
+        return dict(TagStat.objects.values_list("tag_id", "published_posts"))
+
+    def assertInSync(self):
+        published = Post.objects.published()
+        expected = {tag.pk: published.filter(tags=tag).count() for tag in Tag.objects.all()}
+        self.assertEqual(self.stats(), expected)
+
+    def test_seeded_stats_are_in_sync(self):
+        self.assertInSync()
+
+    def test_add_and_remove(self):
+        tag = Tag.objects.exclude(pk__in=self.post.tags.values("pk")).first()
+        before = self.stats()
+        self.post.tags.add(tag)
+        self.assertEqual(self.stats()[tag.pk], before[tag.pk] + 1)
+        self.post.tags.remove(tag)
+        self.assertEqual(self.stats(), before)
+        self.assertInSync()
+
+    def test_clear(self):
+        tag_ids = list(self.post.tags.values_list("pk", flat=True))
+        before = self.stats()
+        self.post.tags.clear()
+        stats = self.stats()
+        self.assertEqual([stats[pk] for pk in tag_ids], [before[pk] - 1 for pk in tag_ids])
+        self.assertInSync()
+
+    def test_publish_unpublish_and_delete(self):
+        self.post.status = "draft"
+        self.post.save()
+        self.assertInSync()
+        self.post.status = "published"
+        self.post.save()
+        self.assertInSync()
+        Post.objects.get(pk=self.post.pk).delete()
+        self.assertInSync()
+
+    def test_cloud_follows_stats(self):
+        tag = self.post.tags.first()
+        count = next(entry["count"] for entry in get_tag_cloud() if entry["slug"] == tag.slug)
+        with self.assertNumQueries(0):
+            get_tag_cloud()
+        self.post.tags.remove(tag)
+        cloud = {entry["slug"]: entry["count"] for entry in get_tag_cloud()}
+        self.assertEqual(cloud.get(tag.slug, 0), count - 1)
+
+
+class SitemapTests(BlogTestCase):
+    """
+    The sitemap is an index of chunked sections, cached until the published
+    posts change.
+    """
+
+    def urls(self, response):
+        self.assertEqual(response.status_code, 200)
+        # the host is the current Site's
+        return [
+            re.sub(r"^https?://[^/]+", "", url)
+            for url in re.findall(r"<loc>(.*?)</loc>", response.content.decode())
+        ]
+
+    @mock.patch.object(BlogSitemap, "limit", 5)
+    def test_sections_cover_published_posts(self):
+        published = Post.objects.published()
+        pages = -(-published.count() // 5)
+        index = self.urls(self.client.get("/sitemap.xml"))
+        self.assertIn("/sitemap-static.xml", index)
+        self.assertIn(f"/sitemap-blog.xml?p={pages}", index)
+        listed = []
+        for page in range(1, pages + 1):
+            urls = self.urls(self.client.get("/sitemap-blog.xml", {"p": page}))
+            self.assertLessEqual(len(urls), 5)
+            listed += urls
+        self.assertEqual(
+            sorted(listed),
+            sorted(post.get_absolute_url() for post in published),
+        )
+        self.assertEqual(self.client.get("/sitemap-blog.xml", {"p": pages + 1}).status_code, 404)
+        self.assertEqual(self.client.get("/sitemap-altro.xml").status_code, 404)
+
+    def test_cached_until_published_posts_change(self):
+        url = self.post.get_absolute_url()
+        response = self.client.get("/sitemap-blog.xml")
+        self.assertIn(url, self.urls(response))
+        with self.assertNumQueries(0):
+            self.assertIn(url, self.urls(self.client.get("/sitemap-blog.xml")))
+        response = self.client.get(
+            "/sitemap-blog.xml", headers={"If-Modified-Since": response["Last-Modified"]}
+        )
+        self.assertEqual(response.status_code, 304)
+        self.post.status = "draft"
+        self.post.save()
+        self.assertNotIn(url, self.urls(self.client.get("/sitemap-blog.xml")))
+
+
+class CommentThreadTests(BlogTestCase):
+    """
+    The detail page shows the first comments, fetched only when the cached
+    thread is rendered; the rest load in batches through comment_page.
+    """
+
+    def setUp(self):
+        super().setUp()
+        Comment.objects.bulk_create(
+            Comment(post=self.post, name=f"Ospite {n}", content=f"Commento {n}")
+            for n in range(views.COMMENTS_PER_PAGE + 5)
+        )
+        self.comments = list(
+            self.post.comments.filter(active=True).order_by("created_at", "id").values_list("pk", flat=True)
+        )
+        self.member = Client()
+        self.member.force_login(get_user_model().objects.first())
+
+    def shown(self, response):
+        return [int(pk) for pk in re.findall(r'id="comment-(\d+)"', response.content.decode())]
+
+    def next_url(self, response):
+        match = re.search(r'data-comments-more hx-get="([^"]+)"', response.content.decode())
+        return match and match.group(1).replace("&amp;", "&")
+
+    def test_thread_loads_in_batches(self):
+        response = self.member.get(self.post.get_absolute_url())
+        self.assertEqual(self.shown(response), self.comments[:views.COMMENTS_PER_PAGE])
+        shown, url = self.shown(response), self.next_url(response)
+        while url:
+            response = self.member.get(url, HTTP_HX_REQUEST="true")
+            self.assertEqual(response.status_code, 200)
+            shown += self.shown(response)
+            url = self.next_url(response)
+        self.assertEqual(shown, self.comments)
+
+    def test_cached_thread_skips_the_comment_query(self):
+        self.member.get(self.post.get_absolute_url())
+        with CaptureQueriesContext(connection) as queries:
+            response = self.member.get(self.post.get_absolute_url())
+        self.assertEqual(self.shown(response), self.comments[:views.COMMENTS_PER_PAGE])
+        self.assertFalse([q for q in queries if 'FROM "blog_comment"' in q["sql"]])
+
+    def test_unknown_post_and_bad_cursor(self):
+        url = reverse("blog:comment_page", args=[self.post.slug])
+        response = self.member.get(url, {"cursor": "manomesso"}, HTTP_HX_REQUEST="true")
+        self.assertEqual(self.shown(response), self.comments[:views.COMMENTS_PER_PAGE])
+        missing = reverse("blog:comment_page", args=["non-esiste"])
+        self.assertEqual(self.member.get(missing).status_code, 404)
+
+
+class AsyncViewTests(BlogTestCase):
+    """
+    The HTMX and list endpoints run as async views under ASGI, with the
+    middleware measuring their queries from the ORM's worker threads.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.first()
+        self.member = AsyncClient()
+        self.member.force_login(self.user)
+        self.guest = AsyncClient()
+        # the ASGI handler renders 404 pages in a thread of their own, which
+        # cannot read the tables the test transaction wrote: warm the menus
+        get_category_index()
+
+    async def test_posts_list(self):
+        response = await self.guest.get(reverse("blog:posts_list"), headers={"HX-Request": "true"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("db;dur=", response["Server-Timing"])
+        self.assertNotIn('db;dur=0.0;desc="0 queries"', response["Server-Timing"])
+        cursor = re.search(r"cursor=([^\"&]+)", response.content.decode()).group(1)
+        response = await self.guest.get(
+            reverse("blog:posts_list"), {"cursor": unquote(cursor)}, headers={"HX-Request": "true"}
+        )
+        self.assertEqual(response.status_code, 200)
+        response = await self.guest.get(reverse("blog:posts_list"), {"page": "2"})
+        self.assertEqual(response.status_code, 200)
+
+    async def test_search_and_tag(self):
+        word = self.post.title.split()[0]
+        response = await self.guest.get(reverse("blog:post_search"), {"q": word})
+        self.assertContains(response, self.post.title)
+        tag = await self.post.tags.afirst()
+        response = await self.guest.get(reverse("blog:tag_posts", args=[tag.slug]))
+        self.assertContains(response, tag.name)
+        response = await self.guest.get(reverse("blog:tag_posts", args=["non-esiste"]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_guest_like(self):
+        # kept in the guest's session, not as a Like row
+        url = reverse("blog:like_toggle", args=[self.post.slug])
+        likes = await Like.objects.acount()
+        self.assertContains(await self.guest.post(url), "fas text-[#D93A00]")
+        self.assertContains(await self.guest.post(url), '<i class="far fa-heart')
+        self.assertEqual(await Like.objects.acount(), likes)
+        response = await self.guest.post(reverse("blog:like_toggle", args=["non-esiste"]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_comment_add_and_update(self):
+        response = await self.member.post(
+            reverse("blog:add_comment", args=[self.post.slug]), {"content": "Ciao a tutti"}
+        )
+        self.assertContains(response, "Ciao a tutti")
+        comment = await Comment.objects.filter(post=self.post, author=self.user).alatest("id")
+        url = reverse("blog:comment_update", args=[comment.pk])
+        response = await self.guest.post(url, {"content": "Manomesso"})
+        self.assertEqual(response.status_code, 403)
+        response = await self.member.post(url, {"content": "Corretto"})
+        self.assertContains(response, "Corretto")
+        await comment.arefresh_from_db()
+        self.assertEqual(comment.content, "Corretto")
+
+    async def test_events_without_live_updates(self):
+        with self.settings(LIVE_UPDATES=False):
+            response = await self.guest.get(reverse("blog:post_events", args=[self.post.slug]))
+        self.assertEqual(response.status_code, 204)
+
+
+class CategoryIndexTests(BlogTestCase):
+    """
+    Categories come from one cached query until a category or post changes,
+    and the pages showing them follow.
+    """
+
+    def counts(self):
+        return {category.pk: category.num_posts for category in get_category_index()}
+
+    def test_index_is_built_once(self):
+        with self.assertNumQueries(1):
+            index = get_category_index()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_category_index(), index)
+            self.assertEqual(get_category_by_slug(index[0].slug), index[0])
+            self.assertIsNone(get_category_by_slug("non-esiste"))
+        self.assertEqual([category.name for category in index], sorted(c.name for c in index))
+        for category in index:
+            self.assertEqual(category.num_posts, category.post_set.filter(status="published").count())
+
+    def test_index_follows_categories_and_posts(self):
+        category = self.post.category
+        before = self.counts()
+        self.post.status = "draft"
+        self.post.save()
+        self.assertEqual(self.counts()[category.pk], before[category.pk] - 1)
+        added = Category.objects.create(name="Nuova categoria", slug="nuova-categoria")
+        self.assertEqual(self.counts()[added.pk], 0)
+        added.delete()
+        self.assertNotIn(added.pk, self.counts())
+
+    def test_category_page_follows_changes(self):
+        category = self.post.category
+        url = reverse("blog:category_posts", args=[category.slug])
+        self.assertContains(self.client.get(url), self.post.title)
+        with self.assertNumQueries(0):  # served from the page cache
+            self.assertContains(self.client.get(url), self.post.title)
+        category.name = "Categoria rinominata"
+        category.save()
+        self.assertContains(self.client.get(url), "Categoria rinominata")
+        self.post.title = "Titolo rinominato"
+        self.post.save()
+        self.assertContains(self.client.get(url), "Titolo rinominato")
+
+
+class FragmentCacheTests(BlogTestCase):
+    """
+    Post cards are cached until their post, its category or its author
+    change, and a list looks its cards up in one batch.
+    """
+
+    def cards(self):
+        return self.client.get(reverse("blog:posts_list"), HTTP_HX_REQUEST="true").content.decode()
+
+    def test_cards_are_looked_up_in_one_batch(self):
+        self.cards()
+        with mock.patch("blog.fragment_cache.cache", wraps=cache) as versions:
+            with mock.patch("blog.templatetags.blog_cache.cache", wraps=cache) as fragments:
+                self.cards()
+        # the site version is one get; every card version and fragment comes
+        # from one get_many each
+        self.assertEqual(versions.get.call_count, 1)
+        self.assertEqual(versions.get_many.call_count, 1)
+        self.assertFalse(fragments.get.called)
+        self.assertEqual(fragments.get_many.call_count, 1)
+
+    def test_card_follows_post_category_and_author(self):
+        post = Post.objects.for_cards().first()
+        self.assertIn(post.title, self.cards())
+
+        Post.objects.filter(pk=post.pk).first().save()  # no change, same card
+        post = Post.objects.select_related("category", "author").get(pk=post.pk)
+        post.title = "Titolo rinominato"
+        post.save()
+        self.assertIn("Titolo rinominato", self.cards())
+
+        post.category.name = "Categoria rinominata"
+        post.category.save()
+        self.assertIn("Categoria rinominata", self.cards())
+
+        post.author.first_name, post.author.last_name = "Ada", "Lovelace"
+        post.author.save()
+        self.assertIn("Ada Lovelace", self.cards())
+
+    def test_deleted_post_leaves_the_list(self):
+        post = Post.objects.for_cards().first()
+        self.assertIn(f'href="{post.get_absolute_url()}"', self.cards())
+        Post.objects.get(pk=post.pk).delete()
+        self.assertNotIn(f'href="{post.get_absolute_url()}"', self.cards())
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "test_cache",
+        }
+    }
+)
+class DatabaseCacheNPlusOneTests(BlogTestCase):
+    """
+    Cache lookups are queries under a DatabaseCache, and the N+1 runner
+    counts them: the list pages must not read the cache once per card.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command("createcachetable", verbosity=0)
+        super().setUpTestData()
+
+    def test_cache_queries_are_counted(self):
+        self.assertFalse(nplusone.is_incidental('SELECT "cache_key" FROM "test_cache" WHERE 1'))
+
+    def test_cache_read_per_row_is_reported(self):
+        post_ids = list(Post.objects.values_list("pk", flat=True)[:5])
+        fragment_cache.get_versions(post_ids)
+        with nplusone.detect("versions"):
+            fragment_cache.get_versions(post_ids)
+            fragment_cache.get_list_version()
+            fragment_cache.get_site_version()
+        with self.assertRaisesMessage(nplusone.NPlusOneError, "keys :?:blog:post:?:version"):
+            with nplusone.detect("versions"):
+                for post_id in post_ids:
+                    fragment_cache.get_version(post_id)
+
+    def test_list_pages(self):
+        user = get_user_model().objects.first()
+        urls = (reverse("blog:post_list"), reverse("blog:posts_list"))
+        # a cold cache stores one fragment per card, which is no N+1
+        with override_settings(NPLUSONE_ACTION="warn"), self.assertLogs("blog.nplusone", "WARNING"):
+            warming = Client()
+            warming.force_login(user)
+            for url in urls:
+                warming.get(url, HTTP_HX_REQUEST="true")
+        member = Client()
+        member.force_login(user)
+        for url in urls:
+            self.assertEqual(member.get(url, HTTP_HX_REQUEST="true").status_code, 200)
+
+
+class LikeToggleTests(BlogTestCase):
+    """
+    Toggling a like keeps the row and the post's counter in step.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.exclude(like__post=self.post).first()
+        self.count = self.post.like_count
+
+    def test_like_and_unlike(self):
+        self.assertEqual(Like.objects.toggle(self.user.pk, self.post.pk), (True, self.count + 1))
+        self.assertTrue(Like.objects.filter(user=self.user, post=self.post).exists())
+        self.assertEqual(Like.objects.toggle(self.user.pk, self.post.pk), (False, self.count))
+        self.assertFalse(Like.objects.filter(user=self.user, post=self.post).exists())
+        self.post.refresh_from_db(fields=["like_count"])
+        self.assertEqual(self.post.like_count, self.count)
+
+    def test_counter_never_goes_negative(self):
+        Like.objects.create(user=self.user, post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(like_count=0)
+        self.assertEqual(Like.objects.toggle(self.user.pk, self.post.pk), (False, 0))
+
+    def test_missing_post(self):
+        missing = Post.objects.order_by("-pk").values_list("pk", flat=True).first() + 1
+        with self.assertRaises(Post.DoesNotExist):
+            Like.objects.toggle(self.user.pk, missing)
+        self.assertFalse(Like.objects.filter(post_id=missing).exists())
+
+    def test_stale_slug_is_not_found(self):
+        client = Client()
+        client.force_login(self.user)
+        url = reverse("blog:like_toggle", args=[self.post.slug])
+        self.assertEqual(client.post(url).status_code, 200)
+        with mock.patch("blog.views.apost_id_for_slug", return_value=10**9):
+            self.assertEqual(client.post(url).status_code, 404)
+
+
+class ViewCountBufferTests(BlogTestCase):
+    """
+    Post views are buffered and written back in batches.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.other = Post.objects.exclude(pk=self.post.pk).first()
+        self.views = dict(Post.objects.values_list("pk", "views"))
+
+    def assertViews(self, post, added):
+        post.refresh_from_db(fields=["views"])
+        self.assertEqual(post.views, self.views[post.pk] + added)
+
+    def test_hits_are_written_in_one_batch(self):
+        buffer = ViewCountBuffer(flush_interval=3600, flush_threshold=100)
+        for post in (self.post, self.other, self.post):
+            buffer.add(post.pk)
+        self.assertViews(self.post, 0)
+        with self.assertNumQueries(4):  # savepoint, one update per post, release
+            self.assertEqual(buffer.close(), 3)
+        self.assertViews(self.post, 2)
+        self.assertViews(self.other, 1)
+        self.assertEqual(buffer.stats()["pending_hits"], 0)
+
+    def test_threshold_flush(self):
+        buffer = ViewCountBuffer(flush_interval=3600, flush_threshold=3)
+        buffer.add(self.post.pk)
+        buffer.add(self.post.pk)
+        self.assertViews(self.post, 0)
+        buffer.add(self.post.pk)
+        self.assertViews(self.post, 3)
+        self.assertEqual(buffer.stats()["flushes"], 1)
+        buffer.close()
+
+    def test_interval_flush_on_hit(self):
+        buffer = ViewCountBuffer(flush_interval=3600, flush_threshold=100)
+        buffer.add(self.post.pk)
+        with mock.patch("blog.view_counter.time.monotonic", return_value=time.monotonic() + 3600):
+            buffer.add(self.post.pk)
+        self.assertViews(self.post, 2)
+        buffer.close()
+
+    def test_interval_flush_without_requests(self):
+        buffer = ViewCountBuffer(flush_interval=0, flush_threshold=100)
+        buffer.timer_tick = 0.01
+        buffer.add(self.post.pk)  # flushes at once: the interval has passed
+        # the thread's own connection cannot see the test transaction, so
+        # only check that it calls flush()
+        with mock.patch.object(buffer, "flush", return_value=1) as flush:
+            buffer._record(self.post.pk, 1)  # a hit the request did not flush
+            for _ in range(200):
+                if flush.called:
+                    break
+                time.sleep(0.01)
+            self.assertTrue(flush.called)
+        self.assertEqual(buffer.close(), 1)
+        self.assertViews(self.post, 2)
+
+
+class MetricsTests(BlogTestCase):
+    """
+    Per-view metrics are published per worker and served to Prometheus.
+    """
+
+    def registry(self, worker):
+        registry = metrics.MetricsRegistry(flush_interval=3600, slots=4)
+        registry.worker = worker
+        request_metrics = metrics.RequestMetrics()
+        request_metrics.total = 0.03
+        request_metrics.db_queries = 3
+        request_metrics.cache_hits = 2
+        registry.record('blog:post_detail "x"', request_metrics)
+        return registry
+
+    def test_workers_publish_to_their_own_slots(self):
+        first, second = self.registry("web-1:1"), self.registry("web-2:2")
+        first.flush()
+        second.flush()
+        first.flush()
+        self.assertNotEqual(first._slot, second._slot)
+        workers = first.collect()
+        self.assertEqual(set(workers), {"web-1:1", "web-2:2"})
+        series = workers["web-2:2"]["views"]['blog:post_detail "x"']
+        self.assertEqual(series["counters"]["view_cache_hits_total"], 2)
+
+    def test_lost_slot_is_claimed_again(self):
+        registry = self.registry("web-1:1")
+        registry.flush()
+        self.assertEqual(registry._slot, 0)
+        # the slot expired and another worker took it
+        cache.set(metrics.SLOT_KEY.format(0), {"worker": "web-2:2", "views": {}})
+        registry.flush()
+        self.assertEqual(registry._slot, 1)
+        self.assertEqual(set(registry.collect()), {"web-1:1", "web-2:2"})
+
+    def test_prometheus_format(self):
+        output = metrics.render_prometheus(self.registry("web-1:1").collect())
+        lines = output.splitlines()
+        labels = 'view="blog:post_detail \\"x\\"",worker="web-1:1"'
+        self.assertIn("# TYPE view_db_queries histogram", lines)
+        self.assertIn(f'view_db_queries_bucket{{{labels},le="2"}} 0', lines)
+        self.assertIn(f'view_db_queries_bucket{{{labels},le="5"}} 1', lines)
+        self.assertIn(f'view_db_queries_bucket{{{labels},le="+Inf"}} 1', lines)
+        self.assertIn(f"view_db_queries_sum{{{labels}}} 3", lines)
+        self.assertIn(f"view_db_queries_count{{{labels}}} 1", lines)
+        self.assertIn(f'view_duration_seconds_bucket{{{labels},le="0.05"}} 1', lines)
+        self.assertIn("# TYPE view_cache_hits_total counter", lines)
+        self.assertIn(f"view_cache_hits_total{{{labels}}} 2", lines)
+        self.assertTrue(output.endswith("\n"))
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_token_auth(self):
+        url = reverse("metrics")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        response = self.client.get(url, headers={"Authorization": "Bearer wrong"})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(url, headers={"Authorization": "Bearer s3cret"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn("# TYPE view_duration_seconds histogram", response.content.decode())
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        with mock.patch("blog.metrics.install") as install:
+            apps.get_app_config("blog").ready()
+        install.assert_not_called()
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 404)
+
+
+class APIQueryBudgetTests(BlogTestCase):
+    """
+    The list endpoints stay within their query budgets; the runner turns
+    an overrun into a failure.
+    """
+
+    def test_post_list(self):
+        response = self.client.get(reverse("v1:post_list"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_list_with_fields(self):
+        response = self.client.get(reverse("v1:post_list"), {"fields": "title,slug,tags"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_comment_list(self):
+        response = self.client.get(reverse("v1:comment_list", args=[self.post.slug]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_category_list(self):
+        response = self.client.get(reverse("v1:category_list"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_overrun_raises(self):
+        with mock.patch.object(api.PostListAPIView, "query_budget", 0):
+            with self.assertRaises(api.QueryBudgetError):
+                self.client.get(reverse("v1:post_list"))
+
+
+class ResponsiveImageTests(BlogTestCase):
+    """
+    Images we host are rewritten into <picture> elements when a post is
+    rendered, and their derivatives are served.
+    """
+
+    # a 1x1 PNG, as pasted into the editor
+    PIXEL = (
+        "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGA"
+        "hKmMIQAAAABJRU5ErkJggg=="
+    )
+
+    def test_content_keeps_img_and_rendered_has_picture(self):
+        content = f'<p>Foto</p><img src="data:image/png;base64,{self.PIXEL}" alt="Foto">'
+        self.post.content = content
+        self.post.save()
+        self.post.refresh_from_db()
+
+        self.assertEqual(self.post.content, content)
+        self.assertIn("<picture>", self.post.content_rendered)
+
+        src = self.post.content_rendered.split('<img src="', 1)[1].split('"', 1)[0]
+        self.assertTrue(src.startswith("/media/derivatives/"))
+        response = self.client.get(src)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertTrue(response["Content-Type"].startswith("image/"))
+        response.close()
+
+    def test_missing_derivative(self):
+        response = self.client.get("/media/derivatives/missing-000000000000-320.webp")
+        self.assertEqual(response.status_code, 404)
+
+    def test_cover_on_card_and_og_image(self):
+        self.post.content = f'<img src="data:image/png;base64,{self.PIXEL}" alt="Foto">'
+        self.post.save()
+        self.assertEqual(self.post.cover["src"], self.post.content_rendered.split('<img src="', 1)[1].split('"', 1)[0])
+
+        cards = self.client.get(reverse("blog:post_list"))
+        self.assertContains(cards, f'<img src="{self.post.cover["src"]}"')
+        detail = self.client.get(self.post.get_absolute_url())
+        self.assertContains(
+            detail, f'<meta property="og:image" content="http://testserver{self.post.cover["src"]}">'
+        )
+
+    def test_static_image_without_derivatives(self):
+        rendered = Template(
+            "{% load blog_tags %}{% responsive_image 'images/tecnopronto.png' alt='Logo' %}"
+            "|{% image_url 'images/tecnopronto.png' %}"
+        ).render(Context({"request": RequestFactory().get("/")}))
+        self.assertEqual(
+            rendered,
+            '<img src="/static/images/tecnopronto.png" alt="Logo">'
+            "|http://testserver/static/images/tecnopronto.png",
+        )
+
+    def test_oversized_images_are_left_alone(self):
+        for size, limit in ((2, "MAX_SOURCE_BYTES"), (3, "MAX_PIXELS")):
+            # an image never processed before, so no derivatives exist
+            buffer = io.BytesIO()
+            Image.new("RGB", (size, size)).save(buffer, "PNG")
+            encoded = base64.b64encode(buffer.getvalue()).decode()
+            with self.subTest(limit), mock.patch(f"blog.images.{limit}", 1):
+                self.post.content = f'<img src="data:image/png;base64,{encoded}" alt="Foto">'
+                self.post.save()
+                self.assertNotIn("<picture>", self.post.content_rendered)
+                self.assertIsNone(self.post.cover)
+
+
+class CodeHighlightTests(BlogTestCase):
+    """
+    Code samples are highlighted when a post is rendered.
+    """
+
+    def test_code_sample_is_highlighted(self):
+        self.post.content = '<pre class="language-python"><code>def f():\n    return 1</code></pre>'
+        self.post.save()
+        self.assertIn('class="highlight language-python"', self.post.content_rendered)
+        self.assertIn('<span class="k">def</span>', self.post.content_rendered)
+
+
+@override_settings(BLOG_RATE_LIMITS={"comment": (1, 60), "like": (1, 60)})
+class RateLimitTests(BlogTestCase):
+    """
+    Write endpoints are throttled per session, per user and per address.
+    """
+
+    def comment(self, client, **extra):
+        return client.post(
+            reverse("blog:add_comment", args=[self.post.slug]),
+            {"content": "Bell'articolo"},
+            **extra,
+        )
+
+    def like(self, **extra):
+        # a fresh client each time: a guest without a session cookie
+        return Client().post(reverse("blog:like_toggle", args=[self.post.slug]), **extra)
+
+    def test_new_session_does_not_refill_user_bucket(self):
+        user = get_user_model().objects.first()
+        first, second = Client(), Client()
+        first.force_login(user)
+        second.force_login(user)
+        self.assertEqual(self.comment(first, REMOTE_ADDR="10.0.0.1").status_code, 200)
+        self.assertEqual(self.comment(second, REMOTE_ADDR="10.0.0.2").status_code, 429)
+
+    @override_settings(BLOG_RATE_LIMIT_TRUST_FORWARDED=True)
+    def test_forwarded_addresses_are_told_apart(self):
+        # the address bucket holds IP_MULTIPLIER tokens
+        for address in ("203.0.113.1", "203.0.113.2"):
+            for _ in range(5):
+                response = self.like(HTTP_X_FORWARDED_FOR=f"198.51.100.7, {address}")
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.like(HTTP_X_FORWARDED_FOR="203.0.113.1").status_code, 429)
+
+
+    def test_bucket_starts_over_once(self):
+        with mock.patch("blog.ratelimit.time.time", return_value=1000.0):
+            self.assertEqual(ratelimit.consume("like", "test", 1, 60), 0)
+            self.assertGreater(ratelimit.consume("like", "test", 1, 60), 0)
+        # a concurrent request already started the refilled bucket over
+        start_key = f"ratelimit:like:{hashlib.md5(b'test').hexdigest()}"
+        cache.set(f"{start_key}:1000.0:next", 1059.0)
+        with mock.patch("blog.ratelimit.time.time", return_value=1060.0):
+            self.assertEqual(ratelimit.consume("like", "test", 1, 60), 0)
+            self.assertGreater(ratelimit.consume("like", "test", 1, 60), 0)
+            self.assertEqual(cache.get(start_key), 1059.0)
+
+    def test_non_atomic_cache_is_rejected(self):
+        with override_settings(CACHES={"default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "test_cache",
+        }}):
+            errors = checks.check_atomic_incr(None)
+        self.assertEqual([error.id for error in errors], ["blog.E002"])
+        self.assertEqual(checks.check_atomic_incr(None), [])
+
+
+class QueryPlanTests(TestCase):
+    """
+    The hot queries are served by indexes.
+    """
+
+    def test_no_sequential_scans(self):
+        # raises QueryPlanError, with the plans, on a sequential scan
+        plans = check_query_plans(posts=300)
+        self.assertEqual(
+            set(plans), {"list", "list_next_page", "category", "slug", "detail", "comments"}
+        )
+        self.assertEqual(sequential_scans(plans), {})
+
+
+class BenchmarkRegressionTests(TestCase):
+    """
+    The blog views make no more queries than the stored benchmark baseline
+    (see the benchmark_blog command, which also compares latencies).
+    """
+
+    def test_query_counts(self):
+        baseline = benchmarks.load_baseline(benchmarks.DEFAULT_BASELINE)
+        self.assertIsNotNone(baseline, "no benchmark baseline")
+        results = benchmarks.run(sizes=[100], iterations=2)
+        regressions = benchmarks.compare(results, baseline, latency_tolerance=None)
+        self.assertEqual(regressions, [], "query counts grew; see benchmark_blog")
+
+
+@override_settings(PROFILER_DIR=tempfile.mkdtemp())
+class ProfilerTests(BlogTestCase):
+    """
+    Under ASGI a profiled sync view is sampled in the thread that runs it.
+    """
+
+    async def test_sync_view_is_sampled(self):
+        staff = await get_user_model().objects.filter(is_staff=False).afirst()
+        staff.is_staff = True
+        await staff.asave()
+        client = AsyncClient()
+        await client.aforce_login(staff)
+
+        get_object = views.PostDetailView.get_object
+
+        def slow_get_object(view, *args, **kwargs):
+            time.sleep(0.1)
+            return get_object(view, *args, **kwargs)
+
+        with mock.patch.object(views.PostDetailView, "get_object", slow_get_object):
+            response = await client.get(self.post.get_absolute_url(), {"_profile": ""})
+        self.assertEqual(response.status_code, 200)
+
+        capture = Path(settings.PROFILER_DIR) / response["X-Profile-Capture"]
+        document = json.loads(capture.read_text())
+        names = [frame["name"] for frame in document["shared"]["frames"]]
+        sync = next(p for p in document["profiles"] if p["name"].endswith("(sync)"))
+        sampled = {names[index] for stack in sync["samples"] for index in stack}
+        self.assertIn("ProfilerTests.test_sync_view_is_sampled.<locals>.slow_get_object", sampled)
+
+
+@override_settings(LIVE_UPDATES=True, LIVE_BACKEND="blog.live.DatabaseBackend")
+class LiveUpdateTests(BlogTestCase):
+    """
+    Changes reach the live streams once committed, including those whose
+    post is gone by then.
+    """
+
+    def test_delete_post_with_likes_and_comments(self):
+        post = Post.objects.filter(likes__isnull=False, comments__isnull=False).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.assertFalse(Post.objects.filter(pk=post.pk).exists())
+
+    def test_events_of_deleted_posts_are_skipped(self):
+        comment = self.post.comments.filter(active=True).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            comment.delete()
+            Post.objects.filter(pk=self.post.pk).delete()
+        event = LiveEvent.objects.latest("id")
+        self.assertEqual(event.post_id, self.post.pk)
+        self.assertEqual(live.render_changes([(event.post_id, None)], {self.post.pk}), {})
+
+    def test_guest_comment_is_rendered(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            comment = Comment.objects.create(post=self.post, name="Ospite Rossi", content="Ciao")
+        messages = live.render_changes([(self.post.pk, comment.pk)], {self.post.pk})
+        html, author_id = messages[self.post.pk][0]
+        self.assertIn(f'id="comment-{comment.pk}"'.encode(), html)
+        self.assertIn(b"Ospite Rossi", html)
+        self.assertIsNone(author_id)
+
+    def test_late_commit_is_not_missed(self):
+        backend = live.DatabaseBackend()
+        LiveEvent.objects.create(post_id=1)
+        backend.start()  # what came before is not sent
+        early = LiveEvent.objects.create(post_id=2)
+        LiveEvent.objects.create(post_id=3)
+        # the first row's transaction has not committed yet
+        early_id = early.pk
+        early.delete()
+        self.assertEqual(backend.fetch(), [(3, None)])
+        LiveEvent.objects.create(pk=early_id, post_id=2, comment_id=5)
+        self.assertEqual(backend.fetch(), [(2, 5)])
+        self.assertEqual(backend.fetch(), [])
+
+    def test_publish_prunes_old_events(self):
+        backend = live.DatabaseBackend(retention=60)
+        old = LiveEvent.objects.create(post_id=1)
+        LiveEvent.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(minutes=5))
+        backend.publish(2)
+        self.assertEqual(list(LiveEvent.objects.values_list("post_id", flat=True)), [2])
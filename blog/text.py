@@ -0,0 +1,42 @@
+import html
+import math
+import re
+
+from django.utils.html import strip_tags
+
+EXCERPT_WORDS = 40
+WORDS_PER_MINUTE = 200
+
+_whitespace_re = re.compile(r"\s+")
+
+
+def plain_text(value):
+    """
+    Convert stored TinyMCE HTML into whitespace-normalized plain text.
+    """
+    # keep words in adjacent block elements apart before stripping tags
+    text = strip_tags(value.replace("<", " <"))
+    return _whitespace_re.sub(" ", html.unescape(text)).strip()
+
+
+def summarize(value):
+    """
+    Compute the listing metadata for a post body.
+
+    Args:
+        value (str): The HTML content of the post.
+
+    Returns:
+        dict: ``excerpt``, ``word_count`` and ``reading_time`` (minutes),
+            ready to be assigned to the matching Post fields.
+    """
+    words = plain_text(value or "").split(" ") if value else []
+    words = [word for word in words if word]
+    excerpt = " ".join(words[:EXCERPT_WORDS])
+    if len(words) > EXCERPT_WORDS:
+        excerpt += " …"
+    return {
+        "excerpt": excerpt,
+        "word_count": len(words),
+        "reading_time": max(1, math.ceil(len(words) / WORDS_PER_MINUTE)) if words else 0,
+    }
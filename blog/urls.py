@@ -5,6 +5,9 @@ app_name = 'blog'
 
 urlpatterns = [
     path('', views.PostListView.as_view(), name='post_list'),
+    path('posts/', views.posts_list, name='posts_list'),
+    path('search/', views.post_search, name='post_search'),
+    path('tag/<slug:slug>/', views.tag_posts, name='tag_posts'),
     path('post/<slug:slug>/', views.PostDetailView.as_view(), name='post_detail'),
     path('category/<slug:slug>/', views.CategoryPostListView.as_view(), name='category_posts'),
     path('create/', views.PostCreateView.as_view(), name='post_create'),
@@ -13,6 +16,8 @@ urlpatterns = [
     # HTMX URLs
     path('like/<slug:slug>/', views.like_toggle, name='like_toggle'),
     path('post/<slug:slug>/comment/', views.add_comment, name='add_comment'),
+    path('post/<slug:slug>/comments/', views.comment_page, name='comment_page'),
+    path('post/<slug:slug>/events/', views.post_events, name='post_events'),
     path('comment/<int:pk>/', views.comment_edit, name='comment_edit'),
     path('comment/<int:pk>/update/', views.comment_update, name='comment_update'),
     path('comment-item/<int:pk>/', views.comment_item, name='comment_item'),
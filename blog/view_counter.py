@@ -0,0 +1,181 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCountBuffer:
+    """
+    Write-behind buffer for post view counts.
+
+    Hits are accumulated in process memory per post id and written back as one
+    ``UPDATE ... SET views = views + n`` per post, either when the number of
+    pending hits reaches ``flush_threshold`` or when ``flush_interval`` seconds
+    have passed since the last flush. A background thread checks the
+    interval every second, so hits are written even when no further request
+    comes in. A worker that dies loses at most the hits of one
+    interval/threshold window.
+    """
+
+    # how often the background thread checks whether a flush is due
+    timer_tick = 1.0
+
+    def __init__(self, flush_interval=10, flush_threshold=100):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._pending_hits = 0
+        self._oldest_hit = None
+        self._last_flush = time.monotonic()
+        self.last_flush_lag = 0.0
+        self.flushed_hits = 0
+        self.flushes = 0
+        self._timer = None
+        self._stopping = threading.Event()
+
+    def add(self, post_id, hits=1):
+        """
+        Record hits for a post and flush if the buffer is due.
+
+        Args:
+            post_id (int): The primary key of the viewed post.
+            hits (int): The number of views to add.
+        """
+        if self._record(post_id, hits):
+            self.flush()
+
+    async def aadd(self, post_id, hits=1):
+        """
+        Async variant of add(); a due flush runs in a worker thread.
+        """
+        if self._record(post_id, hits):
+            await sync_to_async(self.flush)()
+
+    def _record(self, post_id, hits):
+        now = time.monotonic()
+        with self._lock:
+            self._pending[post_id] += hits
+            self._pending_hits += hits
+            if self._oldest_hit is None:
+                self._oldest_hit = now
+            due = (
+                self._pending_hits >= self.flush_threshold
+                or now - self._last_flush >= self.flush_interval
+            )
+            if self._timer is None:
+                # started with the first hit, so processes that never
+                # serve a post page do not run it
+                self._timer = threading.Thread(
+                    target=self._run_timer,
+                    args=(self._stopping,),
+                    name="view-count-flush",
+                    daemon=True,
+                )
+                self._timer.start()
+        return due
+
+    def _run_timer(self, stopping):
+        while not stopping.wait(self.timer_tick):
+            with self._lock:
+                due = (
+                    self._pending_hits > 0
+                    and time.monotonic() - self._last_flush >= self.flush_interval
+                )
+            if due:
+                try:
+                    self.flush()
+                finally:
+                    # the thread serves no requests; do not keep a connection
+                    connection.close()
+
+    def flush(self):
+        """
+        Write all pending hits to the database.
+
+        Returns:
+            int: The number of hits written.
+        """
+        from .models import Post
+
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            hits, self._pending_hits = self._pending_hits, 0
+            oldest, self._oldest_hit = self._oldest_hit, None
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        try:
+            with transaction.atomic():
+                # sorted ids keep the row-lock order stable across workers
+                for post_id, count in sorted(pending.items()):
+                    Post.objects.filter(pk=post_id).update(views=F("views") + count)
+        except Exception:
+            logger.exception("Failed to flush %d buffered post views", hits)
+            with self._lock:
+                self._pending.update(pending)
+                self._pending_hits += hits
+                self._oldest_hit = min(filter(None, [oldest, self._oldest_hit]), default=None)
+            return 0
+
+        self.last_flush_lag = time.monotonic() - oldest
+        self.flushed_hits += hits
+        self.flushes += 1
+        logger.debug(
+            "Flushed %d views for %d posts (lag %.2fs)",
+            hits, len(pending), self.last_flush_lag,
+        )
+        return hits
+
+    def close(self):
+        """
+        Stop the background thread and write the pending hits, while the
+        database they belong to is still there (the test runner calls this
+        before destroying the test databases). A later hit starts a new
+        thread.
+
+        Returns:
+            int: The number of hits written.
+        """
+        with self._lock:
+            timer, self._timer = self._timer, None
+            stopping, self._stopping = self._stopping, threading.Event()
+        stopping.set()
+        if timer is not None:
+            timer.join()
+        return self.flush()
+
+    def stats(self):
+        """
+        Return a snapshot of the buffer state, including how long the oldest
+        pending hit has been waiting and the lag of the last flush.
+        """
+        with self._lock:
+            oldest = self._oldest_hit
+            return {
+                "pending_hits": self._pending_hits,
+                "pending_posts": len(self._pending),
+                "oldest_pending_age": time.monotonic() - oldest if oldest else 0.0,
+                "last_flush_lag": self.last_flush_lag,
+                "flushed_hits": self.flushed_hits,
+                "flushes": self.flushes,
+            }
+
+
+view_counts = ViewCountBuffer(
+    flush_interval=getattr(settings, "BLOG_VIEWS_FLUSH_INTERVAL", 10),
+    flush_threshold=getattr(settings, "BLOG_VIEWS_FLUSH_THRESHOLD", 100),
+)
+
+# write out whatever is left when a worker shuts down cleanly
+atexit.register(view_counts.close)
@@ -1,17 +1,27 @@
-from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponse, HttpResponseForbidden
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, get_object_or_404, aget_object_or_404
+from django.http import Http404, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import urlencode
 from .models import Post, Category, Comment, Like
-from django.db.models import Count
+from taggit.models import Tag
+from .categories import get_category_by_slug, get_category_index
+from .pagination import KeysetPaginator
+from .ratelimit import rate_limit
+from .search import search_posts
+from .guest_likes import aguest_likes, guest_likes
+from . import fragment_cache, live
+from .page_cache import ConditionalPageMixin, apost_id_for_slug, forget_slugs, post_id_for_slug
 
 from django.views.decorators.http import require_POST
 from django.core.paginator import Paginator
 from django.template.loader import render_to_string
 from .forms import CommentForm, PostForm
 
-class PostListView(ListView):
+class PostListView(ConditionalPageMixin, ListView):
     model = Post
     template_name = 'blog/post_list.html'
     context_object_name = 'posts'
@@ -24,25 +34,57 @@ class PostListView(ListView):
         Returns:
             QuerySet: A queryset of Post objects with the status "published".
         """
-        return Post.objects.filter(status='published')
+        # cards only need the stored excerpt, never the HTML body
+        return Post.objects.for_cards().order_by('-created_at', '-id')
     
     # allows you to add additional context data
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.filter(post__status='published').annotate(num_posts=Count('post')).order_by('name')
+        context['categories'] = [category for category in get_category_index() if category.num_posts]
+        # infinite scroll continues from the last post on this page by cursor
+        page_obj = context['page_obj']
+        if page_obj and page_obj.has_next():
+            last_post = list(context['posts'])[-1]
+            context['next_url'] = _posts_list_url(cursor=KeysetPaginator.encode_cursor(last_post))
         return context 
 
-class PostDetailView(DetailView):
+    def get_page_versions(self):
+        return [fragment_cache.get_list_version(), fragment_cache.get_site_version()]
+
+class PostDetailView(ConditionalPageMixin, DetailView):
     """
     A view that displays the details of a single blog post.
 
-    This view increments the post's view count and provides context data for
+    This view records a (buffered) post view and provides context data for
     the post's comments and whether the current user has liked the post.
     """
     model = Post
+    # the page shows content_rendered; the raw editor HTML is never needed
+    queryset = Post.objects.select_related('author', 'category').defer('content')
     template_name = 'blog/post_detail.html'
     context_object_name = 'post'
     
+    def get_page_versions(self):
+        """
+        Return the versions the rendered page depends on.
+
+        The post id is resolved from the slug through the cache, so a
+        conditional or cached hit does not touch the database at all.
+        """
+        self.page_post_id = post_id_for_slug(self.kwargs['slug'])
+        if self.page_post_id is None:
+            return None
+        # cached responses skip get_object(); count the view all the same
+        self.request.viewed_post_id = self.page_post_id
+        return [fragment_cache.get_version(self.page_post_id), fragment_cache.get_site_version()]
+    
+    def get_viewer_state(self):
+        state = super().get_viewer_state()
+        if not self.request.user.is_authenticated:
+            liked = self.page_post_id in guest_likes(self.request)
+            state = f"{state}:liked={liked}"
+        return state
+    
     def get_object(self):
         """
         Return the post object.
@@ -51,6 +93,8 @@ class PostDetailView(DetailView):
         """
         # Get the post object
         post = super().get_object()
+        # picked up by PostViewCounterMiddleware once the response succeeds
+        self.request.viewed_post_id = post.pk
         
         return post
     
@@ -58,26 +102,32 @@ class PostDetailView(DetailView):
         """
         Add additional context data to the template.
 
-        This method adds the post's active comments and indicates whether the
-        current user (authenticated or guest) has liked the post.
+        This method adds the first page of the post's active comments and
+        indicates whether the current user (authenticated or guest) has
+        liked the post. The comments are only fetched if the cached comments
+        fragment has to be rendered; later pages load through comment_page.
 
         Returns:
             dict: The context data for the template.
         """
         context = super().get_context_data(**kwargs)
-        context['comments'] = self.object.comments.select_related('author').filter(active=True)
+        context['comment_page'] = SimpleLazyObject(
+            lambda: _comment_page(self.object.pk, self.object.slug)
+        )
         
         # Check if user liked the post
         if self.request.user.is_authenticated:
             context['liked'] = self.object.user_has_liked(self.request.user)
         else:
             # Check session for guest likes
-            liked_posts = self.request.session.get('liked_posts', [])
-            context['liked'] = self.object.id in liked_posts
+            context['liked'] = self.object.id in guest_likes(self.request)
+
+        # counters and new comments are pushed to the open page (blog.live)
+        context['live_updates'] = live.enabled()
         
         return context
 
-class CategoryPostListView(ListView):
+class CategoryPostListView(ConditionalPageMixin, ListView):
     """
     A view that displays a list of published blog posts for a specific category.
 
@@ -97,8 +147,10 @@ class CategoryPostListView(ListView):
             QuerySet: A queryset of Post objects filtered by category and
                 status.
         """
-        self.category = get_object_or_404(Category, slug=self.kwargs["slug"])
-        return Post.objects.filter(category=self.category, status="published")
+        self.category = get_category_by_slug(self.kwargs["slug"])
+        if self.category is None:
+            raise Http404("No Category matches the given query.")
+        return Post.objects.for_cards().filter(category=self.category)
     
     def get_context_data(self, **kwargs):
         """
@@ -112,12 +164,13 @@ class CategoryPostListView(ListView):
         """
         context = super().get_context_data(**kwargs)
         context['category'] = self.category
-        #Show Number of Posts in Categories
-        context['categories'] = Category.objects.annotate(num_posts=Count('post'))
-        #Fetches all category objects from database
-        context['categories'] = Category.objects.all()
+        #Show Number of Posts in Categories, from the cached category index
+        context['categories'] = get_category_index()
         return context
 
+    def get_page_versions(self):
+        return [fragment_cache.get_list_version(), fragment_cache.get_site_version()]
+
 class PostCreateView(LoginRequiredMixin, CreateView):
     """
     A view that requires the user to be logged in and sets the author of the post
@@ -204,15 +257,40 @@ def get_context_data(self, **kwargs):
         context['htmx'] = True
     return context
 
+async def arender(request, template_name, context):
+    """
+    render() for the async views.
+
+    Templates may still touch lazy objects that query the database
+    (``user``, unloaded relations), which is not allowed on the event loop,
+    so they are rendered in a worker thread.
+    """
+    return await sync_to_async(render)(request, template_name, context)
+
+async def auser(request):
+    """
+    Return the request's user, loaded without blocking the event loop.
+
+    request.auser() and request.user cache the user separately; the loaded
+    user is stored on request.user as well so the templates rendered
+    afterwards do not query it a second time.
+    """
+    user = await request.auser()
+    request.user = user
+    return user
+
 # Like view
 @require_POST
-def like_toggle(request, slug):
+@rate_limit("like")
+async def like_toggle(request, slug):
     """
     Toggle the like status of a post.
 
     This function handles the like toggle action for a post. It checks if the
     user is authenticated and uses the database to store likes. If the user is
-    not authenticated, it uses the session to store likes.
+    not authenticated, it uses the session to store likes (see
+    blog.guest_likes); those are merged into real likes when the visitor logs
+    in.
 
     Args:
         request (HttpRequest): The HTTP request object.
@@ -221,43 +299,36 @@ def like_toggle(request, slug):
     Returns:
         HttpResponse: The response to redirect to the post detail page.
     """
-    post = get_object_or_404(Post, slug=slug)
-    if request.user.is_authenticated:
-        # Authenticated user - use database
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
-        
-        if not created:
-            like.delete()
-            liked = False
-        else:
-            liked = True
+    # resolve the slug through the cache instead of loading the post
+    post_id = await apost_id_for_slug(slug)
+    if post_id is None:
+        raise Http404("No Post matches the given query.")
+
+    user = await auser(request)
+    if user.is_authenticated:
+        # Authenticated user - toggle and read back the counter atomically
+        try:
+            liked, like_count = await sync_to_async(Like.objects.toggle)(user.pk, post_id)
+        except Post.DoesNotExist:
+            # a slug cached for a post deleted since
+            await sync_to_async(forget_slugs)(slug)
+            raise Http404("No Post matches the given query.")
+        await fragment_cache.abump_version(post_id)
+        await live.apublish(post_id)
     else:
-        # Guest user - use session
-        if 'liked_posts' not in request.session:
-            request.session['liked_posts'] = []
-        
-        liked_posts = request.session['liked_posts']
-        
-        if post.id in liked_posts:
-            # Unlike
-            liked_posts.remove(post.id)
-            liked = False
-        else:
-            # Like
-            liked_posts.append(post.id)
-            liked = True
-        
-        request.session['liked_posts'] = liked_posts
-        request.session.modified = True
+        # Guest user - use the compact set in the session
+        liked = (await aguest_likes(request)).toggle(post_id)
+        like_count = await Post.objects.filter(pk=post_id).values_list('like_count', flat=True).afirst() or 0
     
-    return render(request, 'blog/partials/like_button.html', {
-        'post': post,
+    return await arender(request, 'blog/partials/like_button.html', {
+        'post': Post(pk=post_id, slug=slug, like_count=like_count),
         'liked': liked
     })
 
 # Comment views
 @require_POST
-def add_comment(request, slug):
+@rate_limit("comment")
+async def add_comment(request, slug):
     """
     Add a comment to a post.
 
@@ -272,25 +343,26 @@ def add_comment(request, slug):
     Returns:
         HttpResponse: The response to redirect to the post detail page.
     """
-    post = get_object_or_404(Post, slug=slug)
+    post = await aget_object_or_404(Post, slug=slug)
     form = CommentForm(request.POST)
     
     if form.is_valid():
         comment = form.save(commit=False)
         comment.post = post
-        if request.user.is_authenticated:
-            comment.author = request.user
+        user = await auser(request)
+        if user.is_authenticated:
+            comment.author = user
         # For guests, author is None, name/email come from form
-        comment.save()
+        await comment.asave()
         
-        return render(request, 'blog/partials/comment_item.html', {
+        return await arender(request, 'blog/partials/comment_item.html', {
             'comment': comment,
             'post': post
         })
         
     return HttpResponse(status=400)
 
-def comment_edit(request, pk):
+async def comment_edit(request, pk):
     """
     Edit a comment.
 
@@ -305,13 +377,14 @@ def comment_edit(request, pk):
     Returns:
         HttpResponse: The response to redirect to the post detail page.
     """
-    comment = get_object_or_404(Comment, pk=pk)
-    return render(request, 'blog/partials/comment_edit.html', {
+    comment = await aget_object_or_404(Comment.objects.select_related('author'), pk=pk)
+    return await arender(request, 'blog/partials/comment_edit.html', {
         'comment': comment
     })
 
 @require_POST
-def comment_update(request, pk):
+@rate_limit("comment_update")
+async def comment_update(request, pk):
     """
     Update a comment.
 
@@ -326,57 +399,239 @@ def comment_update(request, pk):
     Returns:
         HttpResponse: The response to redirect to the post detail page.
     """
-    comment = get_object_or_404(Comment, pk=pk)
-    if request.user != comment.author:
+    comment = await aget_object_or_404(Comment.objects.select_related('author'), pk=pk)
+    if await auser(request) != comment.author:
         return HttpResponseForbidden()
         
     form = CommentForm(request.POST, instance=comment)
     if form.is_valid():
-        form.save()
-        return render(request, 'blog/partials/comment_item.html', {
+        await sync_to_async(form.save)()
+        return await arender(request, 'blog/partials/comment_item.html', {
             'comment': comment
         })
         
     return HttpResponse(status=400)
 
-def comment_item(request, pk):
-    comment = get_object_or_404(Comment, pk=pk)
-    return render(request, 'blog/partials/comment_item.html', {
+async def post_events(request, slug):
+    """
+    Stream a post's like and comment counts and its new comments.
+
+    A Server-Sent Events stream read by the htmx SSE extension on the post
+    page (see blog.live). Answers 204 when live updates are off, which
+    tells the browser not to reconnect.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        slug (str): The slug of the post to follow.
+
+    Returns:
+        StreamingHttpResponse: The event stream.
+    """
+    if not live.enabled():
+        return HttpResponse(status=204)
+    post_id = await apost_id_for_slug(slug)
+    if post_id is None:
+        raise Http404("No Post matches the given query.")
+    user = await auser(request)
+    response = StreamingHttpResponse(
+        live.hub.stream(post_id, user.pk), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # keep nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+async def comment_item(request, pk):
+    comment = await aget_object_or_404(Comment.objects.select_related('author'), pk=pk)
+    return await arender(request, 'blog/partials/comment_item.html', {
         'comment': comment
     })
 
+# Comment thread
+COMMENTS_PER_PAGE = 20
+
+
+def _comment_paginator(post_id):
+    comments = Comment.objects.filter(post_id=post_id, active=True).select_related('author')
+    return KeysetPaginator(comments, COMMENTS_PER_PAGE, descending=False)
+
+
+def _comment_page(post_id, slug, cursor=None):
+    """
+    Return one keyset page of a post's active comments, oldest first, with
+    the URL of the next page (or None) as ``next_url``.
+    """
+    return _with_next_url(_comment_paginator(post_id).get_page(cursor), slug)
+
+
+def _with_next_url(page, slug):
+    page.next_url = None
+    if page.has_next():
+        page.next_url = f"{reverse('blog:comment_page', args=[slug])}?{urlencode({'cursor': page.next_cursor})}"
+    return page
+
+
+async def comment_page(request, slug):
+    """
+    Display the next batch of comments of a post.
+
+    The detail page renders the first COMMENTS_PER_PAGE comments inline and
+    ends the list with a sentinel that loads this view when revealed; each
+    batch ends with the sentinel for the following one.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        slug (str): The slug of the post.
+
+    Returns:
+        HttpResponse: The comments partial.
+    """
+    post_id = await apost_id_for_slug(slug)
+    if post_id is None:
+        raise Http404
+    page = await _comment_paginator(post_id).aget_page(request.GET.get('cursor'))
+    return await arender(request, 'blog/partials/comment_page.html', {
+        'comment_page': _with_next_url(page, slug),
+    })
+
 # Infinite scroll
-def posts_list(request):
+POSTS_PER_PAGE = 5
+
+
+def _posts_list_url(**params):
+    """
+    Build an absolute posts_list URL, so the infinite scroll sentinel works
+    from any page that includes the post cards.
+    """
+    return f"{reverse('blog:posts_list')}?{urlencode(params)}"
+
+
+def _offset_page(posts, number):
+    """
+    Return the posts of a legacy ``?page=N`` page, evaluated, and the URL
+    of the next page (or None).
+    """
+    page_obj = Paginator(posts.order_by('-created_at', '-id'), POSTS_PER_PAGE).get_page(number)
+    next_url = None
+    if page_obj.has_next():
+        next_url = _posts_list_url(page=page_obj.next_page_number())
+    return list(page_obj.object_list), next_url
+
+
+async def posts_list(request):
     """
     Display a list of posts.
 
-    This function handles the display of a list of posts. It checks if the
-    user is authenticated and uses the database to display posts. If the user is
-    not authenticated, it uses the session to display posts.
+    This function serves the infinite scroll. By default it uses keyset
+    pagination on ``(created_at, id)``: the ``cursor`` query parameter is an
+    opaque, signed position and every scroll step is a single index range
+    scan without a COUNT(*). The legacy ``?page=N`` URLs are still answered
+    with offset pagination so existing links and crawlers keep working.
 
     Args:
         request (HttpRequest): The HTTP request object.
 
     Returns:
-        HttpResponse: The response to render the posts list page.
+        HttpResponse: The post cards partial for HTMX requests, otherwise the
+            full posts list page.
     """
-    page = request.GET.get('page', 1)
-    posts = Post.objects.filter(status='published').order_by('-created_at')
-    
-    paginator = Paginator(posts, 5)
-    page_obj = paginator.get_page(page)
-    
-    if page_obj.has_next():
-        next_url = f"?page={page_obj.next_page_number()}"
+    posts = Post.objects.for_cards()
+
+    if 'page' in request.GET:
+        # the Paginator counts and slices synchronously
+        object_list, next_url = await sync_to_async(_offset_page)(posts, request.GET.get('page'))
     else:
-        next_url = None
+        paginator = KeysetPaginator(posts, POSTS_PER_PAGE)
+        page = await paginator.aget_page(request.GET.get('cursor'))
+        object_list = page.object_list
+        if page.has_next():
+            next_url = _posts_list_url(cursor=page.next_cursor)
+        else:
+            next_url = None
         
     context = {
-        'posts': page_obj.object_list,
+        'posts': object_list,
         'next_url': next_url
     }
     
     if request.htmx:
-        return render(request, 'blog/partials/posts_list.html', context)
+        return await arender(request, 'blog/partials/post_cards.html', context)
         
-    return render(request, 'blog/post_list.html', context)
\ No newline at end of file
+    return await arender(request, 'blog/post_list.html', context)
+
+
+async def post_search(request):
+    """
+    Search the published posts.
+
+    Matching uses the database's full-text index (see blog.search), so the
+    cost does not grow with the size of the archive. Results come in pages
+    of POSTS_PER_PAGE, best match first.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponse: The post cards partial for HTMX requests, otherwise the
+            full search results page.
+    """
+    query = request.GET.get('q', '').strip()[:200]
+    if not query and request.htmx:
+        # a cleared search box brings the regular post list back
+        return await posts_list(request)
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page = 1
+
+    posts = Post.objects.for_cards()
+    # fetch one extra result to know whether another page exists
+    results = await sync_to_async(search_posts)(posts, query, POSTS_PER_PAGE + 1, (page - 1) * POSTS_PER_PAGE)
+    next_url = None
+    if len(results) > POSTS_PER_PAGE:
+        next_url = f"{reverse('blog:post_search')}?{urlencode({'q': query, 'page': page + 1})}"
+
+    context = {
+        'posts': results[:POSTS_PER_PAGE],
+        'next_url': next_url,
+        'query': query,
+    }
+
+    if request.htmx:
+        return await arender(request, 'blog/partials/post_cards.html', context)
+
+    return await arender(request, 'blog/search.html', context)
+
+
+async def tag_posts(request, slug):
+    """
+    Display the published posts carrying a tag.
+
+    Uses the same keyset pagination on ``(created_at, id)`` as the main
+    infinite scroll, so deep pages of a busy tag stay cheap.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        slug (str): The slug of the tag.
+
+    Returns:
+        HttpResponse: The post cards partial for HTMX requests, otherwise the
+            full tag archive page.
+    """
+    tag = await aget_object_or_404(Tag, slug=slug)
+    paginator = KeysetPaginator(Post.objects.for_cards().filter(tags=tag), POSTS_PER_PAGE)
+    page = await paginator.aget_page(request.GET.get('cursor'))
+    next_url = None
+    if page.has_next():
+        next_url = f"{reverse('blog:tag_posts', args=[tag.slug])}?{urlencode({'cursor': page.next_cursor})}"
+
+    context = {
+        'tag': tag,
+        'posts': page.object_list,
+        'next_url': next_url,
+    }
+
+    if request.htmx:
+        return await arender(request, 'blog/partials/post_cards.html', context)
+
+    return await arender(request, 'blog/tag_posts.html', context)
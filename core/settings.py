@@ -63,6 +63,7 @@ MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware", 
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",  # WhiteNoise
+    "blog.middleware.RequestMetricsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -70,13 +71,87 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "allauth.account.middleware.AccountMiddleware",  # django-allauth
+    "blog.middleware.RequestProfilerMiddleware",
     "django_htmx.middleware.HtmxMiddleware",
+    "blog.middleware.PostViewCounterMiddleware",
+    "blog.middleware.NPlusOneMiddleware",
 ]
 
 if DEBUG:
     MIDDLEWARE.append("debug_toolbar.middleware.DebugToolbarMiddleware")
     MIDDLEWARE.append("django_browser_reload.middleware.BrowserReloadMiddleware")
 
+# https://docs.djangoproject.com/en/dev/ref/settings/#caches
+# Per-process memory by default; point CACHE_BACKEND/CACHE_LOCATION at a
+# shared cache (e.g. django.core.cache.backends.redis.RedisCache) in production.
+# Invalidation (fragment and page versions, category index, slug map,
+# profiler targets) is done by writing keys, so a per-process cache only
+# works with a single worker: more than one WEB_CONCURRENCY worker needs a
+# shared cache server (system check blog.E001)
+CACHES = {
+    "default": {
+        "BACKEND": config("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": config("CACHE_LOCATION", default="soothing-duo"),
+    }
+}
+
+# Number of server worker processes; read by gunicorn in scripts/start.sh
+WEB_CONCURRENCY = config("WEB_CONCURRENCY", default=1, cast=int)
+
+# Blog view counter: hits are buffered per worker and flushed as batched
+# UPDATEs every N seconds or after N hits, whichever comes first
+BLOG_VIEWS_FLUSH_INTERVAL = config("BLOG_VIEWS_FLUSH_INTERVAL", default=10, cast=int)
+BLOG_VIEWS_FLUSH_THRESHOLD = config("BLOG_VIEWS_FLUSH_THRESHOLD", default=100, cast=int)
+
+# Per-request instrumentation: Server-Timing headers, and per-view
+# histograms at /metrics (staff users, or "Authorization: Bearer <token>").
+# METRICS_ENABLED=False leaves queries, templates and caches unpatched.
+# Workers publish their totals to the cache every METRICS_FLUSH_INTERVAL
+# seconds, each in one of METRICS_WORKER_SLOTS slots, so /metrics covers
+# all of them only with a shared cache
+METRICS_ENABLED = config("METRICS_ENABLED", default=True, cast=bool)
+METRICS_SERVER_TIMING = config("METRICS_SERVER_TIMING", default=True, cast=bool)
+METRICS_FLUSH_INTERVAL = config("METRICS_FLUSH_INTERVAL", default=15, cast=int)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+METRICS_WORKER_SLOTS = config("METRICS_WORKER_SLOTS", default=64, cast=int)
+
+# N+1 query detection: "off", "warn" (log) or "raise" when a view of
+# NPLUSONE_APPS runs the same query shape more than NPLUSONE_THRESHOLD
+# times in one request, or an API endpoint goes over its query_budget.
+# The test runner always raises
+NPLUSONE_ACTION = config("NPLUSONE_ACTION", default="warn" if DEBUG else "off")
+NPLUSONE_THRESHOLD = config("NPLUSONE_THRESHOLD", default=3, cast=int)
+NPLUSONE_APPS = ["blog", "pages", "accounts"]
+TEST_RUNNER = "blog.runner.NPlusOneTestRunner"
+
+# On-demand sampling profiler: speedscope captures of requests flagged by
+# staff (?_profile, X-Profile header) or armed in the admin
+PROFILER_DIR = config("PROFILER_DIR", default=str(BASE_DIR / "profiles"))
+PROFILER_INTERVAL = config("PROFILER_INTERVAL", default=0.005, cast=float)
+
+# Post card / comment thread fragments are invalidated by version bumps;
+# the timeout only bounds how long superseded versions linger in the cache
+BLOG_FRAGMENT_CACHE_TIMEOUT = config("BLOG_FRAGMENT_CACHE_TIMEOUT", default=60 * 60 * 24, cast=int)
+
+# Anonymous blog pages are cached whole, keyed by content version (0 = off)
+BLOG_PAGE_CACHE_TIMEOUT = config("BLOG_PAGE_CACHE_TIMEOUT", default=60 * 60, cast=int)
+
+# Token-bucket limits of the blog's write endpoints, as
+# {"comment": (requests, seconds), ...}; see blog.ratelimit for the defaults.
+# Behind a proxy (Railway) trust X-Forwarded-For so visitors are told apart;
+# scripts/start.sh, the production entry point, turns it on.
+BLOG_RATE_LIMITS = {}
+BLOG_RATE_LIMIT_TRUST_FORWARDED = config("BLOG_RATE_LIMIT_TRUST_FORWARDED", default=False, cast=bool)
+
+# The blog sitemap is split into pages of this many posts; generated
+# sitemaps are cached until a published post changes
+SITEMAP_CHUNK_SIZE = config("SITEMAP_CHUNK_SIZE", default=1000, cast=int)
+SITEMAP_CACHE_TIMEOUT = config("SITEMAP_CACHE_TIMEOUT", default=60 * 60 * 24, cast=int)
+
+# Pages showing the availability badge may be cached by browsers until the
+# next open/closed transition, but never longer than this
+AVAILABILITY_CACHE_MAX_AGE = config("AVAILABILITY_CACHE_MAX_AGE", default=600, cast=int)
+
 # REST Framework Settings
 
 REST_FRAMEWORK = {
@@ -86,7 +161,9 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
-    ]
+    ],
+    'DEFAULT_VERSIONING_CLASS': 'rest_framework.versioning.NamespaceVersioning',
+    'ALLOWED_VERSIONS': ['v1'],
 }
 
 
@@ -116,12 +193,27 @@ TEMPLATES = [
     },
 ]
 
+# "asgi" when served by uvicorn workers (see scripts/start.sh). Persistent
+# connections belong to a thread, and async requests hop between threads,
+# so under ASGI they are replaced by psycopg's connection pool
+SERVER_MODE = config("SERVER_MODE", default="wsgi")
+
 DATABASES = {
     "default": dj_database_url.config(
         default=config("DATABASE_URL", default="sqlite:///db.sqlite3"),
-        conn_max_age=600,
+        conn_max_age=0 if SERVER_MODE == "asgi" else 600,
     )
 }
+if SERVER_MODE == "asgi" and DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    DATABASES["default"].setdefault("OPTIONS", {})["pool"] = True
+
+# Like/comment counters and new comments pushed to open post pages over
+# Server-Sent Events. Each open page holds a request, which is only cheap
+# under ASGI. Workers exchange changes through LIVE_BACKEND, polled every
+# LIVE_INTERVAL seconds; bursts within an interval go out as one message
+LIVE_UPDATES = config("LIVE_UPDATES", default=SERVER_MODE == "asgi", cast=bool)
+LIVE_BACKEND = config("LIVE_BACKEND", default="blog.live.DatabaseBackend")
+LIVE_INTERVAL = config("LIVE_INTERVAL", default=1.0, cast=float)
 
 
 
@@ -176,6 +268,12 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 
 
 
+# Uploaded files, including the responsive derivatives of post images.
+# The container disk is thrown away on every deploy: point MEDIA_ROOT at a
+# mounted volume (on Railway, e.g. /data/media) to keep them
+MEDIA_URL = "/media/"
+MEDIA_ROOT = config("MEDIA_ROOT", default=BASE_DIR / "media", cast=Path)
+
 # https://whitenoise.readthedocs.io/en/latest/django.html
 STORAGES = {
     "default": {
@@ -184,6 +282,14 @@ STORAGES = {
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
+    # responsive derivatives of post images, served by blog.images.serve_derivative
+    "derivatives": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {
+            "location": MEDIA_ROOT / "derivatives",
+            "base_url": f"{MEDIA_URL}derivatives/",
+        },
+    },
 }
 
 # Default primary key field type
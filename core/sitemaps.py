@@ -1,7 +1,22 @@
+import time
+
+from django.conf import settings
 from django.contrib import sitemaps
+from django.contrib.sitemaps import views as sitemap_views
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from blog.models import Post
 
+SITEMAP_CHUNK_SIZE = getattr(settings, "SITEMAP_CHUNK_SIZE", 1000)
+SITEMAP_CACHE_TIMEOUT = getattr(settings, "SITEMAP_CACHE_TIMEOUT", 60 * 60 * 24)
+
+VERSION_KEY = "sitemaps:version"
+
+
 class StaticViewSitemap(sitemaps.Sitemap):
     priority = 0.5
     changefreq = "daily"
@@ -15,9 +30,117 @@ class StaticViewSitemap(sitemaps.Sitemap):
 class BlogSitemap(sitemaps.Sitemap):
     changefreq = "weekly"
     priority = 0.8
+    # split into sitemap-blog.xml?p=N pages listed by the sitemap index
+    limit = SITEMAP_CHUNK_SIZE
 
     def items(self):
-        return Post.objects.filter(status="published")
+        # only the two columns the sitemap needs, in a stable order so the
+        # chunks do not shift between requests
+        return Post.objects.published().order_by("pk").values("slug", "updated_at")
+
+    def location(self, item):
+        return reverse("blog:post_detail", args=[item["slug"]])
+
+    def lastmod(self, item):
+        return item["updated_at"]
+
+
+SITEMAPS = {
+    "static": StaticViewSitemap,
+    "blog": BlogSitemap,
+}
+
+
+def get_version():
+    """
+    Return the current version of the generated sitemaps.
+
+    The version is the time (in nanoseconds) the published posts last
+    changed, and doubles as the Last-Modified date of every cached document.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def invalidate_sitemaps():
+    """
+    Drop every cached sitemap document. Called when a post is published,
+    edited while published, or unpublished.
+    """
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def _cached_document(request, name, render):
+    """
+    Serve a generated document from the cache, rendering it on a miss.
+
+    Args:
+        request: The current request.
+        name (str): Cache key part identifying the document.
+        render (callable): Returns an HttpResponse with the document; only
+            200 responses are cached.
+
+    Returns:
+        HttpResponse: The document, or a 304 when the client's copy is
+        current.
+    """
+    version = get_version()
+    last_modified = version // 1_000_000_000
+    response = get_conditional_response(request, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    key = f"sitemaps:{version}:{request.scheme}:{name}"
+    cached = cache.get(key)
+    if cached is None:
+        response = render()
+        if response.status_code != 200:
+            return response
+        if hasattr(response, "render"):
+            response.render()
+        cached = (response.content, response["Content-Type"])
+        cache.set(key, cached, SITEMAP_CACHE_TIMEOUT)
+
+    content, content_type = cached
+    response = HttpResponse(content, content_type=content_type)
+    response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def sitemap_index(request):
+    """
+    The sitemap index, pointing at every page of every section.
+    """
+    return _cached_document(
+        request,
+        "index",
+        lambda: sitemap_views.index(
+            request, SITEMAPS, sitemap_url_name="sitemap_section"
+        ),
+    )
+
+
+def sitemap_section(request, section):
+    """
+    One page (``?p=N``) of one section of the sitemap.
+    """
+    page = request.GET.get("p", "1")
+    return _cached_document(
+        request,
+        f"section:{section}:{page}",
+        lambda: sitemap_views.sitemap(request, SITEMAPS, section=section),
+    )
+
 
-    def lastmod(self, obj):
-        return obj.updated_at
+def robots_txt(request):
+    return _cached_document(
+        request,
+        "robots",
+        lambda: HttpResponse(
+            render_to_string("robots.txt", request=request), content_type="text/plain"
+        ),
+    )
@@ -1,19 +1,18 @@
 from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
-from django.views.generic import TemplateView
-from django.contrib.sitemaps.views import sitemap
-from .sitemaps import StaticViewSitemap, BlogSitemap
-
-sitemaps = {
-    "static": StaticViewSitemap,
-    "blog": BlogSitemap,
-}
+from blog.images import serve_derivative
+from blog.metrics import metrics_view
+from .sitemaps import robots_txt, sitemap_index, sitemap_section
 
 urlpatterns = [
-    path("sitemap.xml", sitemap, {"sitemaps": sitemaps}, name="django.contrib.sitemaps.views.sitemap"),
-    path("robots.txt", TemplateView.as_view(template_name="robots.txt", content_type="text/plain")),
+    path("sitemap.xml", sitemap_index, name="sitemap_index"),
+    path("sitemap-<section>.xml", sitemap_section, name="sitemap_section"),
+    path("robots.txt", robots_txt),
+    path("metrics", metrics_view, name="metrics"),
+    path(f"{settings.MEDIA_URL.lstrip('/')}derivatives/<path:path>", serve_derivative, name="image_derivative"),
     path("admin/", admin.site.urls),
+    path("api/v1/", include("blog.api_urls", namespace="v1")),
     path("accounts/", include("allauth.urls")),
     path("tinymce/", include("tinymce.urls")),
     path("", include("pages.urls")),
@@ -21,6 +20,9 @@ urlpatterns = [
 
 if settings.DEBUG:
     import debug_toolbar
+    from django.conf.urls.static import static
+
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
     urlpatterns = [
         path("__debug__/", include(debug_toolbar.urls)),
@@ -1,6 +1,10 @@
+from django.utils.decorators import method_decorator
 from django.views.generic import TemplateView
 
+from scheduling.cache import cache_until_transition
 
+
+@method_decorator(cache_until_transition, name="dispatch")
 class HomePageView(TemplateView):
     template_name = "pages/home.html"
 
@@ -8,6 +12,7 @@ class HomePageView(TemplateView):
 class AboutPageView(TemplateView):
     template_name = "pages/about.html"
 
+@method_decorator(cache_until_transition, name="dispatch")
 class ContactsPageView(TemplateView):
     template_name = "pages/contacts.html"    
 
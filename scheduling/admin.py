@@ -1,3 +1,16 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import ScheduleException, WeeklyInterval
+
+
+@admin.register(WeeklyInterval)
+class WeeklyIntervalAdmin(admin.ModelAdmin):
+    list_display = ['weekday', 'start_time', 'end_time']
+    list_filter = ['weekday']
+
+
+@admin.register(ScheduleException)
+class ScheduleExceptionAdmin(admin.ModelAdmin):
+    list_display = ['date', 'is_open', 'start_time', 'end_time', 'description']
+    list_filter = ['is_open']
+    date_hierarchy = 'date'
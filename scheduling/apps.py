@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class SchedulingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'scheduling'
+
+    def ready(self):
+        # register the handlers that invalidate the compiled schedule
+        from . import signals  # noqa: F401
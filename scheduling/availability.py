@@ -1,14 +1,29 @@
 import datetime
 from django.utils import timezone
 
+from .schedule import get_schedule
+
 class AvailabilityManager:
     """
     Manages the service availability logic for Tecno Pronto.
-    Schedule:
+
+    The schedule lives in the database (weekly intervals plus dated
+    exceptions, see scheduling.models) and is compiled into a sorted
+    interval table by scheduling.schedule; the default data is
     - Monday to Friday: 18:00 - 00:00 (Midnight)
     - Saturday and Sunday: Available all day (24h)
     """
-    SCHEDULE_TEXT = "Lun-Ven 18:00-24:00 & Weekend"
+
+    # memoized (status data, instant it stops being valid, schedule version)
+    _status_cache = (None, None, None)
+
+    @classmethod
+    def get_schedule_text(cls):
+        """
+        Returns the human readable weekly schedule, e.g.
+        "Lun-Ven 18:00-24:00 & Weekend".
+        """
+        return get_schedule().text
 
     @classmethod
     def is_available(cls, now=None):
@@ -16,33 +31,84 @@ class AvailabilityManager:
         Determines if the service is currently available based on the current time.
         """
         if now is None:
-            # Get current local time in the configured TIME_ZONE
-            now = timezone.localtime(timezone.now())
-        
-        weekday = now.weekday()  # 0 is Monday, 6 is Sunday
-        hour = now.hour
-        
-        # Weekend (Saturday=5, Sunday=6)
-        if weekday >= 5:
-            return True
-        
-        # Weekday (Mon-Fri)
-        # 18:00 to 24:00
-        if 18 <= hour < 24:
-            return True
-            
-        return False
+            now = timezone.now()
+        return get_schedule(now).is_open(now.timestamp())
+
+    @classmethod
+    def next_transition(cls, now=None):
+        """
+        Returns the next instant at which the availability status changes
+        (e.g. Friday 24:00 stays open into the weekend, so the next change
+        after Friday 18:00 is Monday 00:00), or None if the status does not
+        change within the compiled horizon.
+        """
+        if now is None:
+            now = timezone.now()
+        ts = get_schedule(now).next_transition(now.timestamp())
+        return _from_timestamp(ts)
+
+    @classmethod
+    def next_opening(cls, now=None):
+        """
+        Returns when the service next opens (now, if it is open).
+        """
+        if now is None:
+            now = timezone.now()
+        ts = get_schedule(now).next_opening(now.timestamp())
+        return _from_timestamp(ts)
+
+    @classmethod
+    def open_windows(cls, days=7, now=None):
+        """
+        Returns the (start, end) open windows over the next `days` days, as
+        local datetimes.
+        """
+        if now is None:
+            now = timezone.now()
+        start = now.timestamp()
+        until = (now + datetime.timedelta(days=days)).timestamp()
+        return [
+            (_from_timestamp(window_start), _from_timestamp(window_end))
+            for window_start, window_end in get_schedule(now).windows(start, until)
+        ]
+
+    @classmethod
+    def seconds_until_transition(cls, now=None):
+        """
+        Returns how many whole seconds the current status remains valid.
+        """
+        if now is None:
+            now = timezone.now()
+        transition = cls.next_transition(now)
+        if transition is None:
+            return None
+        return max(0, int((transition - now).total_seconds()))
 
     @classmethod
     def get_status_data(cls):
         """
         Returns a dictionary containing all availability-related data
         and Tailwind CSS classes for consistent styling.
+
+        The dictionary is built once and reused until the next status
+        transition or schedule edit, so the context processor costs a
+        version check and a comparison.
         """
-        is_avail = cls.is_available()
-        return {
+        now = timezone.now()
+        schedule = get_schedule(now)
+        data, valid_until, version = cls._status_cache
+        if (
+            data is not None
+            and version == schedule.version
+            and valid_until is not None
+            and now < valid_until
+        ):
+            return data
+
+        is_avail = schedule.is_open(now.timestamp())
+        data = {
             'is_available': is_avail,
-            'schedule': cls.SCHEDULE_TEXT,
+            'schedule': schedule.text,
             'status_text': "Disponibile Ora" if is_avail else "Attualmente Chiuso",
             'status_color': "green" if is_avail else "red",
             'status_bg': "green-500/10" if is_avail else "red-500/10",
@@ -50,4 +116,13 @@ class AvailabilityManager:
             'status_bullet': "green-500" if is_avail else "red-500",
             'status_bullet_ping': "green-400" if is_avail else "red-400",
             'status_text_color': "green-400" if is_avail else "red-400",
+            'valid_until': _from_timestamp(schedule.next_transition(now.timestamp())),
         }
+        cls._status_cache = (data, data['valid_until'], schedule.version)
+        return data
+
+
+def _from_timestamp(ts):
+    if ts is None:
+        return None
+    return timezone.localtime(datetime.datetime.fromtimestamp(ts, tz=datetime.timezone.utc))
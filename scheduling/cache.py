@@ -0,0 +1,33 @@
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .availability import AvailabilityManager
+
+
+def cache_until_transition(view_func):
+    """
+    Decorator for views that render the availability badge.
+
+    Lets browsers keep the page until the availability status next changes
+    (capped by AVAILABILITY_CACHE_MAX_AGE), instead of treating it as
+    uncacheable. The page is marked private and varies on Cookie, since it
+    also shows the visitor's account menu.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        response = view_func(request, *args, **kwargs)
+        if request.method not in ("GET", "HEAD") or response.status_code != 200:
+            return response
+        max_age = getattr(settings, "AVAILABILITY_CACHE_MAX_AGE", 600)
+        seconds = AvailabilityManager.seconds_until_transition()
+        if seconds is not None:
+            max_age = min(max_age, seconds)
+        patch_cache_control(response, private=True, max_age=max_age)
+        response.headers["Expires"] = http_date(time.time() + max_age)
+        patch_vary_headers(response, ("Cookie",))
+        return response
+    return wrapper
@@ -0,0 +1,27 @@
+import datetime
+
+from django.db import migrations
+
+
+def seed_schedule(apps, schema_editor):
+    # the schedule that used to be hardcoded in AvailabilityManager:
+    # Mon-Fri 18:00-24:00, Saturday and Sunday all day
+    WeeklyInterval = apps.get_model('scheduling', 'WeeklyInterval')
+    if WeeklyInterval.objects.exists():
+        return
+    midnight = datetime.time(0, 0)
+    WeeklyInterval.objects.bulk_create(
+        [WeeklyInterval(weekday=day, start_time=datetime.time(18, 0), end_time=midnight) for day in range(5)]
+        + [WeeklyInterval(weekday=day, start_time=midnight, end_time=midnight) for day in (5, 6)]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_schedule, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,51 @@
 from django.db import models
 
-# Create your models here.
+
+class WeeklyInterval(models.Model):
+    """
+    A recurring opening interval on a given day of the week.
+
+    An end time of 00:00 means midnight at the end of the day.
+    """
+    WEEKDAY_CHOICES = [
+        (0, "Lunedì"),
+        (1, "Martedì"),
+        (2, "Mercoledì"),
+        (3, "Giovedì"),
+        (4, "Venerdì"),
+        (5, "Sabato"),
+        (6, "Domenica"),
+    ]
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField(help_text="00:00 means midnight (end of the day)")
+
+    class Meta:
+        ordering = ["weekday", "start_time"]
+
+    def __str__(self):
+        return f"{self.get_weekday_display()} {self.start_time:%H:%M}-{self.end_time:%H:%M}"
+
+
+class ScheduleException(models.Model):
+    """
+    A dated override of the weekly schedule, such as a holiday or special
+    opening hours.
+
+    All exceptions on a date replace that date's weekly intervals. A closed
+    exception (or one without times) closes the whole day; open exceptions
+    add their interval.
+    """
+    date = models.DateField(db_index=True)
+    is_open = models.BooleanField(default=False)
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True, help_text="00:00 means midnight (end of the day)")
+    description = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        ordering = ["date", "start_time"]
+
+    def __str__(self):
+        if self.is_open and self.start_time is not None:
+            return f"{self.date} {self.start_time:%H:%M}-{self.end_time:%H:%M} {self.description}".strip()
+        return f"{self.date} chiuso {self.description}".strip()
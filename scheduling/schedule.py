@@ -0,0 +1,229 @@
+import datetime
+import threading
+import time
+from bisect import bisect_right
+from itertools import groupby
+
+from django.core.cache import cache
+from django.utils import timezone
+
+SCHEDULE_VERSION_KEY = "scheduling:schedule_version"
+HORIZON_DAYS = 90
+# seconds a worker trusts its copy of the shared schedule version
+VERSION_POLL_INTERVAL = 5
+
+DAY_ABBREVIATIONS = ["Lun", "Mar", "Mer", "Gio", "Ven", "Sab", "Dom"]
+
+
+class CompiledSchedule:
+    """
+    The weekly intervals and exceptions expanded into a sorted table of
+    absolute, non-overlapping open intervals.
+
+    ``starts``/``ends`` hold UNIX timestamps; every question is answered with
+    a binary search over ``starts``.
+    """
+
+    def __init__(self, intervals, valid_from, valid_until, text, version=None):
+        self.starts = [start for start, end in intervals]
+        self.ends = [end for start, end in intervals]
+        self.valid_from = valid_from
+        self.valid_until = valid_until
+        self.text = text
+        self.version = version
+
+    def covers(self, ts):
+        # leave a week of look-ahead for next_transition()
+        return self.valid_from <= ts <= self.valid_until - 8 * 86400
+
+    def _index(self, ts):
+        return bisect_right(self.starts, ts) - 1
+
+    def is_open(self, ts):
+        i = self._index(ts)
+        return i >= 0 and ts < self.ends[i]
+
+    def next_transition(self, ts):
+        """
+        Returns the timestamp of the next open/closed change after ts, or
+        None if there is none within the compiled horizon.
+        """
+        i = self._index(ts)
+        if i >= 0 and ts < self.ends[i]:
+            end = self.ends[i]
+            return end if end < self.valid_until else None
+        if i + 1 < len(self.starts):
+            return self.starts[i + 1]
+        return None
+
+    def next_opening(self, ts):
+        """
+        Returns the timestamp at which the service next opens (ts itself if
+        it is open now), or None.
+        """
+        i = self._index(ts)
+        if i >= 0 and ts < self.ends[i]:
+            return ts
+        return self.starts[i + 1] if i + 1 < len(self.starts) else None
+
+    def windows(self, ts, until):
+        """
+        Returns the ``(start, end)`` open windows overlapping [ts, until).
+        """
+        i = max(self._index(ts), 0)
+        result = []
+        while i < len(self.starts) and self.starts[i] < until:
+            if self.ends[i] > ts:
+                result.append((max(self.starts[i], ts), min(self.ends[i], until)))
+            i += 1
+        return result
+
+
+def _day_intervals(day, times):
+    """
+    Turn (start_time, end_time) pairs on a local date into aware datetimes;
+    an end at or before the start (00:00) runs until midnight.
+    """
+    tz = timezone.get_current_timezone()
+    for start, end in times:
+        start_dt = datetime.datetime.combine(day, start)
+        end_day = day + datetime.timedelta(days=1) if end <= start else day
+        end_dt = datetime.datetime.combine(end_day, end)
+        yield timezone.make_aware(start_dt, tz), timezone.make_aware(end_dt, tz)
+
+
+def _schedule_text(weekly):
+    """
+    Summarize the weekly intervals, e.g. "Lun-Ven 18:00-24:00 & Weekend".
+    """
+    def label(start, end):
+        end_label = "24:00" if end <= start else f"{end:%H:%M}"
+        return f"{start:%H:%M}-{end_label}"
+
+    by_day = [
+        ", ".join(label(start, end) for start, end in sorted(weekly.get(day, [])))
+        for day in range(7)
+    ]
+    parts = []
+    for hours, days in groupby(range(7), key=lambda d: by_day[d]):
+        days = list(days)
+        if not hours:
+            continue
+        if days == [5, 6] and hours == "00:00-24:00":
+            parts.append("Weekend")
+            continue
+        names = DAY_ABBREVIATIONS[days[0]]
+        if len(days) > 1:
+            names = f"{names}-{DAY_ABBREVIATIONS[days[-1]]}"
+        parts.append(f"{names} {hours}")
+    return " & ".join(parts)
+
+
+def compile_schedule(now=None, days=HORIZON_DAYS, version=None):
+    """
+    Load the schedule models and compile them for the period starting the
+    day before `now` and ending `days` days after it.
+    """
+    from .models import ScheduleException, WeeklyInterval
+
+    if now is None:
+        now = timezone.now()
+    today = timezone.localtime(now).date()
+    first = today - datetime.timedelta(days=1)
+    last = today + datetime.timedelta(days=days)
+
+    weekly = {}
+    for interval in WeeklyInterval.objects.all():
+        weekly.setdefault(interval.weekday, []).append((interval.start_time, interval.end_time))
+    exceptions = {}
+    for exception in ScheduleException.objects.filter(date__range=(first, last)):
+        day_times = exceptions.setdefault(exception.date, [])
+        if exception.is_open and exception.start_time is not None and exception.end_time is not None:
+            day_times.append((exception.start_time, exception.end_time))
+
+    intervals = []
+    day = first
+    while day <= last:
+        times = exceptions.get(day, weekly.get(day.weekday(), []))
+        for start, end in _day_intervals(day, times):
+            start_ts, end_ts = start.timestamp(), end.timestamp()
+            # merge overlapping and back-to-back intervals (Fri 24:00 -> Sat)
+            if intervals and start_ts <= intervals[-1][1]:
+                intervals[-1] = (intervals[-1][0], max(intervals[-1][1], end_ts))
+            else:
+                intervals.append((start_ts, end_ts))
+        day += datetime.timedelta(days=1)
+
+    tz = timezone.get_current_timezone()
+    valid_from = timezone.make_aware(datetime.datetime.combine(first, datetime.time()), tz).timestamp()
+    valid_until = timezone.make_aware(
+        datetime.datetime.combine(last + datetime.timedelta(days=1), datetime.time()), tz
+    ).timestamp()
+    return CompiledSchedule(intervals, valid_from, valid_until, _schedule_text(weekly), version)
+
+
+class VersionPoller:
+    """
+    The shared schedule version as last read by this worker, re-read from the
+    cache at most every VERSION_POLL_INTERVAL seconds so answering the many
+    availability questions of a request costs no lookups.
+    """
+
+    def __init__(self, interval=VERSION_POLL_INTERVAL):
+        self.interval = interval
+        self.version = None
+        self._next_poll = 0.0
+
+    def get(self):
+        now = time.monotonic()
+        if self.version is None or now >= self._next_poll:
+            self.version = _shared_version()
+            self._next_poll = now + self.interval
+        return self.version
+
+    def bump(self):
+        """
+        Publish a new version; this worker sees it at once, the others on
+        their next poll.
+        """
+        self.version = time.time_ns()
+        self._next_poll = time.monotonic() + self.interval
+        cache.set(SCHEDULE_VERSION_KEY, self.version, None)
+
+
+def _shared_version():
+    version = cache.get(SCHEDULE_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(SCHEDULE_VERSION_KEY, version, None):
+            version = cache.get(SCHEDULE_VERSION_KEY, version)
+    return version
+
+
+_lock = threading.Lock()
+_compiled = None
+version_poller = VersionPoller()
+
+
+def get_schedule(now=None):
+    """
+    Return the compiled schedule for this process.
+
+    It is recompiled when an edit bumped the shared schedule version (see
+    scheduling.signals; other workers notice within VERSION_POLL_INTERVAL
+    seconds) or when `now` moves past the compiled horizon.
+    """
+    global _compiled
+    if now is None:
+        now = timezone.now()
+    version = version_poller.get()
+    compiled = _compiled
+    if compiled is None or compiled.version != version or not compiled.covers(now.timestamp()):
+        with _lock:
+            compiled = compile_schedule(now, version=version)
+            _compiled = compiled
+    return compiled
+
+
+def invalidate_schedule():
+    version_poller.bump()
@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ScheduleException, WeeklyInterval
+from .schedule import invalidate_schedule
+
+
+@receiver(post_save, sender=WeeklyInterval)
+@receiver(post_delete, sender=WeeklyInterval)
+@receiver(post_save, sender=ScheduleException)
+@receiver(post_delete, sender=ScheduleException)
+def schedule_changed(sender, **kwargs):
+    """
+    Make every process recompile the schedule after an edit.
+    """
+    invalidate_schedule()
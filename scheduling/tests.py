@@ -1,3 +1,112 @@
+import datetime
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+
+from . import schedule
+from .availability import AvailabilityManager
+from .models import ScheduleException, WeeklyInterval
+from .schedule import SCHEDULE_VERSION_KEY, VersionPoller, compile_schedule, get_schedule
+
+
+def local(*args):
+    return timezone.make_aware(datetime.datetime(*args))
+
+
+class ScheduleTests(TestCase):
+    """
+    The default schedule (Lun-Ven 18:00-24:00 and the whole weekend, see
+    migration 0002) compiled around October 2026, when DST ends on the
+    25th.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def next_transition(self, now):
+        ts = compile_schedule(now).next_transition(now.timestamp())
+        return timezone.localtime(datetime.datetime.fromtimestamp(ts, tz=datetime.timezone.utc))
+
+    def test_text(self):
+        self.assertEqual(compile_schedule().text, "Lun-Ven 18:00-24:00 & Weekend")
+
+    def test_next_transition(self):
+        # Wednesday afternoon: opens at 18:00
+        self.assertEqual(self.next_transition(local(2026, 10, 14, 12)), local(2026, 10, 14, 18))
+        # Wednesday evening: closes at midnight
+        self.assertEqual(self.next_transition(local(2026, 10, 14, 20)), local(2026, 10, 15, 0))
+        # Friday evening runs into the weekend, until Monday 00:00
+        self.assertEqual(self.next_transition(local(2026, 10, 16, 19)), local(2026, 10, 19, 0))
+        # exactly at a boundary the new status holds
+        self.assertEqual(self.next_transition(local(2026, 10, 19, 0)), local(2026, 10, 19, 18))
+
+    def test_exceptions_replace_the_weekly_day(self):
+        ScheduleException.objects.create(date=datetime.date(2026, 10, 14), description="Chiuso")
+        ScheduleException.objects.create(
+            date=datetime.date(2026, 10, 15),
+            is_open=True,
+            start_time=datetime.time(9),
+            end_time=datetime.time(12),
+        )
+        compiled = compile_schedule(local(2026, 10, 14, 12))
+        self.assertFalse(compiled.is_open(local(2026, 10, 14, 19).timestamp()))
+        self.assertTrue(compiled.is_open(local(2026, 10, 15, 10).timestamp()))
+        self.assertFalse(compiled.is_open(local(2026, 10, 15, 19).timestamp()))
+        self.assertEqual(self.next_transition(local(2026, 10, 14, 12)), local(2026, 10, 15, 9))
+
+    def test_dst_change(self):
+        # from Friday 20:00 to Monday 00:00 is 53 hours on the weekend DST
+        # ends and 51 on the one it starts: intervals are laid out in local
+        # time
+        for friday, hours in ((local(2026, 10, 23, 20), 53), (local(2026, 3, 27, 20), 51)):
+            compiled = compile_schedule(friday)
+            ts = friday.timestamp()
+            self.assertEqual(compiled.next_transition(ts) - ts, hours * 3600)
+            monday = friday + datetime.timedelta(days=2, hours=4)  # wall clock
+            self.assertEqual(self.next_transition(friday), monday)
+
+    def test_availability(self):
+        now = local(2026, 10, 16, 23, 30)
+        self.assertTrue(AvailabilityManager.is_available(now))
+        self.assertEqual(AvailabilityManager.next_opening(now), now)
+        self.assertEqual(AvailabilityManager.seconds_until_transition(now), 48 * 3600 + 1800)
+        monday = local(2026, 10, 19, 10)
+        self.assertFalse(AvailabilityManager.is_available(monday))
+        self.assertEqual(AvailabilityManager.next_opening(monday), local(2026, 10, 19, 18))
+        windows = AvailabilityManager.open_windows(days=2, now=monday)
+        self.assertEqual(windows, [
+            (local(2026, 10, 19, 18), local(2026, 10, 20, 0)),
+            (local(2026, 10, 20, 18), local(2026, 10, 21, 0)),
+        ])
+
+
+class VersionPollerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_version_is_read_once_per_interval(self):
+        poller = VersionPoller(interval=60)
+        with mock.patch("scheduling.schedule.cache", wraps=cache) as spy:
+            first = poller.get()
+            self.assertEqual(poller.get(), first)
+        self.assertEqual(spy.get.call_count, 1)
+
+    def test_other_workers_bump_is_seen_on_next_poll(self):
+        poller = VersionPoller(interval=60)
+        first = poller.get()
+        cache.set(SCHEDULE_VERSION_KEY, first + 1, None)
+        self.assertEqual(poller.get(), first)
+        with mock.patch("scheduling.schedule.time.monotonic", return_value=poller._next_poll):
+            self.assertEqual(poller.get(), first + 1)
 
-# Create your tests here.
+    def test_edit_recompiles_the_schedule_in_this_worker(self):
+        before = get_schedule()
+        WeeklyInterval.objects.create(
+            weekday=0, start_time=datetime.time(9), end_time=datetime.time(12),
+        )
+        after = get_schedule()
+        self.assertNotEqual(after.version, before.version)
+        self.assertEqual(after.version, schedule.version_poller.version)
+        self.assertEqual(cache.get(SCHEDULE_VERSION_KEY), after.version)
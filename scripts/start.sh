@@ -12,10 +12,32 @@ python -u manage.py check --database default
 echo "==> Running migrations (verbose)..."
 python -u manage.py migrate --noinput -v 2
 
+# summaries and rendered HTML of posts that predate those fields; data
+# migrations cannot run the live rendering code
+python -u manage.py backfill_post_summaries
+
+# Railway's proxy connects to us, so REMOTE_ADDR is the same for every
+# visitor: rate limits must key on the address it forwards instead
+export BLOG_RATE_LIMIT_TRUST_FORWARDED="${BLOG_RATE_LIMIT_TRUST_FORWARDED:-True}"
+
+# SERVER_MODE=asgi serves core.asgi with uvicorn workers: each worker runs
+# an event loop and handles many concurrent (HTMX) requests instead of one
+if [ "${SERVER_MODE:-wsgi}" = "asgi" ]; then
+    echo "==> Starting Gunicorn with uvicorn workers on port $PORT..."
+    exec gunicorn core.asgi:application \
+        --worker-class uvicorn_worker.UvicornWorker \
+        --bind 0.0.0.0:$PORT \
+        --workers "${WEB_CONCURRENCY:-1}" \
+        --timeout 200 \
+        --log-level debug \
+        --access-logfile - \
+        --error-logfile -
+fi
+
 echo "==> Starting Gunicorn on port $PORT..."
 exec gunicorn core.wsgi:application \
     --bind 0.0.0.0:$PORT \
-    --workers 2 \
+    --workers "${WEB_CONCURRENCY:-1}" \
     --timeout 200 \
     --log-level debug \
     --access-logfile - \
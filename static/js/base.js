@@ -66,4 +66,21 @@ function readTimeFilter(text) {
     const words = text.split(/\s+/).length;
     const minutes = Math.ceil(words / wordsPerMinute);
     return `${minutes} min read`;
-}
\ No newline at end of file
+}
+
+// Comments reach the thread three ways: the comment form, the live stream
+// and the "load more" pages. Keep one copy of each, and keep new ones
+// above the "load more" sentinel so the thread stays in order.
+htmx.onLoad(function(elt) {
+    if (!elt.id || !elt.id.startsWith('comment-')) return;
+    const container = elt.closest('#comments-container');
+    if (!container) return;
+    if (container.querySelectorAll(`[id="${elt.id}"]`).length > 1) {
+        elt.remove();
+        return;
+    }
+    const more = container.querySelector(':scope > [data-comments-more]');
+    if (more && (more.compareDocumentPosition(elt) & Node.DOCUMENT_POSITION_FOLLOWING)) {
+        more.before(elt);
+    }
+});